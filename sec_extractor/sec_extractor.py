@@ -1,17 +1,27 @@
 import logging
 import getpass
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString
+from lxml import etree
 import requests
+import requests.adapters
+from urllib3.util.retry import Retry
+import random
+import io
 import time
 import json
+import argparse
+import csv
 import datetime as dt
 import sqlite3
 import urllib.parse
-from urllib.request import urlretrieve
+import http.server
+import email.utils
 import warnings
-import edgar
 import functools
+import contextlib
+import itertools
 import os
+import ntpath
 import glob
 from pathlib import Path
 import pandas as pd
@@ -19,6 +29,30 @@ import re
 import zipfile
 import numpy as np
 import sys
+import typing
+import bisect
+import asyncio
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import queue
+import signal
+import hashlib
+import mmap
+import gzip
+import concurrent.futures
+try:
+    import resource
+except ImportError:
+    #Windows
+    resource = None
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    #Prospectus datasets are read from tsv files instead of parquet cache
+    pa = None
+    pq = None
 
 
 class configurationManager():
@@ -69,18 +103,282 @@ class logManager():
         logging.info(f'User running sec_extractor.py: {user}')
 
 
+class rateLimiter():
+    '''
+    Spaces out the start of HTTP requests across all threads, so that no more than requests_per_second are sent to the SEC
+    The SEC fair access policy allows a maximum of 10 requests per second (see https://www.sec.gov/os/accessing-edgar-data)
+    '''
+
+    def __init__(self, requests_per_second):
+
+        self.interval = 1 / float(requests_per_second) if float(requests_per_second) > 0 else 0
+        self.next_start = time.monotonic()
+        self.lock = threading.Lock()
+
+
+    def wait(self):
+        '''Blocks calling thread until it is allowed to start its next request'''
+
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+
+        if start > now:
+            time.sleep(start - now)
+
+
+class responseCache():
+    '''
+    Disk-backed cache of HTTP responses, keyed by url
+    Submissions under /Archives/edgar/data/ do not change once accepted by the SEC, so they are kept until evicted; all other responses expire after ttl_seconds (config.json) and are then revalidated with the SEC (ETag/Last-Modified)
+    Least recently used responses are evicted once the cache exceeds max_size_mb (config.json)
+    '''
+
+    def __init__(self, config):
+
+        self.cache_file = config['network_drives']['cache'] + '\\http_cache.db'
+        self.ttl = float(config['http_cache']['ttl_seconds'])
+        self.max_size = int(config['http_cache']['max_size_mb']) * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+        #Downloads run on multiple threads (see holdingsCourier.fetch_reports_async), which share this connection
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.cache_file, check_same_thread=False)
+
+        create_tables = '''
+        CREATE TABLE IF NOT EXISTS responses(
+            URL TEXT PRIMARY KEY,
+            STATUS_CODE INTEGER,
+            HEADERS TEXT,
+            CONTENT BLOB,
+            SIZE INTEGER,
+            STORED_AT REAL,
+            LAST_ACCESSED REAL);
+
+        CREATE INDEX
+            IF NOT EXISTS LAST_ACCESSED_IDX
+            ON responses(LAST_ACCESSED);
+        '''
+
+        with self.lock:
+            self.conn.executescript(create_tables)
+            self.size = self.conn.execute('''SELECT COALESCE(SUM(SIZE), 0) FROM responses''').fetchone()[0]
+
+
+    def is_immutable(self, url):
+        '''Filings under /Archives/edgar/data/ are never changed once accepted (amendments are new filings)'''
+
+        return urllib.parse.urlparse(url).path.startswith('/Archives/edgar/data/')
+
+
+    def is_fresh(self, entry):
+        '''Whether cached response can be used without revalidating it with the SEC'''
+
+        return self.is_immutable(entry['url']) or (time.time() - entry['stored_at']) < self.ttl
+
+
+    def get(self, url):
+        '''Returns cached response for url as dict (None if not in cache), and marks it as most recently used'''
+
+        with self.lock:
+            row = self.conn.execute('''SELECT STATUS_CODE, HEADERS, CONTENT, STORED_AT FROM responses WHERE URL = ?''', (url,)).fetchone()
+
+            if row is None:
+                return None
+
+            self.conn.execute('''UPDATE responses SET LAST_ACCESSED = ? WHERE URL = ?''', (time.time(), url))
+            self.conn.commit()
+
+        return {'url': url, 'status_code': row[0], 'headers': json.loads(row[1]), 'content': row[2], 'stored_at': row[3]}
+
+
+    def store(self, url, status_code, headers, content):
+
+        #Content is stored decoded, so headers describing the transfer no longer apply
+        headers = {key: value for key, value in headers.items() if key.lower() not in ['content-encoding', 'content-length', 'transfer-encoding', 'connection']}
+
+        now = time.time()
+
+        with self.lock:
+            previous = self.conn.execute('''SELECT SIZE FROM responses WHERE URL = ?''', (url,)).fetchone()
+            if previous is not None:
+                self.size -= previous[0]
+
+            sql = '''INSERT OR REPLACE INTO responses (URL, STATUS_CODE, HEADERS, CONTENT, SIZE, STORED_AT, LAST_ACCESSED) VALUES (?,?,?,?,?,?,?)'''
+            self.conn.execute(sql, (url, status_code, json.dumps(headers), sqlite3.Binary(content), len(content), now, now))
+            self.size += len(content)
+
+            self.evict()
+            self.conn.commit()
+
+
+    def refresh(self, url):
+        '''Restarts ttl of cached response after the SEC confirms it has not changed (HTTP 304)'''
+
+        with self.lock:
+            self.conn.execute('''UPDATE responses SET STORED_AT = ? WHERE URL = ?''', (time.time(), url))
+            self.conn.commit()
+
+
+    def record(self, outcome):
+        '''
+        Counts outcome of a cache lookup; lookups run on many fetch threads at once, so counts are updated under lock
+        @param outcome: hit, miss, or revalidation (a hit after the SEC confirms the cached response has not changed)
+        '''
+
+        with self.lock:
+
+            if outcome == 'miss':
+                self.misses += 1
+            else:
+                self.hits += 1
+                if outcome == 'revalidation':
+                    self.revalidations += 1
+
+
+    def evict(self):
+        '''Deletes least recently used responses until cache is no larger than max_size_mb; caller must hold lock'''
+
+        while self.size > self.max_size:
+
+            rows = self.conn.execute('''SELECT URL, SIZE FROM responses ORDER BY LAST_ACCESSED ASC LIMIT 100''').fetchall()
+
+            if len(rows) == 0:
+                self.size = 0
+                break
+
+            for url, size in rows:
+
+                self.conn.execute('''DELETE FROM responses WHERE URL = ?''', (url,))
+                self.size -= size
+                self.evictions += 1
+
+                if self.size <= self.max_size:
+                    break
+
+
+    def log_stats(self):
+
+        logging.info(f'''HTTP cache: {self.hits} hits ({self.revalidations} revalidated), {self.misses} misses, {self.evictions} evictions, {self.size/(1024*1024):.1f} MB on disk''')
+
+
+class jitterRetry(Retry):
+    '''Retry policy whose exponential backoff is randomly spread (jitter), so that concurrent downloads do not retry in lockstep'''
+
+    def get_backoff_time(self):
+
+        backoff = super().get_backoff_time()
+
+        return (backoff / 2) + random.uniform(0, backoff / 2)
+
+
+class transportAdapter(requests.adapters.HTTPAdapter):
+    '''
+    Transport adapter shared by every request to the SEC: sized connection pool, retries with exponential backoff and jitter on 429/5xx/timeouts, and default timeouts
+    '''
+
+    def __init__(self, config, *args, **kwargs):
+
+        http_session = config['http_session']
+        self.timeout = (float(http_session['connect_timeout']), float(http_session['read_timeout']))
+
+        max_retries = jitterRetry(total=int(http_session['max_retries']), backoff_factor=float(http_session['backoff_factor']), status_forcelist=[429, 500, 502, 503, 504], respect_retry_after_header=True)
+
+        super().__init__(*args, pool_connections=int(http_session['pool_maxsize']), pool_maxsize=int(http_session['pool_maxsize']), max_retries=max_retries, **kwargs)
+
+
+    def send(self, request, timeout=None, **kwargs):
+
+        if timeout is None:
+            timeout = self.timeout
+
+        return super().send(request, timeout=timeout, **kwargs)
+
+
+class cachingAdapter(transportAdapter):
+    '''
+    Transport adapter that answers GET requests from a responseCache before going to the SEC
+    Streamed requests, and requests that already carry their own validators (If-None-Match/If-Modified-Since), are passed straight through
+    '''
+
+    def __init__(self, config, response_cache, *args, **kwargs):
+
+        self.response_cache = response_cache
+        super().__init__(config, *args, **kwargs)
+
+
+    def build_cached_response(self, request, entry):
+
+        response = requests.models.Response()
+        response.status_code = entry['status_code']
+        response.headers = requests.structures.CaseInsensitiveDict(entry['headers'])
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.reason = 'OK'
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response._content = bytes(entry['content'])
+
+        return response
+
+
+    def send(self, request, stream=False, **kwargs):
+
+        if (request.method != 'GET') or stream or ('If-None-Match' in request.headers) or ('If-Modified-Since' in request.headers):
+            return super().send(request, stream=stream, **kwargs)
+
+        entry = self.response_cache.get(request.url)
+
+        if entry is not None:
+
+            if self.response_cache.is_fresh(entry):
+                self.response_cache.record('hit')
+                return self.build_cached_response(request, entry)
+
+            #Stale; ask the SEC whether it has changed
+            headers = requests.structures.CaseInsensitiveDict(entry['headers'])
+            if 'ETag' in headers:
+                request.headers['If-None-Match'] = headers['ETag']
+            if 'Last-Modified' in headers:
+                request.headers['If-Modified-Since'] = headers['Last-Modified']
+
+        response = super().send(request, stream=stream, **kwargs)
+
+        if (response.status_code == 304) and (entry is not None):
+            response.close()
+            self.response_cache.refresh(request.url)
+            self.response_cache.record('revalidation')
+            return self.build_cached_response(request, entry)
+
+        self.response_cache.record('miss')
+
+        if response.status_code == 200:
+            self.response_cache.store(request.url, response.status_code, response.headers, response.content)
+
+        return response
+
+
 class proxyManager():
     '''Creates an HTTP session object that uses the proxy domain specified in the config_proxy_domain.json file'''
 
     def __init__(self):
 
         self.session = None
+        self.rate_limiter = None
+        self.response_cache = None
 
 
     def set_http_session(self, config):
 
         warnings.filterwarnings("ignore")
 
+        #Shared by every courier, so the cap on requests per second is global
+        self.rate_limiter = rateLimiter(config['http_session']['requests_per_second'])
+
         proxy_exist = input("Do you need to accomodate a proxy server? Please input yes or no: ")
 
         if proxy_exist == "yes":
@@ -124,800 +422,2964 @@ class proxyManager():
             logging.info("yes or no is required as response to proxy inquiry.")
             sys.exit()
 
+        self.mount_transport(config)
 
-class indexCourier():
-    '''
-    Ensures all available SEC index files (beginning Q1 2011) are located in the network drive location specified in config.json
-    The SEC index files state all SEC filings (10-K, N-PORT, N-Q, etc.) for a given quarter; in this application, they are used to find the N-PORT and N-Q (mutual fund holdings) filings for the desired funds
-    '''
 
-    def __init__(self, config):
+    def mount_transport(self, config):
+        '''
+        Places the shared transport beneath session: pooled connections, retries, timeouts, and compression
+        Responses are also cached on disk, if enabled in config.json
+        '''
 
-        self.config = config
-        self.index_files = None
+        self.session.headers.update({'User-Agent': config['http_session']['user_agent'], 'Accept-Encoding': 'gzip, deflate'})
 
+        if config['http_cache']['enabled']:
+            self.response_cache = responseCache(config)
+            adapter = cachingAdapter(config, self.response_cache)
+            logging.info(f'''HTTP(S) responses cached in {self.response_cache.cache_file}''')
+        else:
+            adapter = transportAdapter(config)
 
-    def obtain_index_files(self):
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
-        start_year = int(self.config['index']['start_year'])
-        if start_year < 2011:
-            logging.info('Please note that the SEC only publishes prospectus data (expense ratios) starting 2011.')
-        if start_year < 1993:
-            logging.error('start_year in config.json needs to be greater than or equal to 1993, because that is the first year that the SEC published index files.')
 
-        #Get all index files and place in configured network drive location
-        index_start_time = time.time()
-        edgar.download_index(self.config['network_drives']['index_files'], start_year, self.config['http_session']['user_agent'], skip_all_present_except_last=True)
-        index_execution_time = (time.time() - index_start_time)/60
-        logging.info(f'''SEC index file(s) download took {index_execution_time:.2f} minutes.''')
+    def get(self, url, **kwargs):
+        '''
+        Sends GET request through shared transport, after waiting for rate limiter
+        Raises an exception if the request fails after all retries, or the SEC responds with an error status
+        '''
 
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
 
-    def get_index_files(self):
+        response = self.session.get(url, **kwargs)
+        response.raise_for_status()
 
-        #Get all index files in network drive
-        glob_str = self.config['network_drives']['index_files'] + '\\*.tsv'
-        self.index_files = sorted(glob.glob(glob_str))
+        return response
 
-        return self.index_files
 
+    def get_prefix(self, url, end_marker, chunk_size=16384):
+        '''
+        Downloads url only until end_marker has been received (the rest of the content is never transferred)
+        @return content up to and including end_marker in bytes (whole content if end_marker is not found)
+        Prefix is kept in the response cache (if enabled) under url#prefix, since streamed requests bypass the cache
+        '''
 
-class holdingsCourier():
-    '''
-    Gets fund holdings data from N-Q (pre-2019) and NPORT-P (2019 onward) reports
+        cache_key = url + '#prefix'
 
-    Structure of method use:
+        if self.response_cache is not None:
+            entry = self.response_cache.get(cache_key)
+            if (entry is not None) and self.response_cache.is_fresh(entry):
+                self.response_cache.record('hit')
+                return bytes(entry['content'])
 
-    - obtain_insert_holdings_data
-        - get_nq_series_data (get_series_in_report, filter_to_desired_series)->needed because N-Q has multiple series per report
-            - get_series_name_from_id
-            - get_adsh
-            - get_filed_date (format_date)
-            - get_period_end_date (format_date)
-            - translate_period_end_quarter_end
-            - get_nq_net_assets
-        - get_nport_data (get_series_in_report, filter_to_desired_series)->not really needed, just easier to reuse methods
-            - get_adsh
-            - get_filed_date (format_date)
-            - get_period_end_date (format_date)
-            - translate_period_end_quarter_end
-            - get_nport_net_assets
-    '''
+        prefix = bytearray()
 
-    def __init__(self, config):
+        with self.get(url, stream=True) as response:
 
+            for chunk in response.iter_content(chunk_size=chunk_size):
 
-        self.translation_quarter_date = {"QTR1": [3,31], "QTR2": [6,30], "QTR3": [9,30], "QTR4": [12,31]}
-        self.index_files = None
-        self.filtered_index_files = []
-        self.filtered_report_urls = []
-        self.config = config
+                #Marker may be split across two chunks
+                search_start = max(0, len(prefix) - len(end_marker))
+                prefix += chunk
+                marker_position = prefix.find(end_marker, search_start)
 
+                if marker_position != -1:
+                    del prefix[marker_position + len(end_marker):]
+                    break
 
-    ###### Methods that get or assist in getting report urls ######
-    def translate_index_to_date(self, index_file):
+        prefix = bytes(prefix)
+
+        if self.response_cache is not None:
+            self.response_cache.record('miss')
+            self.response_cache.store(cache_key, 200, {}, prefix)
+
+        return prefix
+
+
+    def download_file(self, url, file_path, verify=None):
         '''
-        Gets quarter end date for index file
-        @param index_file: absolute path of index file
-        @return quarter end date of index file in datetime type
+        Streams url content into file_path + '.part', which is renamed to file_path only once it is complete (size from Content-Length/Content-Range), and passes verify
+        A .part file left by an interrupted download is resumed with an HTTP Range request
+        @param verify: function that takes the path of the downloaded file, and returns False (or raises) if the file is not valid
+        @return number of bytes transferred
         '''
 
-        index_file_name = Path(index_file).stem
-        year_quarter = index_file_name.split('-')
+        part_path = file_path + '.part'
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
 
-        year = year_quarter[0]
-        month = self.translation_quarter_date[year_quarter[1]][0]
-        day = self.translation_quarter_date[year_quarter[1]][1]
+        #Ranges are of the file as stored, so it must not be compressed in transfer
+        headers = {'Accept-Encoding': 'identity'}
+        if offset > 0:
+            headers['Range'] = f'''bytes={offset}-'''
 
-        return dt.datetime(int(year), int(month), int(day))
+        transferred = 0
 
+        try:
+            with self.get(url, stream=True, headers=headers) as response:
 
-    def filter_indexes(self, db_manager, index_courier):
-        '''Create list of all index files that have yet to be inserted into database'''
+                if response.status_code == 206:
+                    #Content-Range: bytes start-end/total
+                    total_size = int(response.headers['Content-Range'].split('/')[-1])
+                    mode = 'ab'
+                else:
+                    #Server ignored Range, and sent the whole file
+                    total_size = int(response.headers['Content-Length']) if 'Content-Length' in response.headers else None
+                    mode = 'wb'
 
-        self.index_files = index_courier.get_index_files()
+                with open(part_path, mode) as file:
+                    for chunk in response.iter_content(chunk_size=1024*1024):
+                        file.write(chunk)
+                        transferred += len(chunk)
+
+        except requests.exceptions.HTTPError as error:
+            #.part file is already complete
+            if (error.response is None) or (error.response.status_code != 416):
+                raise
+            total_size = None
+
+        if (total_size is not None) and (os.path.getsize(part_path) != total_size):
+            raise IOError(f'''Download of {url} is incomplete ({os.path.getsize(part_path)} of {total_size} bytes); it will be resumed on the next run''')
 
         try:
-            most_recent_date = db_manager.get_most_recent_holdings_date()
+            valid = (verify is None) or verify(part_path)
         except:
-            most_recent_date = dt.datetime(1993, 1, 1)
+            valid = False
 
-        for index_file in self.index_files:
+        if not valid:
+            os.remove(part_path)
+            raise IOError(f'''Download of {url} failed verification, and was deleted''')
 
-            index_date = self.translate_index_to_date(index_file)
+        os.replace(part_path, file_path)
 
-            if index_date >= most_recent_date:
+        return transferred
 
-                self.filtered_index_files.append(index_file)
 
-        logging.info(f'(index files to be used for holdings insert: {self.filtered_index_files}')
+    def log_cache_stats(self):
 
+        if self.response_cache is not None:
+            self.response_cache.log_stats()
 
-    def get_report_urls(self):
-        '''Get all report urls that match criteria and add to list of list of dict'''
 
-        index_base_url = 'https://www.sec.gov/Archives/'
+class quarterCalendar():
+    '''
+    Quarter arithmetic shared by holdingsCourier and prospectusCourier
+    Conversions work on whole arrays (NumPy datetime64), so deriving quarter end dates and labels for millions of rows is not done row by row
+    Quarter end dates from first_year through last_year are precomputed into a lookup table, used for quarter ranges and scalar lookups
+    '''
 
-        #Parameters for reading in index files
-        column_names=['cik', 'company', 'filing_type', 'filing_date', 'txt_endpoint', 'html_endpoint']
-        use_columns = ['cik', 'filing_type', 'filing_date', 'txt_endpoint']
-        dtype_dict = {'cik': str, 'filing_type': str, 'txt_endpoint': str}
+    def __init__(self, first_year=1990, last_year=2100):
 
-        #Filing type filter
-        filing_filter = self.config['filings']
+        self.first_year = first_year
 
-        for index_file in self.filtered_index_files:
+        quarter_starts = np.arange(np.datetime64(f'''{first_year}-01''', 'M'), np.datetime64(f'''{last_year + 1}-01''', 'M'), 3)
 
-            chunks = []
-            #Read data in chunks of 250,000, to ensure enough memory
-            chunk_index = 0
-            for chunk in pd.read_csv(index_file, sep='|', names=column_names, usecols=use_columns, dtype=dtype_dict, parse_dates=['filing_date'], infer_datetime_format=True, engine='python', chunksize=100000):
-                chunk_index += 1
-                logging.info(f'''Read in chunk {chunk_index} of 100,000 rows of data for {index_file}''')
-                chunks.append(chunk)
+        #Sorted datetime64[D] quarter end dates, and same dates as yyyy-mm-dd strings
+        self.quarter_end_table = (quarter_starts + 3).astype('datetime64[D]') - np.timedelta64(1, 'D')
+        self.quarter_end_strings = np.datetime_as_string(self.quarter_end_table, unit='D')
 
-            #Concatenate chunks of rows into single dataframe with all trades data
-            index_df = pd.concat(chunks, ignore_index=True)
+        #mm->-mm-dd of quarter end
+        self.month_quarter_end = {}
+        for quarter_end in self.quarter_end_strings[:4]:
+            for month in range(int(quarter_end[5:7]) - 2, int(quarter_end[5:7]) + 1):
+                self.month_quarter_end[f'''{month:02d}'''] = quarter_end[4:]
 
-            #Get desired ciks from config json file
-            ciks = self.config['ciks']
-            #Strip leading zeros
-            strip_ciks = [cik.lstrip("0") for cik in ciks]
-            #Remove duplicate ciks
-            strip_ciks = list(set(strip_ciks))
-            #Keep only rows where cik is desired cik
-            index_df = index_df[index_df['cik'].isin(strip_ciks)]
 
-            #Keep only rows where filing type is desired filing type
-            index_df = index_df[index_df['filing_type'].isin(filing_filter)]
+    def to_datetime64(self, dates):
+        '''
+        Converts dates to datetime64[D] array
+        @param dates: list, array, Series, or Index of dates (datetime or yyyy-mm-dd strings)
+        @return datetime64[D] numpy array; missing dates are NaT
+        '''
 
-            #Sort by date (allows for filing amendments to replace during database inserts)
-            index_df.sort_values(by=['filing_date', 'filing_type'], ascending=True, inplace=True, ignore_index=True)
+        return np.asarray(pd.DatetimeIndex(pd.to_datetime(dates))).astype('datetime64[D]')
 
-            #Convert txt_endpoint column to list
-            #txt_endpoint_list = index_df['txt_endpoint'].to_list()
 
-            #Add base url to each txt endpoint
-            #url_list = [index_base_url + endpoint for endpoint in txt_endpoint_list]
+    def quarter_ends(self, dates):
+        '''Returns datetime64[D] array of the quarter end date of each date'''
 
-            #Add base url to endpoint
-            index_df['url'] = index_base_url + index_df['txt_endpoint']
+        months = self.to_datetime64(dates).astype('datetime64[M]')
+        quarter_starts = months - (months.astype(np.int64) % 3)
 
-            #Create list of dicts [{cik: "", filing_type: "", url: ""}, ...]
-            date_type_index_df = index_df[['filing_type', 'url']]
-            url_list = date_type_index_df.to_dict('records')
+        return (quarter_starts + 3).astype('datetime64[D]') - np.timedelta64(1, 'D')
 
-            #Append url list for this index to total url list
-            self.filtered_report_urls.append(url_list)
 
-        #flatten list of urls
-        #self.filtered_report_urls = [url for index_file in self.filtered_report_urls for url in index_file]
+    def format_dates(self, dates):
+        '''Returns object array of yyyy-mm-dd strings for dates; missing dates are None'''
 
+        days = self.to_datetime64(dates)
 
-    ###### Methods that get or assist in getting report data ######
-    def get_series_in_report(self, xml):
-        '''Gets all id's of series present in report'''
+        return np.where(np.isnat(days), None, np.datetime_as_string(days, unit='D'))
 
-        series_list = []
-        #Get all text associated with series-id tag
-        series_ids = xml.find_all('series-id')
 
-        for series in series_ids:
+    def quarter_labels(self, dates):
+        '''Returns array of yyyyqx labels of the quarter of each date'''
 
-            #Append series id to list
-            series_list.append(series.text[:10])
+        months = self.to_datetime64(dates).astype('datetime64[M]').astype(np.int64)
+        years = months // 12 + 1970
+        quarters = months % 12 // 3 + 1
 
-        return series_list
+        return np.char.add(np.char.add(years.astype(str), 'q'), quarters.astype(str))
 
 
-    def filter_to_desired_series(self, series_list):
-        '''Filters list of series ids to those that are desired by user (noted in configuration json file)'''
+    def quarter_ends_between(self, start, end):
+        '''Returns list of quarter end dates (in string %Y-%m-%d format) between two dates, both inclusive (as pd.date_range(start, end, freq='Q'))'''
 
-        desired_series_list = self.config['series_to_index'].keys()
-        filtered_series_list = []
+        start, end = self.to_datetime64([start, end])
 
-        for series in series_list:
+        if (start < self.quarter_end_table[0]) or (end > self.quarter_end_table[-1]):
+            return pd.date_range(pd.Timestamp(start), pd.Timestamp(end), freq='Q').strftime('%Y-%m-%d').tolist()
 
-            if series in desired_series_list:
+        first = np.searchsorted(self.quarter_end_table, start, side='left')
+        last = np.searchsorted(self.quarter_end_table, end, side='right')
 
-                filtered_series_list.append(series)
+        return self.quarter_end_strings[first:last].tolist()
 
-        return filtered_series_list
 
+    def quarter_end(self, date):
+        '''Produces the quarter end date (yyyy-mm-dd) from a single date (also needs to be formatted yyyy-mm-dd)'''
 
-    def translate_period_end_quarter_end(self, period_end_date):
-        '''Produces the quarter end date (yyyy-mm-dd) from any date (also needs to be formatted yyyy-mm-dd)'''
+        month_quarter_end = self.month_quarter_end.get(date[5:7])
 
-        month = period_end_date[5:7]
+        if month_quarter_end is None:
+            return None
 
-        if month in ['01', '02', '03']:
-            return period_end_date[0:4] + '-' + '03' + '-' + '31'
-        elif month in ['04', '05', '06']:
-            return period_end_date[0:4] + '-' + '06' + '-' + '30'
-        elif month in ['07', '08', '09']:
-            return period_end_date[0:4] + '-' + '09' + '-' + '30'
-        elif month in ['10', '11', '12']:
-            return period_end_date[0:4] + '-' + '12' + '-' + '31'
+        return date[0:4] + month_quarter_end
 
 
-    def get_adsh(self, xml):
-        '''Get the accession number (adsh) which is unique to this report'''
+    def quarter_end_date(self, year, quarter):
+        '''Returns quarter end date of year and quarter (1-4) in datetime type'''
 
-        #Declare strings before and after adsh
-        start = 'ACCESSION NUMBER:'
-        end = 'CONFORMED'
+        return pd.Timestamp(self.quarter_end_table[(year - self.first_year) * 4 + quarter - 1]).to_pydatetime()
 
-        #Get text from tag that contains adsh
-        summary_text = xml.find('acceptance-datetime').text
 
-        #Takes text after start, then takes text before end from remaining, and finally strips any whitespace
-        return (summary_text.split(start))[1].split(end)[0].strip()
+class indexCourier():
+    '''
+    Ensures all available SEC index files (beginning Q1 2011) are located in the network drive location specified in config.json
+    The SEC index files state all SEC filings (10-K, N-PORT, N-Q, etc.) for a given quarter; in this application, they are used to find the N-PORT and N-Q (mutual fund holdings) filings for the desired funds
+    Index files are also loaded into a filing catalog (SQLite, next to index files), which is updated as index files arrive or change, and queried by cik, filing type, and filing date
+    '''
 
+    def __init__(self, config):
 
-    def format_date(self, date):
-        '''Takes date in yyyymmdd format and places in yyyy-mm-dd'''
+        self.config = config
+        self.index_files = None
+        self.index_base_url = 'https://www.sec.gov/Archives/edgar/full-index/'
 
-        return date[:4] + '-' + date[4:6] + '-' + date[6:8]
 
+    def get_index_quarters(self, start_year):
+        '''Returns list of (year, quarter) tuples from start_year through the current quarter, most recent first'''
 
-    def get_filed_date(self, xml):
-        '''Get the date the report was filed'''
+        today = dt.datetime.today()
+        current_quarter = (today.year, (today.month - 1) // 3 + 1)
 
-        #Declare strings before and after adsh
-        start = 'FILED AS OF DATE:'
-        end = 'DATE'
+        quarters = [(year, quarter) for year in range(start_year, today.year + 1) for quarter in range(1, 5) if (year, quarter) <= current_quarter]
 
-        #Get text from tag that contains adsh
-        summary_text = xml.find('acceptance-datetime').text
+        return quarters[::-1]
 
-        #Takes text after start, then takes text before end from remaining, and finally strips any whitespace
-        unformatted_date = (summary_text.split(start))[1].split(end)[0].strip()
-        formatted_date = self.format_date(unformatted_date)
 
-        return formatted_date
+    def translate_master_index(self, master_idx):
+        '''
+        Converts SEC master.idx content into index file format (cik|company|filing_type|filing_date|txt_endpoint|html_endpoint)
+        @param master_idx: content of master.idx in bytes
+        '''
 
+        #First 11 lines of master.idx are a description of the file, and column headers
+        lines = master_idx.decode('latin-1').splitlines()[11:]
 
-    def get_period_end_date(self, xml):
-        '''Get the date that is the final day of the 3-month (quarter) reporting period'''
+        return ''.join([line + '|' + line.split('|')[-1].replace('.txt', '-index.html') + '\n' for line in lines])
 
-        #Declare strings before and after adsh
-        start = 'PERIOD OF REPORT:'
-        end = 'FILED'
 
-        #Get text from tag that contains adsh
-        summary_text = xml.find('acceptance-datetime').text
+    def get_index_filepath(self, year, quarter):
 
-        #Takes text after start, then takes text before end from remaining, and finally strips any whitespace
-        unformatted_date = (summary_text.split(start))[1].split(end)[0].strip()
-        formatted_date = self.format_date(unformatted_date)
+        return self.config['network_drives']['index_files'] + '\\' + f'''{year}-QTR{quarter}.tsv.gz'''
 
-        return formatted_date
 
+    def get_index_key(self, index_file):
+        '''Gets quarter (yyyy-QTRx) of index file, the key of its filing catalog rows and index manifest entry; index file paths use Windows separators, which ntpath splits on any platform'''
 
-    def get_series_name_from_id(self, series, xml):
-        '''Gets series name from series id'''
+        return ntpath.basename(index_file).split('.')[0]
 
-        series_info = xml.find(text=re.compile(series)).find_next('series-name').text
 
-        #Take series name (before new line and "C", which is always there (start of class id))
-        return (series_info.split("\nC"))[0].strip()
+    def get_manifest_filepath(self):
 
+        return self.config['network_drives']['index_files'] + '\\index_manifest.json'
 
-    def get_nq_net_assets(self, series, xml, adsh):
-        '''Attempts to get net assets for series from report'''
 
-        series_name = self.get_series_name_from_id(series, xml)
-        #Get words after first word (necessary because Fidelity will sometimes use @R symbol in second name, but not in first)
-        if " " in series_name:
-            split_series_name = series_name.split(" ", 1)[1]
-        else:
-            split_series_name = series_name
+    def read_manifest(self):
+        '''
+        Reads index manifest, which records each index file's ETag, Last-Modified, rows, sizes, and download time
+        @return dict {yyyy-QTRx: {etag: "", last_modified: "", rows: 0, size: 0, uncompressed_size: 0, downloaded_at: ""}}
+        '''
 
-        #Get second occurrence of series name in document; necessary to find correct net assets tag
-        #Making (what I believe to be true assumption) that first occurrence of series name is above html, and second will have net assets below it
         try:
-            if bool(xml.find(text=re.compile('Name of Fund'))):
-                series_section = xml.find(text=re.compile(split_series_name)).find_next(text=re.compile(split_series_name)).find_next(text=re.compile(split_series_name))
-            else:
-                series_section = xml.find(text=re.compile(split_series_name)).find_next(text=re.compile(split_series_name))
+            with open(self.get_manifest_filepath(), 'r') as manifest_file:
+                return json.load(manifest_file)
         except:
-            logging.info(f'''{series_name} does not have a second occurrence in the document {adsh}, or at least that the bot could find.''')
-            return None
+            return {}
 
-        #Making assumption that there are no more than 10 instances of 'net assets' between the series section and the desired 'net assets'
-        for i in range(10):
 
-            try:
+    def write_manifest(self, manifest):
+        '''Writes index manifest, replacing previous manifest only once it is completely written'''
 
-                #Try to find next occurrence of (case insensitive 'net assets')
-                if i == 0:
-                    next_net_assets = series_section.find_next(text=re.compile('(?i)net assets'))
+        manifest_filepath = self.get_manifest_filepath()
 
-                else:
-                    next_net_assets = next_net_assets.find_next(text=re.compile('(?i)net assets'))
+        with open(manifest_filepath + '.part', 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=1, sort_keys=True)
 
-                #Take out headers of what we don't want
-                if bool(re.search('(?i)percentage of net assets', next_net_assets)):
+        os.replace(manifest_filepath + '.part', manifest_filepath)
 
-                    continue
 
-                if bool(re.search('(?i)percentages shown are based on net assets', next_net_assets)):
+    def verify_index_file(self, file_path, entry):
+        '''
+        Checks index file against its manifest entry, without decompressing it: compressed size, and uncompressed size in gzip trailer
+        @return True if index file is complete
+        '''
+
+        if (entry is None) or (not os.path.exists(file_path)) or (os.path.getsize(file_path) != entry['size']):
+            return False
 
-                    continue
+        with open(file_path, 'rb') as index_file:
+            index_file.seek(-4, os.SEEK_END)
+            uncompressed_size = int.from_bytes(index_file.read(4), 'little')
 
-                #Make assumption that there are less than 10 columns between 'net assets' and the value
-                for i in range(10):
+        return uncompressed_size == entry['uncompressed_size'] % 2**32
 
-                    try:
 
-                        if i == 0:
-                            next_td = next_net_assets.find_next('td')
-                            next_td_text = next_td.text
+    def is_index_final(self, year, quarter, entry):
+        '''
+        Index file is final once it has been downloaded after its quarter ended
+        SEC may add late filings just after quarter end, so files downloaded within a week of quarter end are checked again
+        '''
 
-                        else:
-                            next_td = next_td.find_next('td')
-                            next_td_text = next_td.text
+        next_quarter_start = dt.datetime(year + quarter // 4, (3 * quarter) % 12 + 1, 1)
 
-                        #Match if contains ,### (this does exclude possibility for fund to have less than $1mil in assets (if in 000's))
-                        if bool(re.search('(,\d{3})', next_td_text)):
+        return dt.datetime.strptime(entry['downloaded_at'], '%Y-%m-%d %H:%M:%S') >= next_quarter_start + dt.timedelta(days=7)
 
-                            #Extract net asset value (digits only)
-                            ######### Please note that the N-Q values may be in 000's #########
-                            net_assets_list = re.findall(r'\d+', next_td_text)
-                            net_assets = "".join(net_assets_list)
-                            return net_assets
 
-                    except:
-                        pass
+    def write_index_file(self, file_path, content):
+        '''
+        Compresses index file content, and writes it to file_path (replacing previous index file only once it is completely written)
+        @return manifest entry for index file (without ETag and Last-Modified)
+        '''
 
-            except:
-                pass
+        content = content.encode('utf-8')
 
+        with gzip.open(file_path + '.part', 'wb') as index_file:
+            index_file.write(content)
 
-        logging.info(f'''No net asset value found for {series_name} for document {adsh}''')
+        os.replace(file_path + '.part', file_path)
 
+        return {'rows': content.count(b'\n'), 'size': os.path.getsize(file_path), 'uncompressed_size': len(content), 'downloaded_at': dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
-    def get_nq_series_data(self, series, xml, report_type):
+
+    def download_index_file(self, proxy_manager, year, quarter, entry=None):
         '''
-        Gets data for a given series in an N-Q report
-        @param series: series id
-        @param xml: the content of N-Q report in xml format
-        @report_type: N-Q or N-Q/A
+        Downloads zipped master index of a quarter, and saves it compressed as index file (yyyy-QTRx.tsv.gz)
+        If entry (index manifest) is given, the request is conditional (ETag/Last-Modified), and the file is only downloaded if it has changed
+        Every line of master.idx must be a complete row, so a truncated download is never saved
+        @return manifest entry for index file
         '''
 
-        #Pre-allocate fields with NULL for database tables
+        url = self.index_base_url + f'''{year}/QTR{quarter}/master.zip'''
+        file_path = self.get_index_filepath(year, quarter)
 
-        #date, quarter end date
-        dates_data = [None, None]
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = proxy_manager.get(url, headers=headers)
+
+        if response.status_code == 304:
+            logging.info(f'''{url} has not changed since it was downloaded to {file_path}''')
+            return dict(entry, downloaded_at=dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+        #Zip CRC is checked as master.idx is read
+        with zipfile.ZipFile(io.BytesIO(response.content)) as zip_file:
+            master_idx = zip_file.read('master.idx')
+
+        content = self.translate_master_index(master_idx)
+
+        #Rows of master.idx have 5 fields (cik|company|filing_type|filing_date|txt_endpoint)
+        incomplete_rows = [line for line in content.splitlines() if line.count('|') != 5]
+        if len(incomplete_rows) > 0:
+            raise ValueError(f'''{url} has {len(incomplete_rows)} incomplete rows''')
+
+        entry = self.write_index_file(file_path, content)
+        entry['etag'] = response.headers.get('ETag')
+        entry['last_modified'] = response.headers.get('Last-Modified')
+
+        logging.info(f'''Downloaded {url} ({entry['rows']} rows) to {file_path}''')
+
+        return entry
+
+
+    def migrate_index_file(self, year, quarter):
+        '''
+        Compresses index file saved by a previous version (yyyy-QTRx.tsv), so it need not be downloaded again
+        @return manifest entry for index file, or None if there is no such file
+        '''
+
+        legacy_file_path = self.config['network_drives']['index_files'] + '\\' + f'''{year}-QTR{quarter}.tsv'''
+
+        if not os.path.exists(legacy_file_path):
+            return None
+
+        downloaded_at = dt.datetime.fromtimestamp(os.path.getmtime(legacy_file_path)).strftime('%Y-%m-%d %H:%M:%S')
+
+        with open(legacy_file_path, 'r', encoding='utf-8') as legacy_file:
+            entry = self.write_index_file(self.get_index_filepath(year, quarter), legacy_file.read())
+
+        entry['downloaded_at'] = downloaded_at
+        os.remove(legacy_file_path)
+
+        logging.info(f'''Compressed {legacy_file_path}''')
+
+        return entry
+
+
+    def obtain_index_files(self, proxy_manager):
+        '''
+        Downloads index files that are missing or incomplete, and checks index files that may still change (is_index_final) with conditional requests
+        Downloads run concurrently (download_workers in config.json); proxy_manager.rate_limiter caps requests per second
+        '''
+
+        start_year = int(self.config['index']['start_year'])
+        if start_year < 2011:
+            logging.info('Please note that the SEC only publishes prospectus data (expense ratios) starting 2011.')
+        if start_year < 1993:
+            logging.error('start_year in config.json needs to be greater than or equal to 1993, because that is the first year that the SEC published index files.')
+
+        os.makedirs(self.config['network_drives']['index_files'], exist_ok=True)
+
+        #Get all index files and place in configured network drive location
+        index_start_time = time.time()
+
+        manifest = self.read_manifest()
+        downloads = []
+
+        for year, quarter in self.get_index_quarters(start_year):
+
+            file_path = self.get_index_filepath(year, quarter)
+            key = f'''{year}-QTR{quarter}'''
+
+            if (key not in manifest) and (not os.path.exists(file_path)):
+                entry = self.migrate_index_file(year, quarter)
+                if entry is not None:
+                    manifest[key] = entry
+
+            entry = manifest.get(key)
+
+            if not self.verify_index_file(file_path, entry):
+                downloads.append((year, quarter, None))
+            elif not self.is_index_final(year, quarter, entry):
+                downloads.append((year, quarter, entry))
+
+        with ThreadPoolExecutor(max_workers=int(self.config['index']['download_workers'])) as executor:
+
+            futures = {executor.submit(self.download_index_file, proxy_manager, year, quarter, entry): (year, quarter) for year, quarter, entry in downloads}
+
+            for future in concurrent.futures.as_completed(futures):
+
+                year, quarter = futures[future]
+
+                try:
+                    manifest[f'''{year}-QTR{quarter}'''] = future.result()
+                except:
+                    logging.error(f'''Could not download SEC index file for {year} QTR{quarter}.''')
+                    continue
+
+                #Manifest is written as each download completes, so an interrupted run keeps the files it downloaded
+                self.write_manifest(manifest)
+
+        self.write_manifest(manifest)
+
+        index_execution_time = (time.time() - index_start_time)/60
+        logging.info(f'''SEC index file(s) download took {index_execution_time:.2f} minutes; {len(downloads)} index file(s) downloaded or checked.''')
+
+
+    def get_index_files(self):
+
+        #Get all index files in network drive
+        glob_str = self.config['network_drives']['index_files'] + '\\*.tsv.gz'
+        self.index_files = sorted(glob.glob(glob_str))
+
+        return self.index_files
+
+
+    def get_catalog_filepath(self):
+
+        return self.config['network_drives']['index_files'] + '\\filing_catalog.db'
+
+
+    def connect_catalog(self):
+        '''Opens filing catalog, creating its tables if needed'''
+
+        conn = sqlite3.connect(self.get_catalog_filepath())
+
+        #Clustered on (cik, filing type, filing date), so a lookup only reads rows of the ciks asked for
+        create_tables = '''
+        CREATE TABLE IF NOT EXISTS filings(
+            CIK INTEGER,
+            FILING_TYPE TEXT,
+            FILING_DATE TEXT,
+            TXT_ENDPOINT TEXT,
+            QUARTER TEXT,
+            LINE INTEGER,
+            PRIMARY KEY (CIK, FILING_TYPE, FILING_DATE, TXT_ENDPOINT))
+            WITHOUT ROWID;
+
+        CREATE INDEX
+            IF NOT EXISTS QUARTER_IDX
+            ON filings(QUARTER);
+
+        CREATE TABLE IF NOT EXISTS catalog_files(
+            QUARTER TEXT PRIMARY KEY,
+            SIZE INTEGER,
+            MTIME REAL,
+            ROWS INTEGER);
+        '''
+        conn.executescript(create_tables)
+
+        return conn
+
+
+    def load_index_file(self, conn, index_file, expected_rows=None):
+        '''
+        Replaces filing catalog rows of an index file's quarter with rows of index file, in one transaction
+        @param expected_rows: rows of index file when it was downloaded (index manifest); if given, and index file has a different number of rows, nothing is loaded
+        @raise IOError if index file does not have expected_rows rows
+        '''
+
+        quarter = self.get_index_key(index_file)
+        column_names = ['cik', 'company', 'filing_type', 'filing_date', 'txt_endpoint', 'html_endpoint']
+        use_columns = ['cik', 'filing_type', 'filing_date', 'txt_endpoint']
+        rows = 0
+
+        with conn:
+
+            conn.execute('''DELETE FROM filings WHERE QUARTER = ?''', (quarter,))
+
+            try:
+                chunks = pd.read_csv(index_file, sep='|', names=column_names, usecols=use_columns, dtype=str, quoting=csv.QUOTE_NONE, chunksize=200000)
+            except pd.errors.EmptyDataError:
+                #Index file has no rows; checked on decompressed content, as a compressed (.gz) file is never empty on disk
+                chunks = []
+
+            for chunk in chunks:
+
+                chunk.insert(4, 'quarter', quarter)
+                chunk['line'] = chunk.index
+                chunk['cik'] = chunk['cik'].astype(int)
+
+                conn.executemany('''INSERT OR REPLACE INTO filings (CIK, FILING_TYPE, FILING_DATE, TXT_ENDPOINT, QUARTER, LINE) VALUES (?,?,?,?,?,?)''', chunk.astype(object).itertuples(index=False, name=None))
+                rows += len(chunk)
+
+            #Raised inside transaction, so quarter's catalog rows are left as they were
+            if (expected_rows is not None) and (rows != expected_rows):
+                raise IOError(f'''{index_file} has {rows} rows, but had {expected_rows} rows when it was downloaded''')
+
+            file_stat = os.stat(index_file)
+            conn.execute('''INSERT OR REPLACE INTO catalog_files (QUARTER, SIZE, MTIME, ROWS) VALUES (?,?,?,?)''', (quarter, file_stat.st_size, file_stat.st_mtime, rows,))
+
+        logging.info(f'''Loaded {rows} filings of {index_file} into filing catalog''')
+
+
+    def update_filing_catalog(self):
+        '''
+        Loads index files that are new, or have changed (size or modification time) since they were loaded, into filing catalog
+        Rows loaded are checked against rows in index manifest; an index file with a different number of rows is removed from index manifest, so it is downloaded again (obtain_index_files)
+        '''
+
+        conn = self.connect_catalog()
+        manifest = self.read_manifest()
+
+        try:
+            loaded = {row[0]: (row[1], row[2]) for row in conn.execute('''SELECT QUARTER, SIZE, MTIME FROM catalog_files''')}
+
+            for index_file in self.get_index_files():
+
+                file_stat = os.stat(index_file)
+                quarter = self.get_index_key(index_file)
+
+                if loaded.get(quarter) == (file_stat.st_size, file_stat.st_mtime):
+                    continue
+
+                try:
+                    self.load_index_file(conn, index_file, manifest[quarter]['rows'] if quarter in manifest else None)
+                except IOError as error:
+                    logging.error(f'''{error}; it will be downloaded again.''')
+                    del manifest[quarter]
+                    self.write_manifest(manifest)
+
+        finally:
+            conn.close()
+
+
+    def query_filings(self, ciks, filing_types, start_date, end_date):
+        '''
+        Gets filings of ciks and filing types filed in date range from filing catalog, in index file order
+        @param ciks: list of ciks (leading zeros optional)
+        @param filing_types: list of filing types
+        @param start_date: first filing date, 'yyyy-mm-dd'
+        @param end_date: last filing date, 'yyyy-mm-dd'
+        @return dataframe with columns cik, filing_type, filing_date, txt_endpoint
+        '''
+
+        ciks = sorted({int(cik) for cik in ciks})
+        filing_types = list(filing_types)
+        chunks = []
+
+        conn = self.connect_catalog()
+
+        try:
+            #Older SQLite versions allow at most 999 query parameters
+            for i in range(0, max(len(ciks), 1), 500):
+
+                cik_chunk = ciks[i:i + 500]
+
+                query = f'''
+                SELECT CAST(CIK AS TEXT) AS cik, FILING_TYPE AS filing_type, FILING_DATE AS filing_date, TXT_ENDPOINT AS txt_endpoint, QUARTER, LINE
+                FROM filings
+                WHERE CIK IN ({','.join('?' * len(cik_chunk))})
+                    AND FILING_TYPE IN ({','.join('?' * len(filing_types))})
+                    AND FILING_DATE BETWEEN ? AND ?
+                '''
+                chunks.append(pd.read_sql(query, conn, params=cik_chunk + filing_types + [start_date, end_date]))
+
+        finally:
+            conn.close()
+
+        filings_df = pd.concat(chunks, ignore_index=True).sort_values(by=['QUARTER', 'LINE'], ignore_index=True)
+        filings_df = filings_df.drop(columns=['QUARTER', 'LINE'])
+        filings_df['filing_date'] = pd.to_datetime(filings_df['filing_date'], format='%Y-%m-%d')
+
+        return filings_df
+
+
+class filingHeader(typing.NamedTuple):
+    '''
+    SEC header of a report (see holdingsCourier.get_filing_header)
+    Dates are formatted yyyy-mm-dd; series is a tuple of (series id, series name) tuples, in order of appearance
+    '''
+
+    accession_number: str
+    form_type: str
+    filed_date: str
+    period_end_date: str
+    cik: str
+    series: tuple
+
+
+class holdingsCourier():
+    '''
+    Gets fund holdings data from N-Q (pre-2019) and NPORT-P (2019 onward) reports
+
+    Structure of method use:
+
+    - get_report_urls (indexCourier.query_filings, scan_index_file (find_index_rows), or read_index_file)
+    - filter_ingested_reports (get_accession_number)->skips reports in ingestion ledger, records the rest as pending
+    - obtain_insert_holdings_data (obtain_insert_holdings_data_async, obtain_insert_holdings_data_pipeline, fetch_reports_async)
+        - get_report_content (get_primary_document_content, get_primary_document_url)
+        - get_report_outcome (get_report_data)
+        - ingest_report (insert_report_data)->records outcome in ingestion ledger
+    - get_report_data
+        - get_filing_header (format_date)->accession number, dates, and series of report, read once
+        - get_series_in_report, filter_to_desired_series
+        - get_nq_net_assets_all (get_series_name_from_id, get_split_series_name, get_nq_section_net_assets)->locates every series' net assets in one pass
+        - get_nq_series_data->needed because N-Q has multiple series per report
+            - translate_period_end_quarter_end
+        - get_nport_data->not really needed, just easier to reuse methods
+            - translate_period_end_quarter_end
+            - get_nport_net_assets (get_nport_fields)
+    '''
+
+    def __init__(self, config):
+
+
+        self.calendar = quarterCalendar()
+        self.index_files = None
+        self.filtered_index_files = []
+        self.filtered_report_urls = []
+        self.config = config
+
+        #Lines of SEC header that hold report fields (e.g. ACCESSION NUMBER:  0000000000-00-000000), or series tags (e.g. <SERIES-ID>S000000000)
+        self.header_pattern = re.compile(r'^[ \t]*(?:(?P<field>ACCESSION NUMBER|CONFORMED SUBMISSION TYPE|CONFORMED PERIOD OF REPORT|FILED AS OF DATE|CENTRAL INDEX KEY):[ \t]*(?P<value>[^\r\n]*?)|<(?P<tag>SERIES-ID|SERIES-NAME)>[ \t]*(?P<tag_value>[^\r\n]*?))[ \t]*\r?$', re.MULTILINE)
+
+
+    ###### Methods that get or assist in getting report urls ######
+    def translate_index_to_date(self, index_file):
+        '''
+        Gets quarter end date for index file
+        @param index_file: absolute path of index file
+        @return quarter end date of index file in datetime type
+        '''
+
+        #yyyy-QTRx.tsv.gz
+        index_file_name = Path(index_file).name.split('.')[0]
+        year, quarter = index_file_name.split('-QTR')
+
+        return self.calendar.quarter_end_date(int(year), int(quarter))
+
+
+    def filter_indexes(self, db_manager, index_courier):
+        '''
+        Create list of all index files that have yet to be inserted into database
+        Starts from ingestion ledger's resume date, or, if ledger is empty, from the most recent filing date in holdings table
+        '''
+
+        self.index_files = index_courier.get_index_files()
+
+        try:
+            most_recent_date = db_manager.get_ledger_resume_date(int(self.config['holdings']['max_attempts']))
+        except:
+            most_recent_date = None
+
+        if most_recent_date is None:
+
+            try:
+                most_recent_date = db_manager.get_most_recent_holdings_date()
+            except:
+                most_recent_date = dt.datetime(1993, 1, 1)
+
+        for index_file in self.index_files:
+
+            index_date = self.translate_index_to_date(index_file)
+
+            if index_date >= most_recent_date:
+
+                self.filtered_index_files.append(index_file)
+
+        logging.info(f'(index files to be used for holdings insert: {self.filtered_index_files}')
+
+
+    def read_index_file(self, index_file):
+        '''
+        Reads all rows of index file
+        @return dataframe with columns cik, filing_type, filing_date, txt_endpoint
+        '''
+
+        #Parameters for reading in index files
+        column_names=['cik', 'company', 'filing_type', 'filing_date', 'txt_endpoint', 'html_endpoint']
+        use_columns = ['cik', 'filing_type', 'filing_date', 'txt_endpoint']
+        dtype_dict = {'cik': str, 'filing_type': str, 'txt_endpoint': str}
+
+        chunks = []
+        #Read data in chunks of 250,000, to ensure enough memory
+        chunk_index = 0
+        for chunk in pd.read_csv(index_file, sep='|', names=column_names, usecols=use_columns, dtype=dtype_dict, parse_dates=['filing_date'], infer_datetime_format=True, engine='python', chunksize=100000):
+            chunk_index += 1
+            logging.info(f'''Read in chunk {chunk_index} of 100,000 rows of data for {index_file}''')
+            chunks.append(chunk)
+
+        #Concatenate chunks of rows into single dataframe with all trades data
+        return pd.concat(chunks, ignore_index=True)
+
+
+    def find_index_rows(self, index_map, ciks, filing_types):
+        '''
+        Finds lines of index file content with desired ciks and filing types; only matching lines are parsed
+        Filing types are rare in index files, so each is found with find, then its line is checked for a desired cik
+        @param index_map: index file content (memory-mapped file, or bytes)
+        @return list of (line position, cik, filing_type, filing_date, txt_endpoint) tuples
+        '''
+
+        rows = []
+
+        for filing_type in filing_types:
+
+            #Pipes on both sides, so N-Q does not match N-Q/A
+            marker = b'|' + filing_type + b'|'
+            position = index_map.find(marker)
+
+            while position != -1:
+
+                line_start = index_map.rfind(b'\n', 0, position) + 1
+                line_end = index_map.find(b'\n', position)
+                if line_end == -1:
+                    line_end = len(index_map)
+
+                #cik|company|filing_type|filing_date|txt_endpoint|html_endpoint
+                fields = index_map[line_start:line_end].rstrip(b'\r').split(b'|')
+
+                if fields[0] in ciks and fields[2] == filing_type:
+                    rows.append((line_start, fields[0].decode(), fields[2].decode(), fields[3].decode(), fields[4].decode()))
+
+                position = index_map.find(marker, line_end)
+
+        return rows
+
+
+    def find_index_rows_streamed(self, file, ciks, filing_types, chunk_size=8*1024*1024):
+        '''
+        Finds lines (find_index_rows) of index file content read from file object (e.g. gzip file) chunk_size bytes at a time, so memory use does not grow with file size
+        Each chunk is cut after its last complete line; the rest is carried into the next chunk
+        @return list of (line position in file, cik, filing_type, filing_date, txt_endpoint) tuples
+        '''
+
+        rows = []
+        position = 0
+        remainder = b''
+
+        while True:
+
+            chunk = file.read(chunk_size)
+            content = remainder + chunk
+
+            if len(chunk) > 0:
+                #Lines are only searched once complete
+                content_end = content.rfind(b'\n') + 1
+                remainder = content[content_end:]
+                content = content[:content_end]
+
+            rows.extend([(position + row[0],) + row[1:] for row in self.find_index_rows(content, ciks, filing_types)])
+            position += len(content)
+
+            if len(chunk) == 0:
+                break
+
+        return rows
+
+
+    def scan_index_file(self, index_file):
+        '''
+        Gets rows of index file with desired ciks and filing types, by byte-level search (find_index_rows) of memory-mapped file
+        Compressed (.tsv.gz) index files are decompressed as a stream, and searched a chunk at a time (find_index_rows_streamed)
+        @return dataframe with columns cik, filing_type, filing_date, txt_endpoint
+        '''
+
+        ciks = {cik.lstrip("0").encode() for cik in self.config['ciks']}
+        filing_types = [filing_type.encode() for filing_type in self.config['filings']]
+
+        #(line position, cik, filing_type, filing_date, txt_endpoint)
+        rows = []
+
+        if index_file.endswith('.gz'):
+
+            with gzip.open(index_file, 'rb') as file:
+                rows = self.find_index_rows_streamed(file, ciks, filing_types)
+
+        elif os.path.getsize(index_file) > 0:
+
+            with open(index_file, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as index_map:
+                rows = self.find_index_rows(index_map, ciks, filing_types)
+
+        #Rows in file order, as if read by read_index_file
+        rows.sort()
+
+        index_df = pd.DataFrame([row[1:] for row in rows], columns=['cik', 'filing_type', 'filing_date', 'txt_endpoint'])
+        index_df['filing_date'] = pd.to_datetime(index_df['filing_date'], format='%Y-%m-%d')
+
+        logging.info(f'''Scanned {index_file}; {len(index_df)} rows with desired ciks and filing types''')
+
+        return index_df
+
+
+    def get_report_urls(self, index_courier=None):
+        '''
+        Get all report urls that match criteria and add to list of list of dict
+        scan_mode (config.json) is catalog (query of index_courier's filing catalog), mmap (byte-level search of index files, parsing only matching lines), or pandas (parsing every line)
+        catalog falls back to mmap if no index_courier is given
+        '''
+
+        index_base_url = 'https://www.sec.gov/Archives/'
+
+        #Filing type filter
+        filing_filter = self.config['filings']
+
+        for index_file in self.filtered_index_files:
+
+            if (self.config['index']['scan_mode'] == 'catalog') and (index_courier is not None):
+                quarter_end = self.translate_index_to_date(index_file)
+                quarter_start = quarter_end.replace(month=quarter_end.month - 2, day=1)
+                index_df = index_courier.query_filings(self.config['ciks'], self.config['filings'], quarter_start.strftime('%Y-%m-%d'), quarter_end.strftime('%Y-%m-%d'))
+            elif self.config['index']['scan_mode'] != 'pandas':
+                index_df = self.scan_index_file(index_file)
+            else:
+                index_df = self.read_index_file(index_file)
+
+            #Get desired ciks from config json file
+            ciks = self.config['ciks']
+            #Strip leading zeros
+            strip_ciks = [cik.lstrip("0") for cik in ciks]
+            #Remove duplicate ciks
+            strip_ciks = list(set(strip_ciks))
+            #Keep only rows where cik is desired cik
+            index_df = index_df[index_df['cik'].isin(strip_ciks)]
+
+            #Keep only rows where filing type is desired filing type
+            index_df = index_df[index_df['filing_type'].isin(filing_filter)]
+
+            #Sort by date (allows for filing amendments to replace during database inserts)
+            index_df.sort_values(by=['filing_date', 'filing_type'], ascending=True, inplace=True, ignore_index=True)
+
+            #Convert txt_endpoint column to list
+            #txt_endpoint_list = index_df['txt_endpoint'].to_list()
+
+            #Add base url to each txt endpoint
+            #url_list = [index_base_url + endpoint for endpoint in txt_endpoint_list]
+
+            #Add base url to endpoint
+            index_df['url'] = index_base_url + index_df['txt_endpoint']
+
+            #Create list of dicts [{cik: "", filing_type: "", url: ""}, ...]
+            date_type_index_df = index_df[['filing_type', 'url']]
+            url_list = date_type_index_df.to_dict('records')
+
+            #Append url list for this index to total url list
+            self.filtered_report_urls.append(url_list)
+
+        #flatten list of urls
+        #self.filtered_report_urls = [url for index_file in self.filtered_report_urls for url in index_file]
+
+
+    def get_accession_number(self, report):
+        '''Gets accession number of report from its url (e.g. https://www.sec.gov/Archives/edgar/data/0000000000/0000000000-00-000000.txt)'''
+
+        return Path(report['url']).stem
+
+
+    def filter_ingested_reports(self, db_manager):
+        '''
+        Removes reports that are not to be ingested again (ingestion ledger) from report urls, and records the rest as pending
+        Failed reports are retried, up to max_attempts (config.json) times
+        '''
+
+        skip_accessions = db_manager.get_ledger_accessions_to_skip(int(self.config['holdings']['max_attempts']))
+        seen_accessions = set()
+        skipped = 0
+
+        for i, (index_file, index) in enumerate(zip(self.filtered_index_files, self.filtered_report_urls)):
+
+            index_date = self.translate_index_to_date(index_file).strftime('%Y-%m-%d')
+            planned_reports = []
+
+            for report in index:
+
+                accession_number = self.get_accession_number(report)
+
+                #A filing is listed once per filer, so may appear more than once
+                if accession_number in skip_accessions or accession_number in seen_accessions:
+                    skipped += 1
+                    continue
+
+                seen_accessions.add(accession_number)
+                planned_reports.append(report)
+
+            db_manager.insert_ledger_pending_many([(self.get_accession_number(report), report['filing_type'], index_date, report['url']) for report in planned_reports])
+
+            self.filtered_report_urls[i] = planned_reports
+
+        logging.info(f'''{len(seen_accessions)} reports to be ingested; {skipped} skipped, as already in ingestion ledger''')
+
+
+    ###### Methods that get or assist in getting report data ######
+    def get_filing_header(self, content):
+        '''
+        Reads SEC header of report in a single pass over its raw text, without building a tree
+        @param content: content of report in bytes (complete submission, or anything that begins with its SEC header)
+        @return filingHeader
+        '''
+
+        header_end = content.find(b'</SEC-HEADER>')
+        if header_end == -1:
+            header_end = len(self.get_header_content(content))
+
+        fields = {}
+        series = []
+
+        for match in self.header_pattern.finditer(content[:header_end].decode('latin-1')):
+
+            if match.group('field') is not None:
+                #First occurrence wins (e.g. filer's CIK comes before any other CIK)
+                fields.setdefault(match.group('field'), match.group('value'))
+
+            elif match.group('tag') == 'SERIES-ID':
+                series.append([match.group('tag_value')[:10], None])
+
+            elif (len(series) > 0) and (series[-1][1] is None):
+                series[-1][1] = match.group('tag_value')
+
+        filed_date = fields.get('FILED AS OF DATE')
+        period_end_date = fields.get('CONFORMED PERIOD OF REPORT')
+
+        return filingHeader(accession_number=fields.get('ACCESSION NUMBER'),
+            form_type=fields.get('CONFORMED SUBMISSION TYPE'),
+            filed_date=self.format_date(filed_date) if filed_date is not None else None,
+            period_end_date=self.format_date(period_end_date) if period_end_date is not None else None,
+            cik=fields.get('CENTRAL INDEX KEY'),
+            series=tuple([tuple(series_pair) for series_pair in series]))
+
+
+    def get_series_in_report(self, header):
+        '''Gets all id's of series present in report (from its filingHeader)'''
+
+        series_list = []
+
+        for series, series_name in header.series:
+
+            #Series may be listed more than once (e.g. in both existing and merger series)
+            if series not in series_list:
+                series_list.append(series)
+
+        return series_list
+
+
+    def filter_to_desired_series(self, series_list):
+        '''Filters list of series ids to those that are desired by user (noted in configuration json file)'''
+
+        desired_series_list = self.config['series_to_index'].keys()
+        filtered_series_list = []
+
+        for series in series_list:
+
+            if series in desired_series_list:
+
+                filtered_series_list.append(series)
+
+        return filtered_series_list
+
+
+    def translate_period_end_quarter_end(self, period_end_date):
+        '''Produces the quarter end date (yyyy-mm-dd) from any date (also needs to be formatted yyyy-mm-dd)'''
+
+        return self.calendar.quarter_end(period_end_date)
+
+
+    def format_date(self, date):
+        '''Takes date in yyyymmdd format and places in yyyy-mm-dd'''
+
+        return date[:4] + '-' + date[4:6] + '-' + date[6:8]
+
+
+    def get_series_name_from_id(self, series, header):
+        '''Gets series name from series id (from report's filingHeader)'''
+
+        for series_id, series_name in header.series:
+
+            if series_id == series:
+                return series_name
+
+
+    def get_split_series_name(self, series_name):
+        '''Get words after first word (necessary because Fidelity will sometimes use @R symbol in second name, but not in first)'''
+
+        if " " in series_name:
+            return series_name.split(" ", 1)[1]
+
+        return series_name
+
+
+    def get_nq_net_assets_all(self, series_list, header, xml):
+        '''
+        Attempts to get net assets for every series in series_list from report, in one pass over the document
+        Heuristic, for each series:
+            - Section of series is the second occurrence of (split) series name in the document; third if "Name of Fund" is present
+              Making (what I believe to be true assumption) that first occurrence of series name is above html, and second will have net assets below it
+            - Making assumption that there are no more than 10 instances of 'net assets' between the series section and the desired 'net assets'
+              (headers such as 'percentage of net assets' are skipped)
+            - Make assumption that there are less than 10 columns (td) between 'net assets' and the value; value is the first td that contains ,###
+        @return dict of series id: net assets (None if not found)
+        '''
+
+        adsh = header.accession_number
+
+        #Series names are used as regular expressions
+        name_patterns = {}
+        series_split_names = {}
+
+        for series in series_list:
+
+            series_name = self.get_series_name_from_id(series, header)
+
+            if series_name is None:
+                continue
+
+            split_series_name = self.get_split_series_name(series_name)
+
+            try:
+                name_patterns[split_series_name] = re.compile(split_series_name)
+                series_split_names[series] = split_series_name
+            except re.error:
+                logging.info(f'''{series_name} cannot be searched for in the document {adsh}.''')
+
+        #Combined matcher over all names; a text node is only checked against each name if it matches one of them
+        try:
+            combined_pattern = re.compile('|'.join(['(?:' + name + ')' for name in name_patterns]))
+        except re.error:
+            combined_pattern = None
+
+        name_of_fund_pattern = re.compile('Name of Fund')
+        net_assets_pattern = re.compile('(?i)net assets')
+
+        #Positions (in document order) of first three occurrences of each name, of 'net assets' text, and of td tags
+        name_positions = {name: [] for name in name_patterns}
+        net_assets_positions = []
+        net_assets_texts = []
+        td_positions = []
+        tds = []
+        name_of_fund_found = False
+
+        for position, element in enumerate(xml.descendants):
+
+            if isinstance(element, NavigableString):
+
+                if (len(name_patterns) > 0) and ((combined_pattern is None) or (combined_pattern.search(element) is not None)):
+
+                    for name, name_pattern in name_patterns.items():
+
+                        if (len(name_positions[name]) < 3) and (name_pattern.search(element) is not None):
+                            name_positions[name].append(position)
+
+                if (not name_of_fund_found) and (name_of_fund_pattern.search(element) is not None):
+                    name_of_fund_found = True
+
+                if net_assets_pattern.search(element) is not None:
+                    net_assets_positions.append(position)
+                    net_assets_texts.append(element)
+
+            elif element.name == 'td':
+                td_positions.append(position)
+                tds.append(element)
+
+        occurrence = 3 if name_of_fund_found else 2
+        net_assets = {}
+
+        for series in series_list:
+
+            net_assets[series] = None
+
+            if series not in series_split_names:
+                continue
+
+            series_name = self.get_series_name_from_id(series, header)
+            positions = name_positions[series_split_names[series]]
+
+            if len(positions) < occurrence:
+                logging.info(f'''{series_name} does not have a second occurrence in the document {adsh}, or at least that the bot could find.''')
+                continue
+
+            net_assets[series] = self.get_nq_section_net_assets(positions[occurrence - 1], net_assets_positions, net_assets_texts, td_positions, tds)
+
+            if net_assets[series] is None:
+                logging.info(f'''No net asset value found for {series_name} for document {adsh}''')
+
+        return net_assets
+
+
+    def get_nq_section_net_assets(self, section_position, net_assets_positions, net_assets_texts, td_positions, tds):
+        '''Gets net assets value that follows series section (see get_nq_net_assets_all)'''
+
+        first_net_assets = bisect.bisect_right(net_assets_positions, section_position)
+
+        for i in range(first_net_assets, min(first_net_assets + 10, len(net_assets_positions))):
+
+            #Take out headers of what we don't want
+            if bool(re.search('(?i)percentage of net assets', net_assets_texts[i])):
+                continue
+
+            if bool(re.search('(?i)percentages shown are based on net assets', net_assets_texts[i])):
+                continue
+
+            first_td = bisect.bisect_right(td_positions, net_assets_positions[i])
+
+            for next_td in tds[first_td:first_td + 10]:
+
+                next_td_text = next_td.text
+
+                #Match if contains ,### (this does exclude possibility for fund to have less than $1mil in assets (if in 000's))
+                if bool(re.search(r'(,\d{3})', next_td_text)):
+
+                    #Extract net asset value (digits only)
+                    ######### Please note that the N-Q values may be in 000's #########
+                    net_assets_list = re.findall(r'\d+', next_td_text)
+                    return "".join(net_assets_list)
+
+        return None
+
+
+    def get_nq_net_assets(self, series, header, xml):
+        '''Attempts to get net assets for series from report'''
+
+        return self.get_nq_net_assets_all([series], header, xml)[series]
+
+
+    def get_nq_series_data(self, series, header, xml, report_type, located_net_assets=None):
+        '''
+        Gets data for a given series in an N-Q report
+        @param series: series id
+        @param header: filingHeader of N-Q report
+        @param xml: the content of N-Q report in xml format
+        @report_type: N-Q or N-Q/A
+        @param located_net_assets: dict of series id: net assets for all series in report (see get_nq_net_assets_all); located for this series alone if None
+        '''
+
+        #Pre-allocate fields with NULL for database tables
+
+        #date, quarter end date
+        dates_data = [None, None]
+
+        #adsh, report type, filing date, period end date, series id, net assets
+        holdings_data = [None, None, None, None, None, None]
+
+        period_end_date = header.period_end_date
+        quarter_end_date = self.translate_period_end_quarter_end(period_end_date)
+
+        #Assign dates data
+        dates_data[0] = period_end_date
+        dates_data[1] = quarter_end_date
+
+        #Assign holdings data
+        holdings_data[0] = header.accession_number
+        holdings_data[1] = report_type
+        holdings_data[2] = header.filed_date
+        holdings_data[3] = period_end_date
+        holdings_data[4] = series
+        if located_net_assets is None:
+            holdings_data[5] = self.get_nq_net_assets(series, header, xml)
+        else:
+            holdings_data[5] = located_net_assets[series]
+
+        #Convert to tuples
+        dates_data = tuple(dates_data)
+        holdings_data = tuple(holdings_data)
+
+        return dates_data, holdings_data
+
+
+    def get_header_content(self, content):
+        '''Gets SEC header of report (everything before the first document), which holds the report's accession number, dates, and series'''
+
+        header_end = content.find(b'<DOCUMENT>')
+
+        if header_end == -1:
+            return content
+
+        return content[:header_end]
+
+
+    def get_nport_fields(self, content, chunk_size=65536):
+        '''
+        Reads NPORT-P xml incrementally, and stops as soon as series id, period, and net assets have been read
+        General (genInfo) and fund (fundInfo) information precede the holdings (invstOrSec), so the holdings are never parsed
+        @param content: content of NPORT-P report in bytes
+        @return dict of seriesId, repPdEnd, repPdDate, and netAssets (None if not found)
+        '''
+
+        fields = {'seriesId': None, 'repPdEnd': None, 'repPdDate': None, 'netAssets': None}
+
+        xml_start = content.find(b'<edgarSubmission')
+        if xml_start == -1:
+            return fields
+
+        parser = etree.XMLPullParser(events=('start', 'end'), recover=True)
+
+        for i in range(xml_start, len(content), chunk_size):
+
+            parser.feed(content[i:i + chunk_size])
+
+            for event, element in parser.read_events():
+
+                tag = etree.QName(element).localname
+
+                if event == 'start':
+                    #Holdings have been reached; there is nothing more to find
+                    if tag == 'invstOrSecs':
+                        return fields
+                    continue
+
+                if (tag in fields) and (fields[tag] is None) and (element.text is not None):
+                    fields[tag] = element.text.strip()
+
+                if None not in fields.values():
+                    return fields
+
+        return fields
+
+
+    def get_nport_net_assets(self, content):
+
+        net_assets = self.get_nport_fields(content)['netAssets']
+
+        return net_assets
+
+
+    def get_nport_data(self, series, header, report_type, content):
+
+        '''
+        Gets data for a given series in an NPORT-P report
+        @param series: series id
+        @param header: filingHeader of NPORT-P report
+        @report_type: NPORT-P or NPORT-P/A
+        @param content: content of NPORT-P report in bytes
+        '''
+
+        #Pre-allocate fields with NULL for database tables
+
+        #date, quarter end date
+        dates_data = [None, None]
 
         #adsh, report type, filing date, period end date, series id, net assets
         holdings_data = [None, None, None, None, None, None]
 
-        adsh = self.get_adsh(xml)
-        period_end_date = self.get_period_end_date(xml)
-        quarter_end_date = self.translate_period_end_quarter_end(period_end_date)
+        period_end_date = header.period_end_date
+        quarter_end_date = self.translate_period_end_quarter_end(period_end_date)
+
+        #Assign dates data
+        dates_data[0] = period_end_date
+        dates_data[1] = quarter_end_date
+
+        #Assign holdings data
+        holdings_data[0] = header.accession_number
+        holdings_data[1] = report_type
+        holdings_data[2] = header.filed_date
+        holdings_data[3] = period_end_date
+        holdings_data[4] = series
+        holdings_data[5] = self.get_nport_net_assets(content)
+
+        #Convert to tuples
+        dates_data = tuple(dates_data)
+        holdings_data = tuple(holdings_data)
+
+        return dates_data, holdings_data
+
+
+    def get_primary_document_url(self, proxy_manager, report):
+        '''
+        Finds primary document (NPORT-P primary_doc.xml, or the N-Q html) of a report from its filing index
+        @return url of primary document, or None if filing index does not list one
+        '''
+
+        index_url = report['url'].replace('.txt', '-index.html')
+        index_xml = BeautifulSoup(proxy_manager.get(index_url).content, 'lxml')
+
+        document_table = index_xml.find('table', {'summary': 'Document Format Files'})
+        if document_table is None:
+            return None
+
+        #Columns: Seq, Description, Document, Type, Size
+        for row in document_table.find_all('tr'):
+
+            cells = row.find_all('td')
+            if len(cells) < 4:
+                continue
+
+            link = cells[2].find('a')
+
+            #xsl links are the SEC's html rendering of the xml document
+            if (link is not None) and (cells[3].text.strip() == report['filing_type']) and ('/xsl' not in link['href']):
+                return urllib.parse.urljoin(index_url, link['href'])
+
+        return None
+
+
+    def get_primary_document_content(self, proxy_manager, report):
+        '''
+        Downloads only the SEC header and primary document of a report, rather than its complete submission (.txt), which also includes every exhibit and graphic
+        @return content laid out as a complete submission (SEC header, then document) in bytes, or None if filing index does not list a primary document
+        '''
+
+        document_url = self.get_primary_document_url(proxy_manager, report)
+
+        if document_url is None:
+            return None
+
+        header = proxy_manager.get_prefix(report['url'], b'</SEC-HEADER>')
+        document = proxy_manager.get(document_url).content
+
+        return header + b'\n<DOCUMENT>\n' + document + b'\n</DOCUMENT>\n'
+
+
+    def get_report_content(self, proxy_manager, report):
+        '''
+        Downloads report from SEC website
+        If primary_document_only (config.json), only the SEC header and primary document are downloaded; the complete submission is downloaded if the filing index is unavailable
+        Download time is kept in report['fetch_seconds'], for ingestion ledger
+        @return content of report in bytes, or None if the SEC website did not respond
+        '''
+
+        start_time = time.perf_counter()
+
+        if self.config['holdings']['primary_document_only']:
+
+            try:
+                content = self.get_primary_document_content(proxy_manager, report)
+            except:
+                content = None
+
+            if content is not None:
+                report['fetch_seconds'] = time.perf_counter() - start_time
+                return content
+
+            logging.info(f"Could not find primary document in filing index for url {report['url']}; downloading complete submission.")
+
+        try:
+            response = proxy_manager.get(report['url'])
+        except:
+            print(f"Did not receive response from SEC website for url {report['url']}. The site may be down; please check and re-run when it is available.")
+            logging.info(f"Did not receive response from SEC website for url {report['url']}. The site may be down; please check and re-run when it is available.")
+            return None
+
+        report['fetch_seconds'] = time.perf_counter() - start_time
+
+        return response.content
+
+
+    async def fetch_reports_async(self, proxy_manager, reports):
+        '''
+        Downloads reports concurrently, with no more than max_in_flight (config.json) requests at once; proxy_manager.rate_limiter caps requests per second
+        Yields (report, content) in the same order as reports, so that amendments (N-Q/A, NPORT-P/A) are still inserted after their originals
+        @param reports: list of dicts [{filing_type: "", url: ""}, ...]
+        '''
+
+        max_in_flight = int(self.config['holdings']['max_in_flight'])
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=max_in_flight)
+
+        #Downloads that have been scheduled, in report order; kept to twice the number of workers to bound memory
+        pending = collections.deque()
+
+        try:
+            for report in reports:
+
+                pending.append((report, loop.run_in_executor(executor, self.get_report_content, proxy_manager, report)))
+
+                if len(pending) >= 2 * max_in_flight:
+                    report, future = pending.popleft()
+                    yield report, await future
+
+            while pending:
+                report, future = pending.popleft()
+                yield report, await future
+
+        finally:
+            for report, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+
+    def get_report_data(self, report, content):
+        '''
+        Gets data for all desired series in an N-Q or NPORT-P report
+        @return list of (dates_data, holdings_data) tuples, one per desired series in report
+        '''
+
+        report_data = []
+
+        #SEC header is read first, so reports without any desired series are never parsed further
+        header = self.get_filing_header(content)
+        series_list = self.get_series_in_report(header)
+        filtered_series_list = self.filter_to_desired_series(series_list)
+
+        if len(filtered_series_list) == 0:
+            return report_data
+
+        if ((report['filing_type'] == 'N-Q') | (report['filing_type'] == 'N-Q/A')):
+
+            #Transfer content to xml format
+            xml = BeautifulSoup(content, 'lxml')
+
+            #Net assets of all desired series are located together, in a single pass over the document
+            located_net_assets = self.get_nq_net_assets_all(filtered_series_list, header, xml)
+
+            for series in filtered_series_list:
+
+                report_data.append(self.get_nq_series_data(series, header, xml, report['filing_type'], located_net_assets))
+
+        elif ((report['filing_type'] == 'NPORT-P') | (report['filing_type'] == 'NPORT-P/A')):
+
+            #NPORT-P xml is read incrementally (get_nport_fields), never transferred to xml format
+            #Don't need to loop through NPORT (because 1 series per report), but just easier to reuse the series list methods
+            for series in filtered_series_list:
+
+                report_data.append(self.get_nport_data(series, header, report['filing_type'], content))
+
+        return report_data
+
+
+    def get_report_outcome(self, report, content):
+        '''
+        Gets data of a downloaded report, timing how long it takes
+        @return (report_data, content_hash, parse_seconds)
+        '''
+
+        start_time = time.perf_counter()
+        content_hash = hashlib.sha256(content).hexdigest()
+        report_data = self.get_report_data(report, content)
+
+        return report_data, content_hash, time.perf_counter() - start_time
+
+
+    def insert_report_data(self, db_manager, report, report_data):
+        '''Inserts (dates_data, holdings_data) tuples of a report into database, in one transaction'''
+
+        with db_manager.transaction():
+
+            #insert or replace into dates
+            db_manager.insert_dates_many([dates_data for dates_data, holdings_data in report_data])
+
+            #insert or replace into holdings
+            db_manager.insert_holdings_many([holdings_data for dates_data, holdings_data in report_data])
+
+            #Facts commit with the data they are computed from, so readers (e.g. queryService) never see stale facts
+            db_manager.refresh_series_quarter_facts()
+
+        for dates_data, holdings_data in report_data:
+
+            logging.info(f'''Holdings data obtained and inserted for {holdings_data[4]} {report['filing_type']} with filing period end date of {dates_data[0]}''')
+
+
+    def ingest_report(self, db_manager, report, get_outcome):
+        '''
+        Inserts data of a report, and records outcome in ingestion ledger (the same for every fetch_mode)
+        Report is marked successful in the same transaction as its data is inserted, so a report whose data is missing is never skipped
+        @param get_outcome: callable that returns (report_data, content_hash, parse_seconds) of report, raising if report could not be parsed; None if report could not be downloaded
+        '''
+
+        accession_number = self.get_accession_number(report)
+        fetch_seconds = report.get('fetch_seconds')
+
+        if get_outcome is None:
+
+            db_manager.update_ledger(accession_number, report['filing_type'], report['url'], 'failed', None, 'download failed', fetch_seconds, None)
+            return
+
+        try:
+            report_data, content_hash, parse_seconds = get_outcome()
+        except Exception as error:
+            logging.error(f'''Could not get holdings data from {report['url']}: {error}''')
+            db_manager.update_ledger(accession_number, report['filing_type'], report['url'], 'failed', None, f'parse failed: {error}', fetch_seconds, None)
+            return
+
+        with db_manager.transaction():
+
+            self.insert_report_data(db_manager, report, report_data)
+
+            parse_outcome = f'{len(report_data)} series inserted' if len(report_data) > 0 else 'no desired series'
+            db_manager.update_ledger(accession_number, report['filing_type'], report['url'], 'success', content_hash, parse_outcome, fetch_seconds, parse_seconds)
+
+
+    async def obtain_insert_holdings_data_async(self, db_manager, proxy_manager):
+        '''Inserts reports in order as their concurrent downloads complete'''
+
+        reports = [report for index in self.filtered_report_urls for report in index]
+
+        async for report, content in self.fetch_reports_async(proxy_manager, reports):
+
+            self.ingest_report(db_manager, report, None if content is None else functools.partial(self.get_report_outcome, report, content))
+
+
+    def put_until_stopped(self, stage_queue, item, stop):
+        '''Puts item on bounded queue, waiting while it is full; gives up (returns False) once pipeline is stopped'''
+
+        while not stop.is_set():
+
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+
+    def get_until_stopped(self, stage_queue, stop):
+        '''Gets next item from queue, waiting while it is empty; returns None once pipeline is stopped'''
+
+        while not stop.is_set():
+
+            try:
+                return stage_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+        return None
+
+
+    def get_future_result(self, future):
+        '''Gets result of parse future, waiting in short timeouts, so that Ctrl-C interrupts the wait (untimed waits cannot be interrupted on Windows)'''
+
+        while True:
+
+            try:
+                return future.result(timeout=0.1)
+            except concurrent.futures.TimeoutError:
+                pass
+
+
+    def join_stage(self, stage):
+        '''Waits for stage thread to finish, in short timeouts, so that Ctrl-C interrupts the wait'''
+
+        while stage.is_alive():
+            stage.join(timeout=0.1)
+
+
+    async def fetch_stage_async(self, proxy_manager, reports, fetched_queue, stop):
+
+        async for report, content in self.fetch_reports_async(proxy_manager, reports):
+
+            #Failed downloads are passed on too, to be recorded in ingestion ledger
+            if not self.put_until_stopped(fetched_queue, (report, content), stop):
+                break
+
+
+    def fetch_stage(self, proxy_manager, reports, fetched_queue, stop):
+        '''Pipeline stage (thread): downloads reports concurrently, and queues their content in report order'''
+
+        try:
+            asyncio.run(self.fetch_stage_async(proxy_manager, reports, fetched_queue, stop))
+        finally:
+            #No more reports
+            self.put_until_stopped(fetched_queue, None, stop)
+
+
+    def parse_stage(self, executor, fetched_queue, parsed_queue, stop):
+        '''Pipeline stage (thread): hands downloaded reports to process pool, and queues their futures in report order'''
+
+        try:
+            while True:
+
+                item = self.get_until_stopped(fetched_queue, stop)
+
+                if item is None:
+                    break
+
+                report, content = item
+                future = None if content is None else executor.submit(parse_report, self.config, report, content)
+
+                if not self.put_until_stopped(parsed_queue, (report, future), stop):
+                    if future is not None:
+                        future.cancel()
+                    break
+
+        finally:
+            #No more reports
+            self.put_until_stopped(parsed_queue, None, stop)
+
+
+    def obtain_insert_holdings_data_pipeline(self, db_manager, proxy_manager):
+        '''
+        Runs holdings insert as a pipeline of stages, so that downloads, parsing, and inserts overlap:
+            - fetch_stage (thread): concurrent downloads (fetch_reports_async)
+            - parse_stage (thread): parsing in a pool of parser_processes processes (config.json; 0 uses every core)
+            - insert (this thread): database inserts, in report order, so that amendments still replace their originals
+        Stages are joined by bounded queues (fetch_queue_size and parse_queue_size in config.json), which bound the number of reports held in memory
+        '''
+
+        holdings_config = self.config['holdings']
+        reports = [report for index in self.filtered_report_urls for report in index]
+
+        fetched_queue = queue.Queue(maxsize=int(holdings_config['fetch_queue_size']))
+        parsed_queue = queue.Queue(maxsize=int(holdings_config['parse_queue_size']))
+        stop = threading.Event()
+
+        executor = ProcessPoolExecutor(max_workers=int(holdings_config['parser_processes']) or os.cpu_count(), initializer=init_parse_process)
+
+        fetcher = threading.Thread(target=self.fetch_stage, args=(proxy_manager, reports, fetched_queue, stop), daemon=True)
+        parser = threading.Thread(target=self.parse_stage, args=(executor, fetched_queue, parsed_queue, stop), daemon=True)
+        fetcher.start()
+        parser.start()
+
+        try:
+            while True:
+
+                #Polled, as are waits on futures and threads, so that Ctrl-C is not held up by a download in its read timeout and retries
+                item = self.get_until_stopped(parsed_queue, stop)
+
+                if item is None:
+                    break
+
+                report, future = item
+
+                self.ingest_report(db_manager, report, None if future is None else functools.partial(self.get_future_result, future))
+
+            self.join_stage(fetcher)
+
+        except KeyboardInterrupt:
+            logging.info('Holdings insert interrupted; stopping pipeline.')
+            raise
+
+        finally:
+            stop.set()
+
+            #Reports that were queued, but will not be inserted
+            while not parsed_queue.empty():
+                item = parsed_queue.get_nowait()
+                if item is not None and item[1] is not None:
+                    item[1].cancel()
+
+            #Fetcher may be waiting on a download; as a daemon thread, it does not hold up an interrupted run
+            self.join_stage(parser)
+            executor.shutdown(wait=True)
+
+
+    def obtain_insert_holdings_data(self, db_manager, proxy_manager):
+        '''
+        Downloads each report, gets its data, and inserts data into database
+        fetch_mode (config.json) is sequential (one download at a time), async (concurrent downloads), or pipeline (concurrent downloads, parsing in a process pool)
+        '''
+
+        if self.config['holdings']['fetch_mode'] == 'pipeline':
+
+            self.obtain_insert_holdings_data_pipeline(db_manager, proxy_manager)
+            return
+
+        if self.config['holdings']['fetch_mode'] == 'async':
+
+            asyncio.run(self.obtain_insert_holdings_data_async(db_manager, proxy_manager))
+            return
+
+        for index in self.filtered_report_urls:
+
+            for report in index:
+
+                #Get content from url
+                content = self.get_report_content(proxy_manager, report)
+
+                self.ingest_report(db_manager, report, None if content is None else functools.partial(self.get_report_outcome, report, content))
+
+
+def init_parse_process():
+    '''Parser processes ignore Ctrl-C; the main process stops the pipeline and shuts them down'''
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def parse_report(config, report, content):
+    '''Gets data of a report in a parser process (see holdingsCourier.obtain_insert_holdings_data_pipeline)'''
+
+    return holdingsCourier(config).get_report_outcome(report, content)
+
+
+class databaseManager():
+    '''
+    Performs all database operations
+    Writes go through one long-lived connection; reads (select_data, query) use read-only connections
+    journal_mode (config.json) defaults to DELETE, which is safe on the network drives the database is kept on; WAL lets reads run while ingestion is writing, but requires shared memory, so only set it if the database folder is a local disk
+    WAL is not used for UNC paths (\\\\server\\share\\...), and synchronous=NORMAL (or OFF) is raised to FULL unless the journal mode is WAL, as it is only durable with WAL (see get_journal_mode, get_connection)
+    select_data reads series_quarter_facts, which triggers on holdings, prospectus, and entities keep marking (series_quarter_dirty) for refresh_series_quarter_facts
+    Schema changes to existing databases are migrations (get_migrations), applied by create_tables and tracked in PRAGMA user_version
+    '''
+
+    def __init__(self, config):
+
+        self.conn = None
+        self.cursor = None
+        self.config = config
+        self.in_transaction = False
+
+
+    def get_database_filepath(self):
+
+        return self.config['network_drives']['database'] + '\\sec_extractor.db'
+
+
+    def get_database_uri(self, mode):
+        '''
+        Gets SQLite URI of database file, with an empty authority, so UNC paths (\\\\server\\share\\...) of network drives keep their server in the path (file:////server/share/...)
+        Path is not resolved, as that would turn a mapped drive letter into its UNC path
+        @param mode: ro, rw, or rwc
+        '''
+
+        database_path = Path(self.get_database_filepath())
+        posix_path = urllib.parse.quote(database_path.as_posix(), safe='/:')
+
+        if posix_path.startswith('/'):
+            #Rooted (/folder) and UNC (//server/share) paths
+            uri = 'file://' + posix_path
+        elif database_path.is_absolute():
+            #Drive letter paths (C:/folder)
+            uri = 'file:///' + posix_path
+        else:
+            uri = 'file:' + posix_path
+
+        return uri + '?mode=' + mode
+
+
+    def get_journal_mode(self):
+        '''Gets journal_mode (config.json), downgraded from WAL to DELETE if database is on a network share (UNC path), where WAL's shared memory can corrupt it'''
+
+        journal_mode = self.config['database']['journal_mode'].upper()
+        database_path = self.get_database_filepath()
+
+        if (journal_mode == 'WAL') and (database_path.startswith('\\\\') or database_path.startswith('//')):
+            logging.warning(f'''journal_mode (config.json) is WAL, which is not safe on network share {database_path}; using DELETE''')
+            return 'DELETE'
+
+        return journal_mode
+
+
+    def set_pragmas(self, conn, synchronous=None):
+        '''
+        Sets performance pragmas in config.json on connection
+        @param synchronous: synchronous pragma to use instead of synchronous (config.json)
+        '''
+
+        database_config = self.config['database']
+
+        conn.execute(f'''PRAGMA synchronous={database_config['synchronous'] if synchronous is None else synchronous}''')
+        conn.execute(f'''PRAGMA cache_size={int(database_config['cache_size'])}''')
+        conn.execute(f'''PRAGMA mmap_size={int(database_config['mmap_size'])}''')
+        conn.execute(f'''PRAGMA temp_store={database_config['temp_store']}''')
+
+
+    def get_connection(self):
+        '''Gets long-lived read/write connection, opening it on first use'''
+
+        if self.conn is None:
+
+            self.conn = sqlite3.connect(self.get_database_filepath(), cached_statements=int(self.config['database']['cached_statements']))
+            #Journal mode is persistent in database file; it is set before other pragmas as synchronous=NORMAL is only safe with WAL
+            journal_mode = self.conn.execute(f'''PRAGMA journal_mode={self.get_journal_mode()}''').fetchone()[0].upper()
+
+            synchronous = self.config['database']['synchronous'].upper()
+            if (journal_mode != 'WAL') and (synchronous in ['NORMAL', 'OFF', '1', '0']):
+                logging.warning(f'''synchronous (config.json) is {synchronous}, which is only durable with WAL; using FULL with journal mode {journal_mode}''')
+                synchronous = 'FULL'
+
+            self.set_pragmas(self.conn, synchronous)
+
+        return self.conn
+
+
+    def get_read_connection(self, check_same_thread=True):
+        '''
+        Gets new read-only connection; caller closes it
+        @param check_same_thread: if False, connection can be shared between threads (caller serializes its use)
+        @return sqlite3 connection that cannot write to database
+        '''
+
+        conn = sqlite3.connect(self.get_database_uri('ro'), uri=True, cached_statements=int(self.config['database']['cached_statements']), check_same_thread=check_same_thread)
+        self.set_pragmas(conn)
+
+        return conn
+
+
+    def close(self):
+        '''Closes long-lived connection'''
+
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+    def db_decorator(db_method):
+        '''
+        Decorator/wrapper for database CRUD operations; creates cursor on long-lived connection before operation, commits changes, and closes cursor
+        Inside a transaction (see transaction), the transaction's cursor is used, and changes are committed when it ends
+        '''
+
+        @functools.wraps(db_method)
+        def db_wrapper(self, *args):
+
+            if self.in_transaction:
+                return db_method(self, *args)
+
+            conn = self.get_connection()
+            self.cursor = conn.cursor()
+
+            try:
+                db_method_return = db_method(self, *args)
+                conn.commit()
+            except:
+                conn.rollback()
+                raise
+            finally:
+                self.cursor.close()
+
+            return db_method_return
+
+        return db_wrapper
+
+
+    @db_decorator
+    def create_tables(self):
+
+        self.cursor.execute('''SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'series_quarter_facts' ''')
+        facts_exist = self.cursor.fetchone()[0] > 0
+
+        create_tables = '''
+        CREATE TABLE IF NOT EXISTS entities(
+        CLASS_ID TEXT UNIQUE,
+        SERIES_ID TEXT,
+        CIK INTEGER,
+        COMPANY TEXT);
+
+        CREATE UNIQUE INDEX
+            IF NOT EXISTS CLASS_ID_IDX
+            ON entities(CLASS_ID);
+
+        CREATE TABLE IF NOT EXISTS dates(
+                DATE TEXT UNIQUE,
+                QUARTER_END_DATE TEXT);
+
+        CREATE UNIQUE INDEX
+            IF NOT EXISTS DATE_IDX
+            ON dates(DATE);
+
+        CREATE TABLE IF NOT EXISTS prospectus(
+            ADSH TEXT,
+            FILING_TYPE TEXT,
+            FILING_DATE TEXT,
+            EFFECTIVE_DATE TEXT,
+            CLASS_ID TEXT,
+            EXPENSE_RATIO REAL,
+            NET_EXPENSE_RATIO REAL,
+            AVG_ANN_1YR_RETURN REAL,
+            AVG_ANN_5YR_RETURN REAL,
+            AVG_ANN_10YR_RETURN REAL,
+            AVG_ANN_RETURN_SINCE_INCEPTION REAL,
+            PRIMARY KEY (CLASS_ID, EFFECTIVE_DATE),
+            FOREIGN KEY (CLASS_ID) REFERENCES entities(CLASS_ID),
+            FOREIGN KEY (EFFECTIVE_DATE) REFERENCES dates(DATE));
+
+        CREATE TABLE IF NOT EXISTS holdings(
+            ADSH TEXT,
+            FILING_TYPE TEXT,
+            FILING_DATE TEXT,
+            PERIOD_END_DATE TEXT,
+            SERIES_ID TEXT,
+            NET_ASSETS REAL,
+            PRIMARY KEY (SERIES_ID, PERIOD_END_DATE),
+            FOREIGN KEY (PERIOD_END_DATE) REFERENCES dates(DATE));
+
+        CREATE TABLE IF NOT EXISTS quarters(
+            QUARTER TEXT UNIQUE);
+
+        CREATE TABLE IF NOT EXISTS ingestion_ledger(
+            ADSH TEXT PRIMARY KEY,
+            FILING_TYPE TEXT,
+            INDEX_DATE TEXT,
+            URL TEXT,
+            STATUS TEXT,
+            CONTENT_HASH TEXT,
+            PARSE_OUTCOME TEXT,
+            ATTEMPTS INTEGER DEFAULT 0,
+            FETCH_SECONDS REAL,
+            PARSE_SECONDS REAL,
+            UPDATED_AT TEXT);
+
+        CREATE TABLE IF NOT EXISTS prospectus_manifest(
+            QUARTER_END_DATE TEXT PRIMARY KEY,
+            CONTENT_HASH TEXT,
+            SIZE INTEGER,
+            MTIME REAL,
+            INGESTED_AT TEXT,
+            PROSPECTUS_ROWS INTEGER,
+            CLASS_ROWS INTEGER,
+            DATE_ROWS INTEGER);
+
+        CREATE TABLE IF NOT EXISTS series_quarter_facts(
+            SERIES_ID TEXT,
+            QUARTER_END_DATE TEXT,
+            HOLDINGS_FILING_TYPE TEXT,
+            AVERAGE_NET_ASSETS REAL,
+            HAS_HOLDINGS INTEGER DEFAULT 0,
+            PROSPECTUS_FILING_TYPE TEXT,
+            CIK INTEGER,
+            COMPANY TEXT,
+            AVERAGE_EXPENSE_RATIO REAL,
+            AVERAGE_NET_EXPENSE_RATIO REAL,
+            AVERAGE_ANNUAL_1YR_RETURN REAL,
+            AVERAGE_ANNUAL_5YR_RETURN REAL,
+            AVERAGE_ANNUAL_10YR_RETURN REAL,
+            AVERAGE_ANNUAL_RETURN_SINCE_INCEPTION REAL,
+            HAS_PROSPECTUS INTEGER DEFAULT 0,
+            IN_RANGE INTEGER DEFAULT 0,
+            CIK_IMPUTE INTEGER,
+            COMPANY_IMPUTE TEXT,
+            AVERAGE_EXPENSE_RATIO_IMPUTE REAL,
+            AVERAGE_NET_EXPENSE_RATIO_IMPUTE REAL,
+            PRIMARY KEY (SERIES_ID, QUARTER_END_DATE));
+
+        CREATE TABLE IF NOT EXISTS series_quarter_dirty(
+            SERIES_ID TEXT,
+            QUARTER_END_DATE TEXT,
+            PRIMARY KEY (SERIES_ID, QUARTER_END_DATE));
+
+        CREATE TRIGGER IF NOT EXISTS HOLDINGS_INSERT_FACTS AFTER INSERT ON holdings
+        BEGIN
+            INSERT OR IGNORE INTO series_quarter_dirty (SERIES_ID, QUARTER_END_DATE)
+            SELECT NEW.SERIES_ID, QUARTER_END_DATE FROM dates WHERE DATE = NEW.PERIOD_END_DATE;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS HOLDINGS_DELETE_FACTS AFTER DELETE ON holdings
+        BEGIN
+            INSERT OR IGNORE INTO series_quarter_dirty (SERIES_ID, QUARTER_END_DATE)
+            SELECT OLD.SERIES_ID, QUARTER_END_DATE FROM dates WHERE DATE = OLD.PERIOD_END_DATE;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS PROSPECTUS_INSERT_FACTS AFTER INSERT ON prospectus
+        BEGIN
+            INSERT OR IGNORE INTO series_quarter_dirty (SERIES_ID, QUARTER_END_DATE)
+            SELECT e.SERIES_ID, d.QUARTER_END_DATE FROM entities e, dates d WHERE e.CLASS_ID = NEW.CLASS_ID AND d.DATE = NEW.EFFECTIVE_DATE;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS PROSPECTUS_DELETE_FACTS AFTER DELETE ON prospectus
+        BEGIN
+            INSERT OR IGNORE INTO series_quarter_dirty (SERIES_ID, QUARTER_END_DATE)
+            SELECT e.SERIES_ID, d.QUARTER_END_DATE FROM entities e, dates d WHERE e.CLASS_ID = OLD.CLASS_ID AND d.DATE = OLD.EFFECTIVE_DATE;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS ENTITIES_INSERT_FACTS BEFORE INSERT ON entities
+        BEGIN
+            INSERT OR IGNORE INTO series_quarter_dirty (SERIES_ID, QUARTER_END_DATE)
+            SELECT e.SERIES_ID, d.QUARTER_END_DATE FROM entities e
+            INNER JOIN prospectus p ON p.CLASS_ID = e.CLASS_ID
+            INNER JOIN dates d ON d.DATE = p.EFFECTIVE_DATE
+            WHERE e.CLASS_ID = NEW.CLASS_ID AND (e.SERIES_ID IS NOT NEW.SERIES_ID OR e.CIK IS NOT NEW.CIK OR e.COMPANY IS NOT NEW.COMPANY);
+
+            INSERT OR IGNORE INTO series_quarter_dirty (SERIES_ID, QUARTER_END_DATE)
+            SELECT NEW.SERIES_ID, d.QUARTER_END_DATE FROM entities e
+            INNER JOIN prospectus p ON p.CLASS_ID = e.CLASS_ID
+            INNER JOIN dates d ON d.DATE = p.EFFECTIVE_DATE
+            WHERE e.CLASS_ID = NEW.CLASS_ID AND (e.SERIES_ID IS NOT NEW.SERIES_ID OR e.CIK IS NOT NEW.CIK OR e.COMPANY IS NOT NEW.COMPANY);
+        END;
+        '''
+
+        self.cursor.executescript(create_tables)
+
+        self.migrate()
+
+        #Facts table is new (first run, or existing database), so every cell is computed on next refresh
+        if not facts_exist:
+            self.mark_all_facts_dirty()
+
+
+    def get_migrations(self):
+        '''Schema migrations, in order; PRAGMA user_version of a database is the number of migrations applied to it'''
+
+        return [self.migrate_normalize_dates, self.migrate_secondary_indexes]
+
+
+    def migrate(self):
+        '''
+        Applies schema migrations the database has not had yet (called by create_tables, in its transaction, so a database is migrated completely or not at all)
+        Migrations are idempotent, so one interrupted before its commit is applied again on next run
+        '''
+
+        self.cursor.execute('''PRAGMA user_version''')
+        version = self.cursor.fetchone()[0]
+        migrations = self.get_migrations()
+
+        for i, migration in enumerate(migrations[version:], version):
+
+            start_time = time.time()
+            migration()
+            #PRAGMA does not take parameters
+            self.cursor.execute(f'''PRAGMA user_version = {i + 1}''')
+
+            logging.info(f'''Database migrated to schema version {i + 1} ({migration.__name__}) in {time.time() - start_time:.2f} seconds''')
+
+
+    def migrate_normalize_dates(self):
+        '''
+        Schema version 1: dates are stored as ISO text (yyyy-mm-dd), so joins and watermark queries compare columns directly, instead of wrapping them in date(), which no index can serve
+        Values date() cannot read are left as they are; rows whose key becomes a duplicate replace the existing row
+        '''
+
+        date_columns = [('holdings', 'FILING_DATE'), ('holdings', 'PERIOD_END_DATE'), ('prospectus', 'FILING_DATE'), ('prospectus', 'EFFECTIVE_DATE'), ('dates', 'DATE'), ('dates', 'QUARTER_END_DATE'), ('quarters', 'QUARTER')]
+
+        for table, column in date_columns:
+
+            self.cursor.execute(f'''UPDATE OR REPLACE {table} SET {column} = date({column}) WHERE date({column}) IS NOT NULL AND {column} <> date({column})''')
+
+            if self.cursor.rowcount > 0:
+                logging.info(f'''Normalized {self.cursor.rowcount} dates of {table}.{column}''')
+
+        #Cells of series_quarter_facts may have been keyed by dates as they were before
+        self.cursor.execute('''DELETE FROM series_quarter_facts''')
+        self.mark_all_facts_dirty()
+
+
+    def migrate_secondary_indexes(self):
+        '''
+        Schema version 2: indexes for watermark queries (MIN/MAX of a date column is read from the end of its index) and covering indexes for the joins of refresh_series_quarter_facts
+        '''
+
+        create_indexes = '''
+        CREATE INDEX IF NOT EXISTS HOLDINGS_FILING_DATE_IDX ON holdings(FILING_DATE);
+        CREATE INDEX IF NOT EXISTS PROSPECTUS_FILING_DATE_IDX ON prospectus(FILING_DATE);
+        CREATE INDEX IF NOT EXISTS PROSPECTUS_EFFECTIVE_DATE_IDX ON prospectus(EFFECTIVE_DATE);
+        CREATE INDEX IF NOT EXISTS DATES_QUARTER_END_DATE_IDX ON dates(QUARTER_END_DATE);
+        DROP INDEX IF EXISTS ENTITIES_SERIES_IDX;
+        CREATE INDEX IF NOT EXISTS ENTITIES_SERIES_CLASS_IDX ON entities(SERIES_ID, CLASS_ID, CIK, COMPANY);
+        '''
+
+        #One statement at a time, as executescript would commit the migration transaction
+        for statement in create_indexes.split(';'):
+            if statement.strip():
+                self.cursor.execute(statement)
+
+
+    def explain_query_plan(self, sql, params=None):
+        '''
+        Gets how SQLite will run a query (e.g. whether it searches an index, or scans a whole table)
+        @return list of EXPLAIN QUERY PLAN detail strings
+        '''
+
+        conn = self.get_read_connection()
+
+        try:
+            return [row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params or ())]
+        finally:
+            conn.close()
+
+
+    def mark_all_facts_dirty(self):
+        '''Marks every (series, quarter) cell with holdings or prospectus data for refresh_series_quarter_facts'''
+
+        sql = '''
+        INSERT OR IGNORE INTO series_quarter_dirty (SERIES_ID, QUARTER_END_DATE)
+        SELECT h.SERIES_ID, d.QUARTER_END_DATE FROM holdings h
+        INNER JOIN dates d ON d.DATE = h.PERIOD_END_DATE
+        UNION
+        SELECT e.SERIES_ID, d.QUARTER_END_DATE FROM prospectus p
+        INNER JOIN entities e ON e.CLASS_ID = p.CLASS_ID
+        INNER JOIN dates d ON d.DATE = p.EFFECTIVE_DATE
+        '''
+
+        self.cursor.execute(sql)
+
+
+    @db_decorator
+    def insert_first_date(self):
+        '''
+        Insert first date with available & desired data (minus one day) if not already in dates table
+        Required to get most recent date if no data input yet
+        '''
+
+        #Get day before configured start_year
+        desired_start = dt.datetime(int(self.config['index']['start_year']), 1, 1)
+        first_date = desired_start - dt.timedelta(1)
+
+        #Format date to be inserted
+        first_date_int_str = first_date.strftime(format='%Y%m%d')
+        first_date_str = first_date.strftime(format='%Y-%m-%d')
+        #quarter end date is same as first_date_str
+
+        insert_first_date = '''
+        INSERT OR REPLACE INTO dates (DATE, QUARTER_END_DATE) VALUES (?,?)
+        '''
+        self.cursor.execute(insert_first_date, (first_date_str, first_date_str,))
+
+
+    @db_decorator
+    def insert_ledger_pending_many(self, reports):
+        '''
+        Records reports planned for ingestion as pending in ingestion ledger; reports already in ledger keep their status
+        @param reports: list of (ADSH, FILING_TYPE, INDEX_DATE, URL) tuples
+        '''
+
+        sql = '''INSERT OR IGNORE INTO ingestion_ledger (ADSH, FILING_TYPE, INDEX_DATE, URL, STATUS) VALUES (?,?,?,?,'pending')'''
+
+        self.cursor.executemany(sql, reports)
+
+
+    @db_decorator
+    def update_ledger(self, accession_number, filing_type, url, status, content_hash, parse_outcome, fetch_seconds, parse_seconds):
+        '''Records outcome of an ingestion attempt of a report in ingestion ledger'''
+
+        self.cursor.execute('''INSERT OR IGNORE INTO ingestion_ledger (ADSH, FILING_TYPE, URL, STATUS) VALUES (?,?,?,'pending')''', (accession_number, filing_type, url,))
+
+        sql = '''
+        UPDATE ingestion_ledger
+        SET STATUS = ?, CONTENT_HASH = ?, PARSE_OUTCOME = ?, FETCH_SECONDS = ?, PARSE_SECONDS = ?, ATTEMPTS = ATTEMPTS + 1, UPDATED_AT = ?
+        WHERE ADSH = ?
+        '''
+        updated_at = dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        self.cursor.execute(sql, (status, content_hash, parse_outcome, fetch_seconds, parse_seconds, updated_at, accession_number,))
+
+
+    @db_decorator
+    def get_ledger_accessions_to_skip(self, max_attempts):
+        '''
+        Gets accession numbers that are not to be ingested again: successfully ingested, or failed max_attempts times
+        @return set of accession numbers
+        '''
+
+        sql = '''
+        SELECT ADSH FROM ingestion_ledger
+        WHERE STATUS = 'success' OR (STATUS = 'failed' AND ATTEMPTS >= ?)
+        '''
+        self.cursor.execute(sql, (max_attempts,))
+
+        return {row[0] for row in self.cursor.fetchall()}
+
+
+    @db_decorator
+    def get_ledger_resume_date(self, max_attempts):
+        '''
+        Gets index quarter end date from which holdings ingestion resumes: the earliest quarter with a pending or retryable report, else the latest quarter in ledger
+        @return date in datetime type, or None if ledger is empty
+        '''
+
+        sql = '''
+        SELECT COALESCE(
+            (SELECT MIN(INDEX_DATE) FROM ingestion_ledger WHERE STATUS = 'pending' OR (STATUS = 'failed' AND ATTEMPTS < ?)),
+            (SELECT MAX(INDEX_DATE) FROM ingestion_ledger))
+        '''
+        self.cursor.execute(sql, (max_attempts,))
+        resume_date = self.cursor.fetchone()[0]
+
+        if resume_date is None:
+            return None
+
+        resume_date = dt.datetime.strptime(resume_date, '%Y-%m-%d')
+
+        logging.info(f'Holdings ingestion resumes from index quarter ending {resume_date}')
+
+        return resume_date
+
+
+    @db_decorator
+    def get_most_recent_holdings_date(self):
+
+        max_date = '''
+        SELECT MAX(FILING_DATE)
+        FROM holdings
+        '''
+        self.cursor.execute(max_date)
+        most_recent_date = self.cursor.fetchone()[0]
+        most_recent_date = dt.datetime.strptime(most_recent_date, '%Y-%m-%d')
+
+        logging.info(f'Most recent filing date in holdings table is {most_recent_date}')
+
+        return most_recent_date
+
+
+    @db_decorator
+    def get_most_recent_prospectus_date(self):
+
+        max_date = '''
+        SELECT MAX(FILING_DATE)
+        FROM prospectus
+        '''
+        self.cursor.execute(max_date)
+        most_recent_date = self.cursor.fetchone()[0]
+        most_recent_date = dt.datetime.strptime(most_recent_date, '%Y-%m-%d')
+
+        logging.info(f'Most recent filing date in prospectus table is {most_recent_date}')
+
+        return most_recent_date
+
+
+    @db_decorator
+    def get_prospectus_manifest(self):
+        '''
+        Gets every prospectus dataset ingested, in a single query
+        @return dict {QUARTER_END_DATE: (CONTENT_HASH, SIZE, MTIME)}
+        '''
+
+        self.cursor.execute('''SELECT QUARTER_END_DATE, CONTENT_HASH, SIZE, MTIME FROM prospectus_manifest''')
+
+        return {row[0]: (row[1], row[2], row[3]) for row in self.cursor.fetchall()}
+
+
+    @db_decorator
+    def insert_prospectus_manifest(self, quarter_end_date, content_hash, size, mtime, prospectus_rows, class_rows, date_rows):
+
+        sql = '''INSERT OR REPLACE INTO prospectus_manifest (QUARTER_END_DATE, CONTENT_HASH, SIZE, MTIME, INGESTED_AT, PROSPECTUS_ROWS, CLASS_ROWS, DATE_ROWS) VALUES (?,?,?,?,?,?,?,?)'''
+        ingested_at = dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        self.cursor.execute(sql, (quarter_end_date, content_hash, size, mtime, ingested_at, prospectus_rows, class_rows, date_rows,))
+
+
+    @db_decorator
+    def get_most_recent_effective_date(self):
+
+        max_date = '''
+        SELECT MAX(EFFECTIVE_DATE)
+        FROM prospectus
+        '''
+        self.cursor.execute(max_date)
+        most_recent_date = self.cursor.fetchone()[0]
+        most_recent_date = dt.datetime.strptime(most_recent_date, '%Y-%m-%d')
+
+        logging.info(f'Most recent effective date in prospectus table is {most_recent_date}')
+
+        return most_recent_date
+
+
+    @db_decorator
+    def get_least_recent_effective_date(self):
+
+        min_date = '''
+        SELECT MIN(EFFECTIVE_DATE)
+        FROM prospectus
+        '''
+        self.cursor.execute(min_date)
+        least_recent_date = self.cursor.fetchone()[0]
+        least_recent_date = dt.datetime.strptime(least_recent_date, '%Y-%m-%d')
+
+        logging.info(f'Least recent effective date in prospectus table is {least_recent_date}')
+
+        return least_recent_date
+
+
+    @db_decorator
+    def get_most_recent_qtr_end_date(self):
+
+        max_qtr_end_date = '''
+        SELECT MAX(QUARTER_END_DATE)
+        FROM dates
+        '''
+        self.cursor.execute(max_qtr_end_date)
+        most_recent_qtr_end_date = self.cursor.fetchone()[0]
+        most_recent_qtr_end_date = dt.datetime.strptime(most_recent_qtr_end_date, '%Y-%m-%d')
+
+        logging.info(f'Most recent quarter end date in database is {most_recent_qtr_end_date}')
+
+        return most_recent_qtr_end_date
+
+
+    @db_decorator
+    def insert_entities(self, entities_tuple):
+
+        sql='''INSERT OR REPLACE INTO entities (CLASS_ID, SERIES_ID, CIK, COMPANY) VALUES (?,?,?,?)'''
+
+        self.cursor.execute(sql, entities_tuple)
+
+
+    @db_decorator
+    def insert_dates(self, dates_tuple):
+
+        sql='''INSERT OR REPLACE INTO dates (DATE, QUARTER_END_DATE) VALUES (?,?)'''
+
+        self.cursor.execute(sql, dates_tuple)
+
+
+    @db_decorator
+    def insert_holdings(self, holdings_tuple):
+
+        sql='''INSERT OR REPLACE INTO holdings (ADSH, FILING_TYPE, FILING_DATE, PERIOD_END_DATE, SERIES_ID, NET_ASSETS) VALUES (?,?,?,?,?,?)'''
+
+        self.cursor.execute(sql, holdings_tuple)
+
+
+    @db_decorator
+    def insert_prospectuses(self, prospectuses_tuple):
+
+        sql='''INSERT OR REPLACE INTO prospectus (ADSH, FILING_TYPE, FILING_DATE, EFFECTIVE_DATE, CLASS_ID, EXPENSE_RATIO, NET_EXPENSE_RATIO, AVG_ANN_1YR_RETURN, AVG_ANN_5YR_RETURN, AVG_ANN_10YR_RETURN, AVG_ANN_RETURN_SINCE_INCEPTION) VALUES (?,?,?,?,?,?,?,?,?,?,?)'''
+
+        self.cursor.execute(sql, prospectuses_tuple)
+
+
+    @db_decorator
+    def insert_quarters(self, quarters_tuple):
+
+        sql='''INSERT OR REPLACE INTO quarters (QUARTER) VALUES (?)'''
+
+        self.cursor.execute(sql, quarters_tuple)
+
+
+    @contextlib.contextmanager
+    def transaction(self):
+        '''
+        Unit of work: all database operations in the with block share one connection, and are committed together (or rolled back together, if an exception is raised)
+        Nested transactions join the outermost transaction
+        '''
+
+        if self.in_transaction:
+            yield self
+            return
+
+        conn = self.get_connection()
+        self.cursor = conn.cursor()
+        self.in_transaction = True
+
+        try:
+            yield self
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+        finally:
+            self.in_transaction = False
+            self.cursor.close()
+
+
+    def get_rows(self, rows):
+        '''Gets iterable of row tuples from list of tuples (or records), or from dataframe'''
+
+        if isinstance(rows, pd.DataFrame):
+            #Object dtype, so numpy values are bound as python values
+            return rows.astype(object).itertuples(index=False, name=None)
+
+        return rows
+
+
+    @db_decorator
+    def insert_many(self, sql, rows):
+        '''Inserts rows (list of tuples, or dataframe) with executemany, batch_size (config.json) rows at a time'''
+
+        batch_size = int(self.config['database']['batch_size'])
+        rows = iter(self.get_rows(rows))
+
+        while True:
 
-        #Assign dates data
-        dates_data[0] = period_end_date
-        dates_data[1] = quarter_end_date
+            batch = list(itertools.islice(rows, batch_size))
 
-        #Assign holdings data
-        holdings_data[0] = adsh
-        holdings_data[1] = report_type
-        holdings_data[2] = self.get_filed_date(xml)
-        holdings_data[3] = period_end_date
-        holdings_data[4] = series
-        holdings_data[5] = self.get_nq_net_assets(series, xml, self.get_adsh(xml))
+            if len(batch) == 0:
+                break
 
-        #Convert to tuples
-        dates_data = tuple(dates_data)
-        holdings_data = tuple(holdings_data)
+            self.cursor.executemany(sql, batch)
 
-        return dates_data, holdings_data
 
+    def insert_entities_many(self, entities):
 
-    def get_nport_net_assets(self, xml):
+        sql='''INSERT OR REPLACE INTO entities (CLASS_ID, SERIES_ID, CIK, COMPANY) VALUES (?,?,?,?)'''
 
-        net_assets = xml.find('netassets').text
+        self.insert_many(sql, entities)
 
-        return net_assets
 
+    def insert_dates_many(self, dates):
+
+        sql='''INSERT OR REPLACE INTO dates (DATE, QUARTER_END_DATE) VALUES (?,?)'''
+
+        self.insert_many(sql, dates)
+
+
+    def insert_holdings_many(self, holdings):
+
+        sql='''INSERT OR REPLACE INTO holdings (ADSH, FILING_TYPE, FILING_DATE, PERIOD_END_DATE, SERIES_ID, NET_ASSETS) VALUES (?,?,?,?,?,?)'''
+
+        self.insert_many(sql, holdings)
+
+
+    def insert_prospectuses_many(self, prospectuses):
+
+        sql='''INSERT OR REPLACE INTO prospectus (ADSH, FILING_TYPE, FILING_DATE, EFFECTIVE_DATE, CLASS_ID, EXPENSE_RATIO, NET_EXPENSE_RATIO, AVG_ANN_1YR_RETURN, AVG_ANN_5YR_RETURN, AVG_ANN_10YR_RETURN, AVG_ANN_RETURN_SINCE_INCEPTION) VALUES (?,?,?,?,?,?,?,?,?,?,?)'''
+
+        self.insert_many(sql, prospectuses)
+
+
+    def insert_quarters_many(self, quarters):
+
+        sql='''INSERT OR REPLACE INTO quarters (QUARTER) VALUES (?)'''
+
+        self.insert_many(sql, quarters)
 
-    def get_nport_data(self, series, xml, report_type):
 
+    def refresh_series_quarter_facts(self):
         '''
-        Gets data for a given series in an NPORT-P report
-        @param series: series id
-        @param xml: the content of NPORT-P report in xml format
-        @report_type: NPORT-P or NPORT-P/A
+        Brings series_quarter_facts up to date with the cells (series, quarter) marked in series_quarter_dirty since the last refresh
+        Averages (net assets, expense ratios, returns) are recomputed only for the marked cells
+        Quarter range and imputed values (from the latest prior quarter with prospectus data, even if its value is empty) are recomputed for the marked series, from series_quarter_facts itself
+        FILING_TYPE, CIK, and COMPANY of a cell are taken from one of its rows, as SQLite does for the bare columns of the original select_data query
+        @return number of cells recomputed
         '''
 
-        #Pre-allocate fields with NULL for database tables
+        #CROSS JOIN keeps SQLite from reordering joins, so only rows of the marked cells are read
+        holdings_sql = '''
+        SELECT x.SERIES_ID, x.QUARTER_END_DATE, h.FILING_TYPE, AVG(h.NET_ASSETS)
+        FROM series_quarter_dirty x
+        CROSS JOIN holdings h ON h.SERIES_ID = x.SERIES_ID
+        CROSS JOIN dates d ON d.DATE = h.PERIOD_END_DATE AND d.QUARTER_END_DATE = x.QUARTER_END_DATE
+        GROUP BY x.SERIES_ID, x.QUARTER_END_DATE
+        '''
 
-        #date, quarter end date
-        dates_data = [None, None]
+        prospectus_sql = '''
+        SELECT x.SERIES_ID, x.QUARTER_END_DATE, p.FILING_TYPE, e.CIK, e.COMPANY, AVG(p.EXPENSE_RATIO), AVG(p.NET_EXPENSE_RATIO), AVG(p.AVG_ANN_1YR_RETURN), AVG(p.AVG_ANN_5YR_RETURN), AVG(p.AVG_ANN_10YR_RETURN), AVG(p.AVG_ANN_RETURN_SINCE_INCEPTION)
+        FROM series_quarter_dirty x
+        CROSS JOIN entities e ON e.SERIES_ID = x.SERIES_ID
+        CROSS JOIN prospectus p ON p.CLASS_ID = e.CLASS_ID
+        CROSS JOIN dates d ON d.DATE = p.EFFECTIVE_DATE AND d.QUARTER_END_DATE = x.QUARTER_END_DATE
+        GROUP BY x.SERIES_ID, x.QUARTER_END_DATE
+        '''
 
-        #adsh, report type, filing date, period end date, series id, net assets
-        holdings_data = [None, None, None, None, None, None]
+        insert_sql = '''
+        INSERT INTO series_quarter_facts (SERIES_ID, QUARTER_END_DATE, HOLDINGS_FILING_TYPE, AVERAGE_NET_ASSETS, HAS_HOLDINGS, PROSPECTUS_FILING_TYPE, CIK, COMPANY, AVERAGE_EXPENSE_RATIO, AVERAGE_NET_EXPENSE_RATIO, AVERAGE_ANNUAL_1YR_RETURN, AVERAGE_ANNUAL_5YR_RETURN, AVERAGE_ANNUAL_10YR_RETURN, AVERAGE_ANNUAL_RETURN_SINCE_INCEPTION, HAS_PROSPECTUS)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+        '''
 
-        adsh = self.get_adsh(xml)
-        period_end_date = self.get_period_end_date(xml)
-        quarter_end_date = self.translate_period_end_quarter_end(period_end_date)
+        #Prior quarter of a cell: latest quarter of its series, before its quarter, with prospectus data
+        prior_sql = '''
+        (SELECT f2.{column} FROM series_quarter_facts f2
+        WHERE f2.SERIES_ID = series_quarter_facts.SERIES_ID AND f2.HAS_PROSPECTUS = 1 AND f2.QUARTER_END_DATE < series_quarter_facts.QUARTER_END_DATE
+        ORDER BY f2.QUARTER_END_DATE DESC LIMIT 1)
+        '''
 
-        #Assign dates data
-        dates_data[0] = period_end_date
-        dates_data[1] = quarter_end_date
+        series_sql = f'''
+        UPDATE series_quarter_facts
+        SET IN_RANGE = COALESCE(QUARTER_END_DATE BETWEEN
+                (SELECT MIN(f2.QUARTER_END_DATE) FROM series_quarter_facts f2 WHERE f2.SERIES_ID = series_quarter_facts.SERIES_ID AND f2.HAS_PROSPECTUS = 1)
+                AND (SELECT MAX(f2.QUARTER_END_DATE) FROM series_quarter_facts f2 WHERE f2.SERIES_ID = series_quarter_facts.SERIES_ID AND f2.HAS_PROSPECTUS = 1)
+            AND EXISTS (SELECT 1 FROM quarters WHERE QUARTER = series_quarter_facts.QUARTER_END_DATE), 0),
+        CIK_IMPUTE = COALESCE(CIK, {prior_sql.format(column='CIK')}),
+        COMPANY_IMPUTE = COALESCE(COMPANY, {prior_sql.format(column='COMPANY')}),
+        AVERAGE_EXPENSE_RATIO_IMPUTE = COALESCE(AVERAGE_EXPENSE_RATIO, {prior_sql.format(column='AVERAGE_EXPENSE_RATIO')}),
+        AVERAGE_NET_EXPENSE_RATIO_IMPUTE = COALESCE(AVERAGE_NET_EXPENSE_RATIO, {prior_sql.format(column='AVERAGE_NET_EXPENSE_RATIO')})
+        WHERE SERIES_ID IN (SELECT SERIES_ID FROM series_quarter_dirty)
+        '''
 
-        #Assign holdings data
-        holdings_data[0] = adsh
-        holdings_data[1] = report_type
-        holdings_data[2] = self.get_filed_date(xml)
-        holdings_data[3] = period_end_date
-        holdings_data[4] = series
-        holdings_data[5] = self.get_nport_net_assets(xml)
+        start_time = time.time()
 
-        #Convert to tuples
-        dates_data = tuple(dates_data)
-        holdings_data = tuple(holdings_data)
+        with self.transaction():
 
-        return dates_data, holdings_data
+            self.cursor.execute('''SELECT SERIES_ID, QUARTER_END_DATE FROM series_quarter_dirty''')
+            dirty_cells = self.cursor.fetchall()
 
+            if len(dirty_cells) == 0:
+                return 0
 
-    def obtain_insert_holdings_data(self, db_manager, proxy_manager):
+            self.cursor.execute(holdings_sql)
+            holdings = {(row[0], row[1]): row[2:] for row in self.cursor.fetchall()}
 
-        for index in self.filtered_report_urls:
+            self.cursor.execute(prospectus_sql)
+            prospectuses = {(row[0], row[1]): row[2:] for row in self.cursor.fetchall()}
 
-            for report in index:
+            self.cursor.executemany('''DELETE FROM series_quarter_facts WHERE SERIES_ID = ? AND QUARTER_END_DATE = ?''', dirty_cells)
 
-                #Get content from url
-                try:
-                    response = proxy_manager.session.get(report['url'], headers={'User-Agent': self.config['http_session']['user_agent']})
-                except:
-                    print(f"Did not receive response from SEC website for url {report['url']}. The site may be down; please check and re-run when it is available.")
-                    logging.info(f"Did not receive response from SEC website for url {report['url']}. The site may be down; please check and re-run when it is available.")
+            rows = []
+            for cell in dirty_cells:
 
-                #Transfer content to xml format
-                xml = BeautifulSoup(response.content, 'lxml')
+                if (cell not in holdings) and (cell not in prospectuses):
+                    continue
 
-                if ((report['filing_type'] == 'N-Q') | (report['filing_type'] == 'N-Q/A')):
+                cell_holdings = holdings.get(cell, (None, None))
+                cell_prospectuses = prospectuses.get(cell, (None,) * 9)
 
-                    series_list = self.get_series_in_report(xml)
-                    filtered_series_list = self.filter_to_desired_series(series_list)
+                rows.append(cell + cell_holdings + (int(cell in holdings),) + cell_prospectuses + (int(cell in prospectuses),))
 
-                    for series in filtered_series_list:
+            self.cursor.executemany(insert_sql, rows)
+            self.cursor.execute(series_sql)
+            self.cursor.execute('''DELETE FROM series_quarter_dirty''')
 
-                        dates_data, holdings_data = self.get_nq_series_data(series, xml, report['filing_type'])
+        logging.info(f'''Recomputed {len(dirty_cells)} cells of series_quarter_facts in {time.time() - start_time:.2f} seconds''')
 
-                        #insert or replace into dates
-                        db_manager.insert_dates(dates_data)
+        return len(dirty_cells)
 
-                        #insert or replace into holdings
-                        db_manager.insert_holdings(holdings_data)
 
-                        logging.info(f'''Holdings data obtained and inserted for {series} {report['filing_type']} with filing period end date of {dates_data[0]}''')
+    def get_series_quarter_facts_query(self, series_ids=None, ciks=None, start_date=None, end_date=None):
+        '''
+        Gets query of holdings of every series and quarter, with the series' prospectus data (imputed from prior quarter if missing) of the quarter
+        @param series_ids: if given, only these series
+        @param ciks: if given, only series of these ciks
+        @param start_date: if given, only quarters ending on or after this date (yyyy-mm-dd)
+        @param end_date: if given, only quarters ending on or before this date (yyyy-mm-dd)
+        @return (sql, params) tuple
+        '''
 
-                elif ((report['filing_type'] == 'NPORT-P') | (report['filing_type'] == 'NPORT-P/A')):
+        conditions = ['HAS_HOLDINGS = 1', 'IN_RANGE = 1']
+        params = []
 
-                    series_list = self.get_series_in_report(xml)
-                    filtered_series_list = self.filter_to_desired_series(series_list)
+        if series_ids:
+            conditions.append(f'''SERIES_ID IN ({','.join('?' * len(series_ids))})''')
+            params.extend(series_ids)
 
-                    #Don't need to loop through NPORT (because 1 series per report), but just easier to reuse the series list methods
-                    for series in filtered_series_list:
+        if ciks:
+            conditions.append(f'''CIK_IMPUTE IN ({','.join('?' * len(ciks))})''')
+            params.extend([int(cik) for cik in ciks])
 
-                        dates_data, holdings_data = self.get_nport_data(series, xml, report['filing_type'])
+        if start_date is not None:
+            conditions.append('QUARTER_END_DATE >= ?')
+            params.append(start_date)
 
-                        #insert or replace into dates
-                        db_manager.insert_dates(dates_data)
+        if end_date is not None:
+            conditions.append('QUARTER_END_DATE <= ?')
+            params.append(end_date)
 
-                        #insert or replace into holdings
-                        db_manager.insert_holdings(holdings_data)
+        sql = f'''
+        SELECT HOLDINGS_FILING_TYPE, PROSPECTUS_FILING_TYPE, CIK_IMPUTE, COMPANY_IMPUTE, SERIES_ID, QUARTER_END_DATE, AVERAGE_NET_ASSETS, AVERAGE_EXPENSE_RATIO, AVERAGE_EXPENSE_RATIO_IMPUTE, AVERAGE_NET_EXPENSE_RATIO, AVERAGE_NET_EXPENSE_RATIO_IMPUTE, AVERAGE_ANNUAL_1YR_RETURN, AVERAGE_ANNUAL_5YR_RETURN, AVERAGE_ANNUAL_10YR_RETURN, AVERAGE_ANNUAL_RETURN_SINCE_INCEPTION
+        FROM series_quarter_facts
+        WHERE {' AND '.join(conditions)}
+        ORDER BY SERIES_ID, QUARTER_END_DATE
+        '''
 
-                        logging.info(f'''Holdings data obtained and inserted for {series} {report['filing_type']} with filing period end date of {dates_data[0]}''')
+        return sql, params
 
 
-class databaseManager():
-    '''Performs all database operations'''
+    def get_series_quarter_facts(self, **filters):
+        '''Gets series and quarter dataset (get_series_quarter_facts_query, which takes the same filters) as dataframe; for large outputs, use exportManager'''
 
-    def __init__(self, config):
+        self.refresh_series_quarter_facts()
+
+        sql, params = self.get_series_quarter_facts_query(**filters)
+
+        return self.query(sql, params)
+
+
+    def select_data(self):
+        '''Exports series and quarter dataset to output_path (config.json), streamed in chunks (see exportManager)'''
+
+        export_manager = exportManager(self.config, self)
+        export_manager.export_series_quarter_facts(self.config['export']['output_path'])
+
+
+    def query(self, sql, params=None):
+        '''
+        Runs read-only query (e.g. ad-hoc analysis), which can run while ingestion is writing
+        @param sql: query to run
+        @param params: query parameters
+        @return dataframe of query results
+        '''
+
+        conn = self.get_read_connection()
+
+        try:
+            return pd.read_sql(sql, conn, params=params)
+        finally:
+            conn.close()
+
+
+class exportManager():
+    '''
+    Exports the series and quarter dataset (databaseManager.get_series_quarter_facts_query) to csv, gzip compressed csv, or parquet, chosen by output path (.csv, .csv.gz, .parquet)
+    Rows are fetched and written chunk_size (config.json) rows at a time, so memory does not grow with the size of the output
+    Output is written to a .part file, which replaces the output file once complete
+    '''
+
+    def __init__(self, config, db_manager):
 
-        self.conn = None
-        self.cursor = None
         self.config = config
+        self.db_manager = db_manager
+        #Declared column type->arrow type, for parquet schema
+        self.arrow_types = {'TEXT': 'string', 'REAL': 'float64', 'INTEGER': 'int64'}
 
 
-    def db_decorator(db_method):
-        '''Decorator/wrapper for database CRUD operations; creates connection & cursor before operation, commits changes, and closes'''
+    def get_output_format(self, output_path):
 
-        @functools.wraps(db_method)
-        def db_wrapper(self, *args):
+        for suffix, output_format in [('.csv.gz', 'csv.gz'), ('.csv', 'csv'), ('.parquet', 'parquet')]:
+            if output_path.lower().endswith(suffix):
+                return output_format
 
-            database_filepath = self.config['network_drives']['database'] + '\\sec_extractor.db'
-            self.conn = sqlite3.connect(database_filepath)
-            self.cursor = self.conn.cursor()
+        raise ValueError(f'''Output path {output_path} must end in .csv, .csv.gz, or .parquet''')
 
-            db_method_return = db_method(self, *args)
 
-            self.conn.commit()
-            self.cursor.close()
-            self.conn.close()
+    def get_parquet_schema(self, conn, columns):
+        '''Gets arrow schema of exported columns, from declared column types of series_quarter_facts'''
 
-            return db_method_return
+        declared_types = {row[1]: row[2] for row in conn.execute('''PRAGMA table_info(series_quarter_facts)''')}
 
-        return db_wrapper
+        return pa.schema([pa.field(column, getattr(pa, self.arrow_types[declared_types[column]])()) for column in columns])
 
 
-    @db_decorator
-    def create_tables(self):
+    def iter_chunks(self, cursor, chunk_size):
 
-        create_tables = '''
-        CREATE TABLE IF NOT EXISTS entities(
-        CLASS_ID TEXT UNIQUE,
-        SERIES_ID TEXT,
-        CIK INTEGER,
-        COMPANY TEXT);
+        while True:
 
-        CREATE UNIQUE INDEX
-            IF NOT EXISTS CLASS_ID_IDX
-            ON entities(CLASS_ID);
+            rows = cursor.fetchmany(chunk_size)
 
-        CREATE TABLE IF NOT EXISTS dates(
-                DATE TEXT UNIQUE,
-                QUARTER_END_DATE TEXT);
+            if len(rows) == 0:
+                break
 
-        CREATE UNIQUE INDEX
-            IF NOT EXISTS DATE_IDX
-            ON dates(DATE);
+            yield rows
 
-        CREATE TABLE IF NOT EXISTS prospectus(
-            ADSH TEXT,
-            FILING_TYPE TEXT,
-            FILING_DATE TEXT,
-            EFFECTIVE_DATE TEXT,
-            CLASS_ID TEXT,
-            EXPENSE_RATIO REAL,
-            NET_EXPENSE_RATIO REAL,
-            AVG_ANN_1YR_RETURN REAL,
-            AVG_ANN_5YR_RETURN REAL,
-            AVG_ANN_10YR_RETURN REAL,
-            AVG_ANN_RETURN_SINCE_INCEPTION REAL,
-            PRIMARY KEY (CLASS_ID, EFFECTIVE_DATE),
-            FOREIGN KEY (CLASS_ID) REFERENCES entities(CLASS_ID),
-            FOREIGN KEY (EFFECTIVE_DATE) REFERENCES dates(DATE));
 
-        CREATE TABLE IF NOT EXISTS holdings(
-            ADSH TEXT,
-            FILING_TYPE TEXT,
-            FILING_DATE TEXT,
-            PERIOD_END_DATE TEXT,
-            SERIES_ID TEXT,
-            NET_ASSETS REAL,
-            PRIMARY KEY (SERIES_ID, PERIOD_END_DATE),
-            FOREIGN KEY (PERIOD_END_DATE) REFERENCES dates(DATE));
+    def write_csv(self, file, columns, chunks):
 
-        CREATE TABLE IF NOT EXISTS quarters(
-            QUARTER TEXT UNIQUE);
-        '''
+        writer = csv.writer(file)
+        writer.writerow(columns)
 
-        self.cursor.executescript(create_tables)
+        rows_written = 0
+        for rows in chunks:
+            writer.writerows(rows)
+            rows_written += len(rows)
 
+        return rows_written
 
-    @db_decorator
-    def insert_first_date(self):
+
+    def get_arrow_table(self, schema, rows):
+        '''Converts rows (tuples, in schema's column order) to arrow table'''
+
+        columns = list(zip(*rows)) if len(rows) > 0 else [[] for field in schema]
+
+        return pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+
+    def write_parquet(self, part_path, schema, chunks):
+
+        rows_written = 0
+        with pq.ParquetWriter(part_path, schema) as writer:
+            for rows in chunks:
+                writer.write_table(self.get_arrow_table(schema, rows))
+                rows_written += len(rows)
+
+        return rows_written
+
+
+    def export_series_quarter_facts(self, output_path, series_ids=None, ciks=None, start_date=None, end_date=None, chunk_size=None):
         '''
-        Insert first date with available & desired data (minus one day) if not already in dates table
-        Required to get most recent date if no data input yet
+        Exports series and quarter dataset, optionally filtered (see databaseManager.get_series_quarter_facts_query)
+        @param output_path: path of output file; its suffix (.csv, .csv.gz, .parquet) sets the format
+        @param chunk_size: rows fetched and written at a time; chunk_size (config.json) if not given
+        @return number of rows exported
         '''
 
-        #Get day before configured start_year
-        desired_start = dt.datetime(int(self.config['index']['start_year']), 1, 1)
-        first_date = desired_start - dt.timedelta(1)
+        output_format = self.get_output_format(output_path)
 
-        #Format date to be inserted
-        first_date_int_str = first_date.strftime(format='%Y%m%d')
-        first_date_str = first_date.strftime(format='%Y-%m-%d')
-        #quarter end date is same as first_date_str
+        if (output_format == 'parquet') and (pa is None):
+            raise ImportError('pyarrow must be installed to export to parquet')
 
-        insert_first_date = '''
-        INSERT OR REPLACE INTO dates (DATE, QUARTER_END_DATE) VALUES (?,?)
+        if chunk_size is None:
+            chunk_size = int(self.config['export']['chunk_size'])
+
+        self.db_manager.refresh_series_quarter_facts()
+
+        sql, params = self.db_manager.get_series_quarter_facts_query(series_ids, ciks, start_date, end_date)
+        part_path = output_path + '.part'
+        start_time = time.time()
+
+        conn = self.db_manager.get_read_connection()
+
+        try:
+            cursor = conn.execute(sql, params)
+            columns = [description[0] for description in cursor.description]
+            chunks = self.iter_chunks(cursor, chunk_size)
+
+            if output_format == 'csv':
+                with open(part_path, 'w', newline='', encoding='utf-8') as file:
+                    rows_exported = self.write_csv(file, columns, chunks)
+            elif output_format == 'csv.gz':
+                with gzip.open(part_path, 'wt', newline='', encoding='utf-8') as file:
+                    rows_exported = self.write_csv(file, columns, chunks)
+            else:
+                rows_exported = self.write_parquet(part_path, self.get_parquet_schema(conn, columns), chunks)
+
+        except:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+        finally:
+            conn.close()
+
+        os.replace(part_path, output_path)
+
+        time_taken = time.time() - start_time
+        logging.info(f'''Exported {rows_exported} rows to {output_path} in {time_taken:.2f} seconds ({rows_exported / max(time_taken, 1e-9):.0f} rows/second)''')
+
+        return rows_exported
+
+
+class queryService():
+    '''
+    Local read-only HTTP service over the database, for dashboards and ad-hoc analysis
+    GET /series_quarter_facts (filters: series, cik, start, end; see databaseManager.get_series_quarter_facts_query)
+    GET /series/<series_id>/net_assets and GET /series/<series_id>/expense_ratios (filters: start, end)
+    Results are JSON (format=json, default) or an arrow IPC stream (format=arrow)
+    Encoded results are cached (least recently used evicted beyond cache_entries, config.json), keyed by the database's PRAGMA data_version, which changes whenever another connection (e.g. ingestion) commits; so the cache is invalidated as soon as an ingest commits
+    The service never writes; every query runs on a read-only connection
+    '''
+
+    def __init__(self, config, db_manager):
+
+        self.config = config
+        self.db_manager = db_manager
+        self.export_manager = exportManager(config, db_manager)
+        self.cache_entries = int(config['service']['cache_entries'])
+        self.cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        #Requests are handled on multiple threads (ThreadingHTTPServer), which share this connection and the cache
+        self.lock = threading.Lock()
+        self.version_conn = None
+        self.cache_version = None
+
+        #Prepared, parameterized queries of history endpoints; history columns are all in series_quarter_facts
+        self.history_queries = {
+            'net_assets': '''
+            SELECT SERIES_ID, QUARTER_END_DATE, HOLDINGS_FILING_TYPE, AVERAGE_NET_ASSETS
+            FROM series_quarter_facts
+            WHERE SERIES_ID = ? AND HAS_HOLDINGS = 1 AND QUARTER_END_DATE >= ? AND QUARTER_END_DATE <= ?
+            ORDER BY QUARTER_END_DATE
+            ''',
+            'expense_ratios': '''
+            SELECT SERIES_ID, QUARTER_END_DATE, PROSPECTUS_FILING_TYPE, AVERAGE_EXPENSE_RATIO, AVERAGE_NET_EXPENSE_RATIO, AVERAGE_EXPENSE_RATIO_IMPUTE, AVERAGE_NET_EXPENSE_RATIO_IMPUTE
+            FROM series_quarter_facts
+            WHERE SERIES_ID = ? AND HAS_PROSPECTUS = 1 AND QUARTER_END_DATE >= ? AND QUARTER_END_DATE <= ?
+            ORDER BY QUARTER_END_DATE
+            '''}
+
+
+    def get_data_version(self):
+        '''
+        Gets data version of database, as seen by this service's long-lived connection (PRAGMA data_version is only comparable on the same connection)
+        Caller holds self.lock
         '''
-        self.cursor.execute(insert_first_date, (first_date_str, first_date_str,))
 
+        if self.version_conn is None:
+            self.version_conn = self.db_manager.get_read_connection(check_same_thread=False)
 
-    @db_decorator
-    def get_most_recent_holdings_date(self):
+        return self.version_conn.execute('''PRAGMA data_version''').fetchone()[0]
 
-        max_date = '''
-        SELECT MAX(date(FILING_DATE))
-        FROM holdings
+
+    def get_current_version(self):
+        '''
+        Gets data version of database, dropping cached results of earlier versions
+        series_quarter_facts is refreshed in the same transaction as ingested data (see holdingsCourier.insert_report_data, prospectusCourier.insert_quarter_prospectuses), so every version served already includes its facts
+        Caller holds self.lock
         '''
-        self.cursor.execute(max_date)
-        most_recent_date = self.cursor.fetchone()[0]
-        most_recent_date = dt.datetime.strptime(most_recent_date, '%Y-%m-%d')
 
-        logging.info(f'Most recent filing date in holdings table is {most_recent_date}')
+        version = self.get_data_version()
 
-        return most_recent_date
+        if version != self.cache_version:
+            self.cache_version = version
+            self.cache.clear()
 
+        return version
 
-    @db_decorator
-    def get_most_recent_prospectus_date(self):
 
-        max_date = '''
-        SELECT MAX(date(FILING_DATE))
-        FROM prospectus
+    def get_query(self, endpoint, series_id, params):
+        '''
+        Gets prepared query of endpoint
+        @param endpoint: series_quarter_facts, net_assets, or expense_ratios
+        @param series_id: series of history endpoints
+        @param params: query string parameters (urllib.parse.parse_qs)
+        @return (sql, params) tuple
         '''
-        self.cursor.execute(max_date)
-        most_recent_date = self.cursor.fetchone()[0]
-        most_recent_date = dt.datetime.strptime(most_recent_date, '%Y-%m-%d')
 
-        logging.info(f'Most recent filing date in prospectus table is {most_recent_date}')
+        def get_list(name):
+            return [value for values in params.get(name, []) for value in values.split(',') if value != '']
 
-        return most_recent_date
+        start_date = params.get('start', [None])[-1]
+        end_date = params.get('end', [None])[-1]
 
+        if endpoint == 'series_quarter_facts':
+            return self.db_manager.get_series_quarter_facts_query(get_list('series'), get_list('cik'), start_date, end_date)
 
-    @db_decorator
-    def get_most_recent_effective_date(self):
+        return self.history_queries[endpoint], [series_id, start_date or '0000-00-00', end_date or '9999-99-99']
 
-        max_date = '''
-        SELECT MAX(date(EFFECTIVE_DATE))
-        FROM prospectus
-        '''
-        self.cursor.execute(max_date)
-        most_recent_date = self.cursor.fetchone()[0]
-        most_recent_date = dt.datetime.strptime(most_recent_date, '%Y-%m-%d')
 
-        logging.info(f'Most recent effective date in prospectus table is {most_recent_date}')
+    def encode(self, conn, cursor, output_format):
 
-        return most_recent_date
+        columns = [description[0] for description in cursor.description]
+        rows = cursor.fetchall()
 
+        if output_format == 'arrow':
+            schema = self.export_manager.get_parquet_schema(conn, columns)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, schema) as writer:
+                writer.write_table(self.export_manager.get_arrow_table(schema, rows))
+            return sink.getvalue().to_pybytes()
 
-    @db_decorator
-    def get_least_recent_effective_date(self):
+        return json.dumps([dict(zip(columns, row)) for row in rows]).encode('utf-8')
 
-        min_date = '''
-        SELECT MIN(date(EFFECTIVE_DATE))
-        FROM prospectus
+
+    def get_result(self, path, query_string):
+        '''
+        Gets encoded result of request, from cache if database has not changed since it was cached
+        @param path: request path, e.g. /series/S000002277/net_assets
+        @param query_string: request query string, e.g. start=2020-01-01&format=arrow
+        @return (body, content type, cache hit) tuple
+        @raise KeyError if path is not an endpoint, ValueError if parameters are invalid
         '''
-        self.cursor.execute(min_date)
-        least_recent_date = self.cursor.fetchone()[0]
-        least_recent_date = dt.datetime.strptime(least_recent_date, '%Y-%m-%d')
 
-        logging.info(f'Least recent effective date in prospectus table is {least_recent_date}')
+        parts = [part for part in path.split('/') if part != '']
 
-        return least_recent_date
+        if parts == ['series_quarter_facts']:
+            endpoint, series_id = parts[0], None
+        elif (len(parts) == 3) and (parts[0] == 'series') and (parts[2] in self.history_queries):
+            endpoint, series_id = parts[2], urllib.parse.unquote(parts[1])
+        else:
+            raise KeyError(path)
 
+        params = urllib.parse.parse_qs(query_string)
+        output_format = params.pop('format', ['json'])[-1]
 
-    @db_decorator
-    def get_most_recent_qtr_end_date(self):
+        if output_format not in ['json', 'arrow']:
+            raise ValueError(f'''format must be json or arrow, not {output_format}''')
 
-        max_qtr_end_date = '''
-        SELECT MAX(date(QUARTER_END_DATE))
-        FROM dates
-        '''
-        self.cursor.execute(max_qtr_end_date)
-        most_recent_qtr_end_date = self.cursor.fetchone()[0]
-        most_recent_qtr_end_date = dt.datetime.strptime(most_recent_qtr_end_date, '%Y-%m-%d')
+        if (output_format == 'arrow') and (pa is None):
+            raise ValueError('pyarrow must be installed for format=arrow')
 
-        logging.info(f'Most recent quarter end date in database is {most_recent_qtr_end_date}')
+        sql, sql_params = self.get_query(endpoint, series_id, params)
 
-        return most_recent_qtr_end_date
+        with self.lock:
 
+            key = (self.get_current_version(), endpoint, series_id, tuple(sql_params), output_format)
 
-    @db_decorator
-    def insert_entities(self, entities_tuple):
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key], output_format, True
 
-        sql='''INSERT OR REPLACE INTO entities (CLASS_ID, SERIES_ID, CIK, COMPANY) VALUES (?,?,?,?)'''
+            self.misses += 1
 
-        self.cursor.execute(sql, entities_tuple)
+        conn = self.db_manager.get_read_connection()
 
+        try:
+            cursor = conn.execute(sql, sql_params)
+            body = self.encode(conn, cursor, output_format)
+        finally:
+            conn.close()
+
+        with self.lock:
+
+            self.cache[key] = body
+            while len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+
+        return body, output_format, False
+
+
+    def get_server(self, host=None, port=None):
+        '''
+        Gets HTTP server of this service; caller runs serve_forever
+        @param host: host to bind; host (config.json) if not given
+        @param port: port to bind (0 for any free port); port (config.json) if not given
+        '''
 
-    @db_decorator
-    def insert_dates(self, dates_tuple):
+        host = self.config['service']['host'] if host is None else host
+        port = int(self.config['service']['port']) if port is None else port
 
-        sql='''INSERT OR REPLACE INTO dates (DATE, QUARTER_END_DATE) VALUES (?,?)'''
+        server = http.server.ThreadingHTTPServer((host, port), queryRequestHandler)
+        server.query_service = self
 
-        self.cursor.execute(sql, dates_tuple)
+        return server
 
 
-    @db_decorator
-    def insert_holdings(self, holdings_tuple):
+    def close(self):
 
-        sql='''INSERT OR REPLACE INTO holdings (ADSH, FILING_TYPE, FILING_DATE, PERIOD_END_DATE, SERIES_ID, NET_ASSETS) VALUES (?,?,?,?,?,?)'''
+        with self.lock:
+            if self.version_conn is not None:
+                self.version_conn.close()
+                self.version_conn = None
 
-        self.cursor.execute(sql, holdings_tuple)
+        logging.info(f'''Query service cache: {self.hits} hits, {self.misses} misses''')
 
 
-    @db_decorator
-    def insert_prospectuses(self, prospectuses_tuple):
+class queryRequestHandler(http.server.BaseHTTPRequestHandler):
+    '''Handles GET requests of queryService (server.query_service); any other method is answered 501 by BaseHTTPRequestHandler'''
 
-        sql='''INSERT OR REPLACE INTO prospectus (ADSH, FILING_TYPE, FILING_DATE, EFFECTIVE_DATE, CLASS_ID, EXPENSE_RATIO, NET_EXPENSE_RATIO, AVG_ANN_1YR_RETURN, AVG_ANN_5YR_RETURN, AVG_ANN_10YR_RETURN, AVG_ANN_RETURN_SINCE_INCEPTION) VALUES (?,?,?,?,?,?,?,?,?,?,?)'''
+    content_types = {'json': 'application/json', 'arrow': 'application/vnd.apache.arrow.stream'}
 
-        self.cursor.execute(sql, prospectuses_tuple)
 
+    def do_GET(self):
 
-    @db_decorator
-    def insert_quarters(self, quarters_tuple):
+        url = urllib.parse.urlsplit(self.path)
 
-        sql='''INSERT OR REPLACE INTO quarters (QUARTER) VALUES (?)'''
+        try:
+            body, output_format, cache_hit = self.server.query_service.get_result(url.path, url.query)
+        except KeyError:
+            self.send_error(404, f'''Unknown endpoint {url.path}''')
+            return
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        except:
+            logging.exception(f'''Query service failed on {self.path}''')
+            self.send_error(500)
+            return
 
-        self.cursor.execute(sql, quarters_tuple)
+        self.send_response(200)
+        self.send_header('Content-Type', self.content_types[output_format])
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Cache', 'HIT' if cache_hit else 'MISS')
+        self.end_headers()
+        self.wfile.write(body)
 
 
-    @db_decorator
-    def select_data(self):
+    def log_message(self, format, *args):
 
-        query = '''
-        SELECT hold.FILING_TYPE AS HOLDINGS_FILING_TYPE, pros.FILING_TYPE AS PROSPECTUS_FILING_TYPE, pros.CIK_IMPUTE, pros.COMPANY_IMPUTE, hold.SERIES_ID, hold.QUARTER_END_DATE, AVERAGE_NET_ASSETS, pros.avgexpratio AS AVERAGE_EXPENSE_RATIO, pros.AVERAGE_EXPENSE_RATIO_IMPUTE, pros.avgnetexpratio AS AVERAGE_NET_EXPENSE_RATIO, pros.AVERAGE_NET_EXPENSE_RATIO_IMPUTE, pros.AVERAGE_ANNUAL_1YR_RETURN, pros.AVERAGE_ANNUAL_5YR_RETURN, pros.AVERAGE_ANNUAL_10YR_RETURN, pros.AVERAGE_ANNUAL_RETURN_SINCE_INCEPTION
-        FROM
-        (SELECT h.SERIES_ID, h.FILING_TYPE, dates.QUARTER_END_DATE, AVG(NET_ASSETS) AVERAGE_NET_ASSETS FROM holdings h
-        LEFT JOIN dates ON date(h.PERIOD_END_DATE) = date(dates.DATE) GROUP BY h.SERIES_ID, dates.QUARTER_END_DATE) hold
-        INNER JOIN
-            (SELECT all_qtrs.SERIES_ID, avg_er.CIK, avg_er.COMPANY, avg_er.AVERAGE_ANNUAL_1YR_RETURN, avg_er.AVERAGE_ANNUAL_5YR_RETURN, avg_er.AVERAGE_ANNUAL_10YR_RETURN, avg_er.AVERAGE_ANNUAL_RETURN_SINCE_INCEPTION, avg_er.FILING_TYPE, all_qtrs.QUARTER, avg_er.avgexpratio, COALESCE(avg_er.avgexpratio,
-                (SELECT avg_er2.avgexpratio FROM
-                    (SELECT e.SERIES_ID, AVG(p2.EXPENSE_RATIO) AS avgexpratio, d.QUARTER_END_DATE FROM prospectus p2
-                    INNER JOIN dates d ON date(p2.EFFECTIVE_DATE) = date(d.DATE)
-                    INNER JOIN entities e ON p2.CLASS_ID = e.CLASS_ID
-                    GROUP BY e.SERIES_ID, d.QUARTER_END_DATE
-                    ORDER BY e.SERIES_ID, d.DATE
-                    ) avg_er2
-                WHERE all_qtrs.SERIES_ID = avg_er2.SERIES_ID AND date(avg_er2.QUARTER_END_DATE) < date(all_qtrs.QUARTER)
-                ORDER BY date(avg_er2.QUARTER_END_DATE) DESC LIMIT 1)) AVERAGE_EXPENSE_RATIO_IMPUTE,
-                avg_er.avgnetexpratio,
-                COALESCE(avg_er.avgnetexpratio,
-                (SELECT avg_er2.avgnetexpratio FROM
-                    (SELECT e.SERIES_ID, AVG(p2.NET_EXPENSE_RATIO) AS avgnetexpratio, d.QUARTER_END_DATE FROM prospectus p2
-                    INNER JOIN dates d ON date(p2.EFFECTIVE_DATE) = date(d.DATE)
-                    INNER JOIN entities e ON p2.CLASS_ID = e.CLASS_ID
-                    GROUP BY e.SERIES_ID, d.QUARTER_END_DATE
-                    ORDER BY e.SERIES_ID, d.DATE
-                    ) avg_er2
-                WHERE all_qtrs.SERIES_ID = avg_er2.SERIES_ID AND date(avg_er2.QUARTER_END_DATE) < date(all_qtrs.QUARTER)
-                ORDER BY date(avg_er2.QUARTER_END_DATE) DESC LIMIT 1)) AVERAGE_NET_EXPENSE_RATIO_IMPUTE,
-                COALESCE(avg_er.CIK,
-                    (SELECT avg_er2.avgcik FROM
-                        (SELECT e.SERIES_ID, e.CIK AS avgcik, d.QUARTER_END_DATE FROM prospectus p2
-                        INNER JOIN dates d ON date(p2.EFFECTIVE_DATE) = date(d.DATE)
-                        INNER JOIN entities e ON p2.CLASS_ID = e.CLASS_ID
-                        GROUP BY e.SERIES_ID, d.QUARTER_END_DATE
-                        ORDER BY e.SERIES_ID, d.DATE
-                        ) avg_er2
-                    WHERE all_qtrs.SERIES_ID = avg_er2.SERIES_ID AND date(avg_er2.QUARTER_END_DATE) < date(all_qtrs.QUARTER)
-                    ORDER BY date(avg_er2.QUARTER_END_DATE) DESC LIMIT 1)) CIK_IMPUTE,
-                COALESCE(avg_er.COMPANY,
-                    (SELECT avg_er2.avgcompany FROM
-                        (SELECT e.SERIES_ID, e.COMPANY AS avgcompany, d.QUARTER_END_DATE FROM prospectus p2
-                        INNER JOIN dates d ON date(p2.EFFECTIVE_DATE) = date(d.DATE)
-                        INNER JOIN entities e ON p2.CLASS_ID = e.CLASS_ID
-                        GROUP BY e.SERIES_ID, d.QUARTER_END_DATE
-                        ORDER BY e.SERIES_ID, d.DATE
-                        ) avg_er2
-                    WHERE all_qtrs.SERIES_ID = avg_er2.SERIES_ID AND date(avg_er2.QUARTER_END_DATE) < date(all_qtrs.QUARTER)
-                    ORDER BY date(avg_er2.QUARTER_END_DATE) DESC LIMIT 1)) COMPANY_IMPUTE
-            FROM
-                (SELECT SERIES_ID, QUARTER FROM
-                    (SELECT SERIES_ID, MIN(QUARTER_END_DATE) min_qtr_date, MAX(QUARTER_END_DATE) max_qtr_date
-                    FROM prospectus p1
-                    INNER JOIN dates d1 ON date(p1.EFFECTIVE_DATE) = date(d1.DATE)
-                    INNER JOIN entities e1 ON p1.CLASS_ID = e1.CLASS_ID
-                    GROUP BY e1.SERIES_ID
-                    ) min_max
-                CROSS JOIN quarters q2 WHERE date(q2.QUARTER) BETWEEN min_qtr_date AND max_qtr_date
-            ) all_qtrs
-            LEFT JOIN
-                (SELECT e.SERIES_ID, e.CIK, e.COMPANY, p2.FILING_TYPE, AVG(AVG_ANN_1YR_RETURN) AS AVERAGE_ANNUAL_1YR_RETURN, AVG(AVG_ANN_5YR_RETURN) AS AVERAGE_ANNUAL_5YR_RETURN, AVG(AVG_ANN_10YR_RETURN) AS AVERAGE_ANNUAL_10YR_RETURN, AVG(AVG_ANN_RETURN_SINCE_INCEPTION) AS AVERAGE_ANNUAL_RETURN_SINCE_INCEPTION, AVG(p2.NET_EXPENSE_RATIO) as avgnetexpratio, AVG(p2.EXPENSE_RATIO) AS avgexpratio, d.QUARTER_END_DATE FROM prospectus p2
-                INNER JOIN dates d ON date(p2.EFFECTIVE_DATE) = date(d.DATE)
-                INNER JOIN entities e ON p2.CLASS_ID = e.CLASS_ID
-                GROUP BY e.SERIES_ID, d.QUARTER_END_DATE
-                ORDER BY e.SERIES_ID, d.DATE
-                ) avg_er
-            ON all_qtrs.SERIES_ID = avg_er.SERIES_ID AND date(all_qtrs.QUARTER) = date(avg_er.QUARTER_END_DATE)
-            ORDER BY all_qtrs.SERIES_ID, date(all_qtrs.QUARTER)) pros
-        ON hold.SERIES_ID = pros.SERIES_ID AND date(hold.QUARTER_END_DATE) = date(pros.QUARTER)
-        ORDER BY hold.SERIES_ID, hold.QUARTER_END_DATE
-        '''
-
-        df = pd.read_sql(query, self.conn)
-        print(df)
-        df.to_csv('sec_extractor.csv', index=False)
+        logging.info(f'''Query service: {self.address_string()} {format % args}''')
 
 
 class prospectusCourier():
@@ -929,23 +3391,25 @@ class prospectusCourier():
         self.base_url = 'https://www.sec.gov/files/dera/data/mutual-fund-prospectus-risk/return-summary-data-sets/'
         self.end_url = '_rr1.zip'
         self.config = config
+        self.calendar = quarterCalendar()
         self.quarter_end_dates = None
         self.quarter_list = None
         self.url_file_list = None
         self.zip_files = None
         self.filtered_zip_files = None
         self.prospectus_paths = None
+        #{quarter end date: (content hash, size, mtime)} of filtered zip files, recorded in prospectus_manifest once ingested
+        self.zip_manifest = {}
+        self.desired_tags = ["ExpensesOverAssets", "NetExpensesOverAssets", "AverageAnnualReturnYear01", "AverageAnnualReturnYear05", "AverageAnnualReturnYear10", "AverageAnnualReturnSinceInception"]
+        #Stamped on parquet cache files; cache files of another version (or written from another zip file) are written again
+        self.cache_version = '1'
 
 
     def get_list_quarters(self):
 
-        self.quarter_list = []
-
         self.get_list_quarters_dates()
 
-        for quarter_end in self.quarter_end_dates:
-
-            self.quarter_list.append(self.translate_quarter_end_to_quarter(quarter_end))
+        self.quarter_list = self.calendar.quarter_labels(self.quarter_end_dates).tolist()
 
 
     def get_list_quarters_dates(self, start=None, end=None):
@@ -957,22 +3421,13 @@ class prospectusCourier():
         if end is None:
             end = dt.datetime.today().strftime('%Y-%m-%d')
 
-        self.quarter_end_dates = pd.date_range(pd.to_datetime(start), pd.to_datetime(end) + pd.offsets.QuarterBegin(1), freq='Q').strftime('%Y-%m-%d').tolist()
+        self.quarter_end_dates = self.calendar.quarter_ends_between(start, pd.to_datetime(end) + pd.offsets.QuarterBegin(1))
 
 
     def translate_quarter_end_to_quarter(self, date):
         '''Returns yyyyqx for a given string date in %Y-%m-%d format'''
 
-        month = date[5:7]
-
-        if month in ['01', '02', '03']:
-            return date[0:4] + 'q1'
-        elif month in ['04', '05', '06']:
-            return date[0:4] + 'q2'
-        elif month in ['07', '08', '09']:
-            return date[0:4] + 'q3'
-        elif month in ['10', '11', '12']:
-            return date[0:4] + 'q4'
+        return str(self.calendar.quarter_labels([date])[0])
 
 
     def get_list_url_files(self):
@@ -987,30 +3442,78 @@ class prospectusCourier():
             self.url_file_list.append(file)
 
 
-    def download_zip_files(self):
-        '''Download prospectus zip files from SEC urls'''
+    def verify_zip_file(self, zip_path):
+        '''Checks that zip file is complete, and the CRC of each of its files matches'''
 
-        folder_path = self.config['network_drives']['zip_prospectuses']
+        with zipfile.ZipFile(zip_path) as zip_file:
+            return zip_file.testzip() is None
 
-        start_time = time.time()
 
-        for i,url in enumerate(self.url_file_list):
+    def is_zip_file_changed(self, proxy_manager, url, file_path):
+        '''Checks (conditional request, body not downloaded) whether SEC has republished zip file since it was downloaded'''
 
-            file_path = folder_path + '\\' + self.quarter_end_dates[i] + '.zip'
+        last_modified = email.utils.formatdate(os.path.getmtime(file_path), usegmt=True)
 
-            try:
+        with proxy_manager.get(url, stream=True, headers={'If-Modified-Since': last_modified}) as response:
+            return response.status_code != 304
+
+
+    def download_zip_file(self, proxy_manager, url, file_path, refresh=False):
+        '''
+        Downloads prospectus zip file, unless it has already been downloaded
+        @param refresh: if True, an already downloaded file is downloaded again if SEC has republished it (e.g. with corrections)
+        @return number of bytes transferred
+        '''
 
-                if not os.path.exists(file_path):
+        if os.path.exists(file_path):
 
-                    urllib.request.urlretrieve(url, file_path)
+            if zipfile.is_zipfile(file_path):
 
-                    logging.info(f'''Downloaded {file_path}''')
+                if (not refresh) or (not self.is_zip_file_changed(proxy_manager, url, file_path)):
+                    return 0
 
-            except:
-                logging.info(f'Could not download {url}. It may not yet exist.')
+                #Republished file replaces the one on disk only once its download is complete and verified (proxyManager.download_file)
+                logging.info(f'''{url} has been republished; downloading it again''')
 
-        time_taken = (time.time() - start_time)/60
-        logging.info(f'''Prospectus zip files download took {time_taken:.2f} minutes''')
+            else:
+                #Left incomplete by a previous version, which wrote downloads in place
+                logging.info(f'''{file_path} is not a complete zip file; downloading it again''')
+                os.remove(file_path)
+
+        transferred = proxy_manager.download_file(url, file_path, verify=self.verify_zip_file)
+
+        logging.info(f'''Downloaded {file_path}''')
+
+        return transferred
+
+
+    def download_zip_files(self, proxy_manager):
+        '''
+        Download prospectus zip files from SEC urls, download_workers (config.json) at a time; proxy_manager.rate_limiter caps requests per second
+        Zip files are verified before they are saved, and interrupted downloads are resumed (proxyManager.download_file)
+        Zip files of the most recent refresh_quarters (config.json) quarters are downloaded again if SEC has republished them
+        '''
+
+        refresh_start = len(self.url_file_list) - int(self.config['prospectus']['refresh_quarters'])
+
+        folder_path = self.config['network_drives']['zip_prospectuses']
+
+        start_time = time.time()
+        transferred = 0
+
+        with ThreadPoolExecutor(max_workers=int(self.config['prospectus']['download_workers'])) as executor:
+
+            futures = {executor.submit(self.download_zip_file, proxy_manager, url, folder_path + '\\' + self.quarter_end_dates[i] + '.zip', i >= refresh_start): url for i,url in enumerate(self.url_file_list)}
+
+            for future in concurrent.futures.as_completed(futures):
+
+                try:
+                    transferred += future.result()
+                except:
+                    logging.info(f'''Could not download {futures[future]}. It may not yet exist.''')
+
+        time_taken = time.time() - start_time
+        logging.info(f'''Prospectus zip files download took {time_taken/60:.2f} minutes; {transferred/1024/1024:.1f} MB at {transferred/1024/1024/max(time_taken, 0.001):.2f} MB/s''')
 
 
     def translate_zip_to_date(self, zip_path):
@@ -1019,27 +3522,50 @@ class prospectusCourier():
         return Path(zip_path).stem
 
 
+    def get_file_hash(self, file_path):
+
+        file_hash = hashlib.sha256()
+
+        with open(file_path, 'rb') as file:
+            for chunk in iter(functools.partial(file.read, 1024*1024), b''):
+                file_hash.update(chunk)
+
+        return file_hash.hexdigest()
+
+
     def filter_zip_files(self):
-        '''Gets prospectus zip files that have yet to be inserted into database'''
+        '''
+        Gets prospectus zip files that are new, or have changed, since they were ingested (prospectus_manifest, read in a single query)
+        A zip file whose size and modification time are unchanged is not read; otherwise, it is only ingested again if its content hash has changed
+        '''
 
         glob_str = self.config['network_drives']['zip_prospectuses'] + '\\*.zip'
         self.zip_files = sorted(glob.glob(glob_str))
 
         self.filtered_zip_files = []
+        self.zip_manifest = {}
+
+        try:
+            manifest = self.db_manager.get_prospectus_manifest()
+        except:
+            manifest = {}
 
         for zip in self.zip_files:
 
-            file_stem = self.translate_zip_to_date(zip)
-            file_date = dt.datetime.strptime(file_stem, '%Y-%m-%d')
+            quarter_end_date = self.translate_zip_to_date(zip)
+            file_stat = os.stat(zip)
+            ingested = manifest.get(quarter_end_date)
 
-            try:
-                most_recent_date = self.db_manager.get_most_recent_prospectus_date()
-            except:
-                most_recent_date = dt.datetime(int(self.config['prospectus']['start_year']), 1, 1)
+            if (ingested is not None) and (ingested[1:] == (file_stat.st_size, file_stat.st_mtime)):
+                continue
+
+            content_hash = self.get_file_hash(zip)
 
-            if file_date >= most_recent_date:
+            if (ingested is not None) and (ingested[0] == content_hash):
+                continue
 
-                self.filtered_zip_files.append(zip)
+            self.filtered_zip_files.append(zip)
+            self.zip_manifest[quarter_end_date] = (content_hash, file_stat.st_size, file_stat.st_mtime)
 
         logging.info(f'''Prospectus zip files to be included in database insert: {self.filtered_zip_files}''')
 
@@ -1091,6 +3617,15 @@ class prospectusCourier():
 
 
     def get_quarter_prospectuses(self):
+        '''
+        Gets paths of quarters' prospectus datasets: zip files, whose sub.tsv and num.tsv are read without being extracted (open_prospectus_file)
+        If extract_to_disk (config.json; for debugging), sub.tsv and num.tsv are extracted, and the paths are the folders they are extracted to
+        '''
+
+        if not self.config['prospectus']['extract_to_disk']:
+
+            self.prospectus_paths = list(self.filtered_zip_files)
+            return
 
         folder_path = self.config['network_drives']['prospectuses']
         self.prospectus_paths = []
@@ -1113,52 +3648,192 @@ class prospectusCourier():
         logging.info(f'''Unzipping prospectus files took {time_taken:.2f} minutes''')
 
 
-    def read_sub(self, prospectus_quarter):
-        '''Reads sub.tsv into dataframe'''
+    @contextlib.contextmanager
+    def open_prospectus_file(self, prospectus_quarter, file_name):
+        '''
+        Opens sub.tsv or num.tsv of a quarter for reading
+        @param prospectus_quarter: quarter's zip file (file is streamed from zip), or folder the file was extracted to
+        @return file object, or path of extracted file
+        '''
+
+        if prospectus_quarter.endswith('.zip'):
+
+            with zipfile.ZipFile(prospectus_quarter) as zip_file, zip_file.open(file_name) as prospectus_file:
+                yield prospectus_file
+
+        else:
+            yield prospectus_quarter + r'\\' + file_name
+
+
+    def read_filtered_tsv(self, tsv, tsv_name, use_columns, dtype_dict, chunk_filter, **kwargs):
+        '''
+        Reads tsv file in chunks of chunk_size (config.json) rows with the C parser, keeping only the rows of each chunk that pass chunk_filter
+        Memory is bounded by the rows kept, not the size of the file
+        @param tsv: path or file object
+        @param tsv_name: name of file, for log
+        @param chunk_filter: function that takes a chunk dataframe, and returns the rows to be kept
+        @param kwargs: other pd.read_csv parameters
+        '''
+
+        chunk_size = int(self.config['prospectus']['chunk_size'])
+
+        chunks = []
+        rows_read = 0
+        for chunk in pd.read_csv(tsv, sep='\t', usecols=use_columns, dtype=dtype_dict, engine='c', chunksize=chunk_size, quoting=3, **kwargs):
+            rows_read += len(chunk)
+            chunks.append(chunk_filter(chunk))
+
+        #File with header only
+        if len(chunks) == 0:
+            chunks.append(pd.DataFrame(columns=use_columns))
+
+        df = pd.concat(chunks, ignore_index=True)
+
+        logging.info(f'''Read {rows_read} rows of data for {tsv_name}; kept {len(df)} rows''')
+
+        return df
+
+
+    def read_sub(self, prospectus_quarter, adsh=None):
+        '''
+        Reads sub.tsv into dataframe, keeping rows with an effdate (pre_join_sub_filter)
+        @param adsh: if given, only submissions with these accession numbers are kept
+        '''
 
         #Parameters for reading in prospectus files
         use_columns = ['adsh', 'cik', 'name', 'effdate', 'filed', 'form']
         dtype_dict = {'adsh': str, 'cik': str, 'name': str, 'form': str}
 
-        #File
-        sub = prospectus_quarter + r'\\' + 'sub.tsv'
-
-        chunks = []
-        #Read data in chunks of 100,000 to ensure enough memory
-        chunk_index = 0
-        for chunk in pd.read_csv(sub, sep='\t', usecols=use_columns, dtype=dtype_dict, parse_dates=['effdate', 'filed'], infer_datetime_format=True, engine='python', chunksize=100000, quoting=3):
-            chunk_index += 1
-            logging.info(f'''Read in chunk {chunk_index} of 100,000 rows of data for {sub}''')
-            chunks.append(chunk)
+        def chunk_filter(chunk):
+            if adsh is not None:
+                chunk = chunk[chunk['adsh'].isin(adsh)]
+            return self.pre_join_sub_filter(chunk)
 
-        #Concatenate chunks of rows into single dataframe with all trades data
-        sub_df = pd.concat(chunks, ignore_index=True)
+        if self.use_prospectus_cache(prospectus_quarter):
+            filters = None if adsh is None else [('adsh', 'in', sorted(adsh))]
+            return self.read_prospectus_cache(prospectus_quarter, 'sub.tsv', use_columns, dtype_dict, chunk_filter, filters, parse_dates=['effdate', 'filed'], infer_datetime_format=True)
 
-        return sub_df
+        with self.open_prospectus_file(prospectus_quarter, 'sub.tsv') as sub:
+            return self.read_filtered_tsv(sub, prospectus_quarter + r'\\' + 'sub.tsv', use_columns, dtype_dict, chunk_filter, parse_dates=['effdate', 'filed'], infer_datetime_format=True)
 
 
     def read_num(self, prospectus_quarter):
-        '''Reads num.tsv into dataframe'''
+        '''Reads num.tsv into dataframe, keeping desired series and tags (pre_join_num_filter)'''
 
         #Parameters for reading in prospectus files
         use_columns = ['adsh', 'tag', 'series', 'class', 'value']
         dtype_dict = {'adsh': str, 'tag': str, 'series': str, 'class': str, 'value': float}
 
-        #File
-        num = prospectus_quarter + r'\\' + 'num.tsv'
+        if self.use_prospectus_cache(prospectus_quarter):
+            filters = [('series', 'in', sorted(self.config['series_to_index'].keys())), ('tag', 'in', self.desired_tags)]
+            return self.read_prospectus_cache(prospectus_quarter, 'num.tsv', use_columns, dtype_dict, self.pre_join_num_filter, filters)
 
-        chunks = []
-        #Read data in chunks of 100,000 to ensure enough memory
-        chunk_index = 0
-        for chunk in pd.read_csv(num, sep='\t', usecols=use_columns, dtype=dtype_dict, engine='python', chunksize=100000, quoting=3):
-            chunk_index += 1
-            logging.info(f'''Read in chunk {chunk_index} of 100,000 rows of data for {num}''')
-            chunks.append(chunk)
+        with self.open_prospectus_file(prospectus_quarter, 'num.tsv') as num:
+            return self.read_filtered_tsv(num, prospectus_quarter + r'\\' + 'num.tsv', use_columns, dtype_dict, self.pre_join_num_filter)
 
-        #Concatenate chunks of rows into single dataframe with all trades data
-        num_df = pd.concat(chunks, ignore_index=True)
 
-        return num_df
+    def use_prospectus_cache(self, prospectus_quarter):
+        '''Prospectus datasets of zip files are read from parquet cache, if pyarrow is installed and parquet_cache (config.json) is set'''
+
+        return (pa is not None) and bool(self.config['prospectus']['parquet_cache']) and prospectus_quarter.endswith('.zip')
+
+
+    def get_cache_filepath(self, prospectus_quarter, file_name):
+        '''Gets path of parquet cache file of a quarter's sub.tsv or num.tsv (e.g. 2021-03-31_num.parquet)'''
+
+        return self.config['network_drives']['prospectus_cache'] + '\\' + Path(prospectus_quarter).stem + '_' + Path(file_name).stem + '.parquet'
+
+
+    def get_cache_stamp(self, prospectus_quarter):
+        '''Gets schema metadata of cache files: cache version, and size and modification time of the zip file the cache is written from'''
+
+        file_stat = os.stat(prospectus_quarter)
+
+        return {b'sec_extractor.cache_version': self.cache_version.encode(), b'sec_extractor.source': f'''{file_stat.st_size}:{file_stat.st_mtime_ns}'''.encode()}
+
+
+    def is_cache_current(self, cache_path, stamp):
+
+        if not os.path.exists(cache_path):
+            return False
+
+        try:
+            metadata = pq.read_schema(cache_path).metadata or {}
+        except:
+            return False
+
+        return all(metadata.get(key) == value for key, value in stamp.items())
+
+
+    def get_cache_schema(self, use_columns, dtype_dict, date_columns, stamp):
+        '''Arrow schema of cache file; string columns are dictionary encoded by the parquet writer'''
+
+        fields = []
+        for column in use_columns:
+            if column in date_columns:
+                fields.append(pa.field(column, pa.timestamp('ns')))
+            elif dtype_dict.get(column) is float:
+                fields.append(pa.field(column, pa.float64()))
+            else:
+                fields.append(pa.field(column, pa.string()))
+
+        return pa.schema(fields, metadata=stamp)
+
+
+    def write_prospectus_cache(self, prospectus_quarter, file_name, use_columns, dtype_dict, stamp, **kwargs):
+        '''
+        Converts every row of a quarter's sub.tsv or num.tsv into its parquet cache file, one row group per chunk of chunk_size (config.json) rows
+        Written to .part file first, so an interrupted write never leaves a partial cache file behind
+        '''
+
+        cache_path = self.get_cache_filepath(prospectus_quarter, file_name)
+        part_path = cache_path + '.part'
+        os.makedirs(Path(cache_path).parent, exist_ok=True)
+
+        date_columns = kwargs.get('parse_dates', [])
+        schema = self.get_cache_schema(use_columns, dtype_dict, date_columns, stamp)
+        chunk_size = int(self.config['prospectus']['chunk_size'])
+
+        rows_written = 0
+        with self.open_prospectus_file(prospectus_quarter, file_name) as tsv, pq.ParquetWriter(part_path, schema, use_dictionary=True, compression='snappy') as writer:
+            for chunk in pd.read_csv(tsv, sep='\t', usecols=use_columns, dtype=dtype_dict, engine='c', chunksize=chunk_size, quoting=3, **kwargs):
+
+                for column in date_columns:
+                    chunk[column] = pd.to_datetime(chunk[column])
+
+                writer.write_table(pa.Table.from_pandas(chunk[use_columns], schema=schema, preserve_index=False))
+                rows_written += len(chunk)
+
+        os.replace(part_path, cache_path)
+
+        logging.info(f'''Wrote {rows_written} rows of {prospectus_quarter} {file_name} to parquet cache {cache_path}''')
+
+
+    def read_prospectus_cache(self, prospectus_quarter, file_name, use_columns, dtype_dict, chunk_filter, filters, **kwargs):
+        '''
+        Reads a quarter's sub.tsv or num.tsv from its parquet cache, which is written first if it is missing or stale (get_cache_stamp)
+        Only use_columns are read, and rows not passing filters (pyarrow filters, e.g. [('series', 'in', [...])]) are skipped while reading; chunk_filter is then applied, as when reading the tsv file
+        @param kwargs: pd.read_csv parameters, used if cache is written
+        '''
+
+        cache_path = self.get_cache_filepath(prospectus_quarter, file_name)
+        stamp = self.get_cache_stamp(prospectus_quarter)
+
+        if not self.is_cache_current(cache_path, stamp):
+            self.write_prospectus_cache(prospectus_quarter, file_name, use_columns, dtype_dict, stamp, **kwargs)
+
+        #pyarrow filters do not accept an empty list of values
+        if (filters is not None) and any(len(values) == 0 for column, operator, values in filters if operator == 'in'):
+            schema = pq.read_schema(cache_path)
+            table = pa.schema([schema.field(column) for column in use_columns]).empty_table()
+        else:
+            table = pq.read_table(cache_path, columns=use_columns, filters=filters)
+
+        df = chunk_filter(table.to_pandas()).reset_index(drop=True)
+
+        logging.info(f'''Read {table.num_rows} rows of data for {prospectus_quarter} {file_name} from parquet cache; kept {len(df)} rows''')
+
+        return df
 
 
     def pre_join_sub_filter(self, sub_df):
@@ -1172,10 +3847,8 @@ class prospectusCourier():
     def pre_join_num_filter(self, num_df):
         '''Filter num dataframe to only include desired series id's and desired tags and non-NA values'''
 
-        desired_tags = ["ExpensesOverAssets", "NetExpensesOverAssets", "AverageAnnualReturnYear01", "AverageAnnualReturnYear05", "AverageAnnualReturnYear10", "AverageAnnualReturnSinceInception"]
-
         num_df = num_df[num_df['series'].isin(self.config['series_to_index'].keys())]
-        num_df = num_df[num_df['tag'].isin(desired_tags)]
+        num_df = num_df[num_df['tag'].isin(self.desired_tags)]
         num_df = num_df.dropna(subset=['class'])
 
         return num_df
@@ -1184,11 +3857,9 @@ class prospectusCourier():
     def join_quarter_prospectuses_files(self, prospectus_quarter):
         '''Inner join num and sub dataframes'''
 
-        #Read in datasets
-        sub_df = self.read_sub(prospectus_quarter)
-        sub_df = self.pre_join_sub_filter(sub_df)
+        #Read in datasets; num is read first, so only submissions of its remaining rows are kept from sub
         num_df = self.read_num(prospectus_quarter)
-        num_df = self.pre_join_num_filter(num_df)
+        sub_df = self.read_sub(prospectus_quarter, set(num_df['adsh']))
 
         #Inner join dataframes
         df = num_df.merge(sub_df, how='inner')
@@ -1218,27 +3889,14 @@ class prospectusCourier():
     def translate_period_end_quarter_end(self, period_end_date):
         '''Produces the quarter end date (yyyy-mm-dd) from any date (also needs to be formatted yyyy-mm-dd)'''
 
-        month = period_end_date[5:7]
-
-        if month in ['01', '02', '03']:
-            return period_end_date[0:4] + '-' + '03' + '-' + '31'
-        elif month in ['04', '05', '06']:
-            return period_end_date[0:4] + '-' + '06' + '-' + '30'
-        elif month in ['07', '08', '09']:
-            return period_end_date[0:4] + '-' + '09' + '-' + '30'
-        elif month in ['10', '11', '12']:
-            return period_end_date[0:4] + '-' + '12' + '-' + '31'
+        return self.calendar.quarter_end(period_end_date)
 
 
     def get_dates_table_data(self, df):
         '''Gets list of tuples of dates to be input into database'''
 
-        dates_df = df[['effdate']]
-
         #Create desired fields
-        dates_df['EFFECTIVE_DATE'] = dates_df['effdate'].apply(lambda date: date.strftime('%Y-%m-%d'))
-        dates_df['QUARTER_END_DATE'] = dates_df['EFFECTIVE_DATE'].apply(lambda date: self.translate_period_end_quarter_end(date))
-        dates_df = dates_df[['EFFECTIVE_DATE', 'QUARTER_END_DATE']]
+        dates_df = pd.DataFrame({'EFFECTIVE_DATE': self.calendar.format_dates(df['effdate']), 'QUARTER_END_DATE': self.calendar.format_dates(self.calendar.quarter_ends(df['effdate']))})
 
         dates = list(dates_df.to_records(index=False))
 
@@ -1248,9 +3906,7 @@ class prospectusCourier():
     def insert_dates_list(self, dates):
         '''Inserts list of dates tuples into databse'''
 
-        for date_tuple in dates:
-
-            self.db_manager.insert_dates(date_tuple)
+        self.db_manager.insert_dates_many(dates)
 
 
     def get_entities_table_data(self, df):
@@ -1264,9 +3920,7 @@ class prospectusCourier():
 
     def insert_entities_list(self, entities):
 
-        for entitity_tuple in entities:
-
-            self.db_manager.insert_entities(entitity_tuple)
+        self.db_manager.insert_entities_many(entities)
 
 
     def get_prospectus_table_data(self, df):
@@ -1281,11 +3935,11 @@ class prospectusCourier():
 
                 df[col] = np.nan
 
-        pros_df = df[['adsh', 'form', 'filed', 'effdate', 'class', 'ExpensesOverAssets', 'NetExpensesOverAssets', 'AverageAnnualReturnYear01', 'AverageAnnualReturnYear05', 'AverageAnnualReturnYear10', 'AverageAnnualReturnSinceInception']]
+        pros_df = df[['adsh', 'form', 'filed', 'effdate', 'class', 'ExpensesOverAssets', 'NetExpensesOverAssets', 'AverageAnnualReturnYear01', 'AverageAnnualReturnYear05', 'AverageAnnualReturnYear10', 'AverageAnnualReturnSinceInception']].copy()
 
         #Datetime columns to string
-        pros_df['filed'] = pros_df['filed'].apply(lambda date: date.strftime('%Y-%m-%d'))
-        pros_df['effdate'] = pros_df['effdate'].apply(lambda date: date.strftime('%Y-%m-%d'))
+        pros_df['filed'] = self.calendar.format_dates(pros_df['filed'])
+        pros_df['effdate'] = self.calendar.format_dates(pros_df['effdate'])
 
         prospectuses = list(pros_df.to_records(index=False))
 
@@ -1294,9 +3948,7 @@ class prospectusCourier():
 
     def insert_prospectuses_list(self, prospectuses):
 
-        for prospectus_tuple in prospectuses:
-
-            self.db_manager.insert_prospectuses(prospectus_tuple)
+        self.db_manager.insert_prospectuses_many(prospectuses)
 
 
     def get_quarters_table_data(self):
@@ -1305,7 +3957,7 @@ class prospectusCourier():
         min_date = self.db_manager.get_least_recent_effective_date()
         max_date = self.db_manager.get_most_recent_effective_date()
 
-        quarter_list = pd.date_range(pd.to_datetime(min_date), pd.to_datetime(max_date) + pd.offsets.QuarterBegin(1), freq='Q').strftime('%Y-%m-%d').tolist()
+        quarter_list = self.calendar.quarter_ends_between(min_date, pd.to_datetime(max_date) + pd.offsets.QuarterBegin(1))
 
         #Convert to list of tuples
         return [(quarter,) for quarter in quarter_list]
@@ -1313,26 +3965,22 @@ class prospectusCourier():
 
     def insert_quarters_list(self, quarters):
 
-        for quarter_tuple in quarters:
-
-            self.db_manager.insert_quarters(quarter_tuple)
+        self.db_manager.insert_quarters_many(quarters)
 
 
-    def obtain_insert_prospectus_data(self):
-        '''Obtains prospectus data from datasets using help methods; inserts data into database'''
-
-        start_time = time.time()
+    def insert_quarter_prospectuses(self, prospectus_quarter, pivot_df):
+        '''Inserts a quarter's pivoted prospectus data into database, as one unit of work'''
 
-        for i,prospectus_quarter in enumerate(self.prospectus_paths):
+        logging.info(f'''Prospectuses data read, filtered, joined, and pivoted for {prospectus_quarter}''')
 
-            pivot_df = self.get_prospectuses_data(prospectus_quarter)
+        with self.db_manager.transaction():
 
-            logging.info(f'''Prospectuses data read, filtered, joined, and pivoted for {prospectus_quarter}''')
+            self.insert_manifest(prospectus_quarter, pivot_df)
 
             if len(pivot_df) == 0:
 
                 logging.info(f'''Prospectuses data is empty for {prospectus_quarter}''')
-                continue
+                return
 
             dates = self.get_dates_table_data(pivot_df)
 
@@ -1358,21 +4006,134 @@ class prospectusCourier():
 
             logging.info(f'''Quarters data inserted for {prospectus_quarter}''')
 
+            #Facts commit with the data they are computed from, so readers (e.g. queryService) never see stale facts
+            self.db_manager.refresh_series_quarter_facts()
 
-if __name__ == "__main__":
 
+    def insert_manifest(self, prospectus_quarter, pivot_df):
+        '''Records quarter's zip file (from filter_zip_files) and row counts in prospectus_manifest'''
 
-    #Import configuration json file
-    configuration_manager = configurationManager()
-    config = configuration_manager.get_config()
+        #Zip file stem, or folder it was extracted to
+        quarter_end_date = Path(prospectus_quarter).stem
 
-    #Configure logging
-    log_manager = logManager(config)
-    log_manager.config_log()
-    logging.info('###### sec_extractor.py has begun execution. Configuration file has been loaded without error. ######')
-    log_manager.declare_computer_user()
+        if quarter_end_date not in self.zip_manifest:
+            return
+
+        content_hash, size, mtime = self.zip_manifest[quarter_end_date]
+        class_rows = pivot_df['class'].nunique() if len(pivot_df) > 0 else 0
+        date_rows = pivot_df['effdate'].nunique() if len(pivot_df) > 0 else 0
+
+        self.db_manager.insert_prospectus_manifest(quarter_end_date, content_hash, size, mtime, len(pivot_df), class_rows, date_rows)
+
+
+    def insert_next_quarter(self, pending):
+        '''Waits for the oldest quarter being read in process pool, and inserts it'''
+
+        prospectus_quarter, future = pending.popleft()
+
+        try:
+            pivot_df = future.result()
+        except:
+            logging.error(f'''Could not read prospectus data for {prospectus_quarter}''')
+            raise
+
+        self.insert_quarter_prospectuses(prospectus_quarter, pivot_df)
+
+
+    def obtain_insert_prospectus_data(self):
+        '''
+        Obtains prospectus data from datasets using help methods; inserts data into database
+        With more than one worker (workers in config.json; 0 uses every core), quarters are read and pivoted in a process pool, each worker's memory capped at worker_memory_mb (0 for no cap)
+        Quarters are inserted by this process, in order, so that later quarters still replace earlier ones
+        '''
+
+        start_time = time.time()
+
+        prospectus_config = self.config['prospectus']
+        workers = int(prospectus_config['workers']) or os.cpu_count()
+
+        if (workers == 1) or (len(self.prospectus_paths) <= 1):
+
+            for prospectus_quarter in self.prospectus_paths:
+
+                self.insert_quarter_prospectuses(prospectus_quarter, self.get_prospectuses_data(prospectus_quarter))
+
+        else:
+
+            memory_limit_mb = int(prospectus_config['worker_memory_mb'])
+            if (memory_limit_mb > 0) and (resource is None):
+                logging.warning('worker_memory_mb (config.json) can only be applied on Unix; prospectus workers will run without a memory cap.')
+
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=init_prospectus_process, initargs=(memory_limit_mb,))
+
+            #Quarters being read, in quarter order; kept to twice the number of workers to bound memory
+            pending = collections.deque()
+
+            try:
+                for prospectus_quarter in self.prospectus_paths:
+
+                    pending.append((prospectus_quarter, executor.submit(read_prospectus_quarter, self.config, prospectus_quarter)))
+
+                    if len(pending) >= 2 * workers:
+                        self.insert_next_quarter(pending)
+
+                while pending:
+                    self.insert_next_quarter(pending)
+
+            finally:
+                for prospectus_quarter, future in pending:
+                    future.cancel()
+                executor.shutdown(wait=True)
+
+        time_taken = (time.time() - start_time)/60
+        logging.info(f'''Prospectus data insert took {time_taken:.2f} minutes''')
+
+
+def init_prospectus_process(memory_limit_mb):
+    '''Prospectus worker processes ignore Ctrl-C, and cap their address space at memory_limit_mb (where the resource module is available)'''
+
+    init_parse_process()
+
+    if (memory_limit_mb > 0) and (resource is not None):
+
+        memory_limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def read_prospectus_quarter(config, prospectus_quarter):
+    '''Reads and pivots a quarter's prospectus data in a worker process (see prospectusCourier.obtain_insert_prospectus_data)'''
+
+    return prospectusCourier(config, None).get_prospectuses_data(prospectus_quarter)
+
+
+def get_argument_parser():
+    '''
+    Command line of sec_extractor.py
+    No command: ingests index files, holdings, and prospectuses, then exports dataset to output_path (config.json)
+    export: exports dataset (optionally filtered) from existing database, without ingesting
+    serve: runs queryService over existing database, until interrupted
+    '''
+
+    parser = argparse.ArgumentParser(prog='sec_extractor.py', description='Extracts mutual fund holdings and prospectus data from SEC filings')
+    subparsers = parser.add_subparsers(dest='command')
+
+    export_parser = subparsers.add_parser('export', help='stream series and quarter dataset to csv, csv.gz, or parquet')
+    export_parser.add_argument('--output', required=True, help='output file; .csv, .csv.gz, or .parquet')
+    export_parser.add_argument('--series', nargs='+', help='series ids to export (default: all)')
+    export_parser.add_argument('--cik', nargs='+', type=int, help='ciks to export (default: all)')
+    export_parser.add_argument('--start', help='first quarter end date to export, yyyy-mm-dd')
+    export_parser.add_argument('--end', help='last quarter end date to export, yyyy-mm-dd')
+    export_parser.add_argument('--chunk-size', type=int, help='rows written at a time (default: chunk_size of export in config.json)')
+
+    serve_parser = subparsers.add_parser('serve', help='serve series and quarter dataset, and net assets and expense ratio histories, over local read-only HTTP')
+    serve_parser.add_argument('--host', help='host to bind (default: host of service in config.json)')
+    serve_parser.add_argument('--port', type=int, help='port to bind (default: port of service in config.json)')
+
+    return parser
+
+
+def run_ingestion(config):
 
-    start_time = time.time()
 
     #Create HTTP(S) session with specified proxy
     proxy_manager = proxyManager()
@@ -1380,7 +4141,8 @@ if __name__ == "__main__":
 
     #Get latest SEC index files
     index_courier = indexCourier(config)
-    index_courier.obtain_index_files()
+    index_courier.obtain_index_files(proxy_manager)
+    index_courier.update_filing_catalog()
 
     #Create database
     db_manager = databaseManager(config)
@@ -1390,20 +4152,86 @@ if __name__ == "__main__":
     #Holdings courier
     holdings_courier = holdingsCourier(config)
     holdings_courier.filter_indexes(db_manager, index_courier)
-    holdings_courier.get_report_urls()
+    holdings_courier.get_report_urls(index_courier)
+    holdings_courier.filter_ingested_reports(db_manager)
     holdings_courier.obtain_insert_holdings_data(db_manager, proxy_manager)
+    proxy_manager.log_cache_stats()
 
     #Prospectus courier
     prospectus_courier = prospectusCourier(config, db_manager)
     prospectus_courier.get_list_quarters()
     prospectus_courier.get_list_url_files()
-    prospectus_courier.download_zip_files()
+    prospectus_courier.download_zip_files(proxy_manager)
     prospectus_courier.filter_zip_files()
     prospectus_courier.get_quarter_prospectuses()
     prospectus_courier.obtain_insert_prospectus_data()
 
     #Query database
     db_manager.select_data()
+    db_manager.close()
+
+
+
+def run_export(config, args):
+
+    db_manager = databaseManager(config)
+    db_manager.create_tables()
+
+    export_manager = exportManager(config, db_manager)
+    rows_exported = export_manager.export_series_quarter_facts(args.output, args.series, args.cik, args.start, args.end, args.chunk_size)
+    db_manager.close()
+
+    print(f'''Exported {rows_exported} rows to {args.output}''')
+
+
+def run_serve(config, args):
+
+    db_manager = databaseManager(config)
+    db_manager.create_tables()
+
+    #Facts marked dirty by create_tables (new facts table or migration) are refreshed before serving, as the service only reads
+    db_manager.refresh_series_quarter_facts()
+
+    query_service = queryService(config, db_manager)
+    server = query_service.get_server(args.host, args.port)
+
+    host, port = server.server_address[:2]
+    logging.info(f'''Query service listening on http://{host}:{port}''')
+    print(f'''Query service listening on http://{host}:{port} (Ctrl+C to stop)''')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        query_service.close()
+        db_manager.close()
+
+
+if __name__ == "__main__":
+
+
+    args = get_argument_parser().parse_args()
+
+    #Import configuration json file
+    configuration_manager = configurationManager()
+    config = configuration_manager.get_config()
+
+    #Configure logging
+    log_manager = logManager(config)
+    log_manager.config_log()
+    logging.info('###### sec_extractor.py has begun execution. Configuration file has been loaded without error. ######')
+    log_manager.declare_computer_user()
+
+    start_time = time.time()
+
+    if args.command == 'export':
+        run_export(config, args)
+    elif args.command == 'serve':
+        run_serve(config, args)
+    else:
+        run_ingestion(config)
 
     time_taken = (time.time() - start_time)/60
     logging.info(f'''##### Application complete. It took {time_taken:.2f} minutes to execute. #####''')
@@ -4,6 +4,9 @@ from unittest import mock
 import sec_extractor
 import sqlite3
 import os
+import pathlib
+import tempfile
+import pandas as pd
 
 
 def remove_database():
@@ -167,6 +170,78 @@ def populate_test_tables(db):
     conn.close()
 
 
+#select_data query before series_quarter_facts, which rebuilt every series and quarter on every run
+select_data_query = '''
+        SELECT hold.FILING_TYPE AS HOLDINGS_FILING_TYPE, pros.FILING_TYPE AS PROSPECTUS_FILING_TYPE, pros.CIK_IMPUTE, pros.COMPANY_IMPUTE, hold.SERIES_ID, hold.QUARTER_END_DATE, AVERAGE_NET_ASSETS, pros.avgexpratio AS AVERAGE_EXPENSE_RATIO, pros.AVERAGE_EXPENSE_RATIO_IMPUTE, pros.avgnetexpratio AS AVERAGE_NET_EXPENSE_RATIO, pros.AVERAGE_NET_EXPENSE_RATIO_IMPUTE, pros.AVERAGE_ANNUAL_1YR_RETURN, pros.AVERAGE_ANNUAL_5YR_RETURN, pros.AVERAGE_ANNUAL_10YR_RETURN, pros.AVERAGE_ANNUAL_RETURN_SINCE_INCEPTION
+        FROM
+        (SELECT h.SERIES_ID, h.FILING_TYPE, dates.QUARTER_END_DATE, AVG(NET_ASSETS) AVERAGE_NET_ASSETS FROM holdings h
+        LEFT JOIN dates ON date(h.PERIOD_END_DATE) = date(dates.DATE) GROUP BY h.SERIES_ID, dates.QUARTER_END_DATE) hold
+        INNER JOIN
+            (SELECT all_qtrs.SERIES_ID, avg_er.CIK, avg_er.COMPANY, avg_er.AVERAGE_ANNUAL_1YR_RETURN, avg_er.AVERAGE_ANNUAL_5YR_RETURN, avg_er.AVERAGE_ANNUAL_10YR_RETURN, avg_er.AVERAGE_ANNUAL_RETURN_SINCE_INCEPTION, avg_er.FILING_TYPE, all_qtrs.QUARTER, avg_er.avgexpratio, COALESCE(avg_er.avgexpratio,
+                (SELECT avg_er2.avgexpratio FROM
+                    (SELECT e.SERIES_ID, AVG(p2.EXPENSE_RATIO) AS avgexpratio, d.QUARTER_END_DATE FROM prospectus p2
+                    INNER JOIN dates d ON date(p2.EFFECTIVE_DATE) = date(d.DATE)
+                    INNER JOIN entities e ON p2.CLASS_ID = e.CLASS_ID
+                    GROUP BY e.SERIES_ID, d.QUARTER_END_DATE
+                    ORDER BY e.SERIES_ID, d.DATE
+                    ) avg_er2
+                WHERE all_qtrs.SERIES_ID = avg_er2.SERIES_ID AND date(avg_er2.QUARTER_END_DATE) < date(all_qtrs.QUARTER)
+                ORDER BY date(avg_er2.QUARTER_END_DATE) DESC LIMIT 1)) AVERAGE_EXPENSE_RATIO_IMPUTE,
+                avg_er.avgnetexpratio,
+                COALESCE(avg_er.avgnetexpratio,
+                (SELECT avg_er2.avgnetexpratio FROM
+                    (SELECT e.SERIES_ID, AVG(p2.NET_EXPENSE_RATIO) AS avgnetexpratio, d.QUARTER_END_DATE FROM prospectus p2
+                    INNER JOIN dates d ON date(p2.EFFECTIVE_DATE) = date(d.DATE)
+                    INNER JOIN entities e ON p2.CLASS_ID = e.CLASS_ID
+                    GROUP BY e.SERIES_ID, d.QUARTER_END_DATE
+                    ORDER BY e.SERIES_ID, d.DATE
+                    ) avg_er2
+                WHERE all_qtrs.SERIES_ID = avg_er2.SERIES_ID AND date(avg_er2.QUARTER_END_DATE) < date(all_qtrs.QUARTER)
+                ORDER BY date(avg_er2.QUARTER_END_DATE) DESC LIMIT 1)) AVERAGE_NET_EXPENSE_RATIO_IMPUTE,
+                COALESCE(avg_er.CIK,
+                    (SELECT avg_er2.avgcik FROM
+                        (SELECT e.SERIES_ID, e.CIK AS avgcik, d.QUARTER_END_DATE FROM prospectus p2
+                        INNER JOIN dates d ON date(p2.EFFECTIVE_DATE) = date(d.DATE)
+                        INNER JOIN entities e ON p2.CLASS_ID = e.CLASS_ID
+                        GROUP BY e.SERIES_ID, d.QUARTER_END_DATE
+                        ORDER BY e.SERIES_ID, d.DATE
+                        ) avg_er2
+                    WHERE all_qtrs.SERIES_ID = avg_er2.SERIES_ID AND date(avg_er2.QUARTER_END_DATE) < date(all_qtrs.QUARTER)
+                    ORDER BY date(avg_er2.QUARTER_END_DATE) DESC LIMIT 1)) CIK_IMPUTE,
+                COALESCE(avg_er.COMPANY,
+                    (SELECT avg_er2.avgcompany FROM
+                        (SELECT e.SERIES_ID, e.COMPANY AS avgcompany, d.QUARTER_END_DATE FROM prospectus p2
+                        INNER JOIN dates d ON date(p2.EFFECTIVE_DATE) = date(d.DATE)
+                        INNER JOIN entities e ON p2.CLASS_ID = e.CLASS_ID
+                        GROUP BY e.SERIES_ID, d.QUARTER_END_DATE
+                        ORDER BY e.SERIES_ID, d.DATE
+                        ) avg_er2
+                    WHERE all_qtrs.SERIES_ID = avg_er2.SERIES_ID AND date(avg_er2.QUARTER_END_DATE) < date(all_qtrs.QUARTER)
+                    ORDER BY date(avg_er2.QUARTER_END_DATE) DESC LIMIT 1)) COMPANY_IMPUTE
+            FROM
+                (SELECT SERIES_ID, QUARTER FROM
+                    (SELECT SERIES_ID, MIN(QUARTER_END_DATE) min_qtr_date, MAX(QUARTER_END_DATE) max_qtr_date
+                    FROM prospectus p1
+                    INNER JOIN dates d1 ON date(p1.EFFECTIVE_DATE) = date(d1.DATE)
+                    INNER JOIN entities e1 ON p1.CLASS_ID = e1.CLASS_ID
+                    GROUP BY e1.SERIES_ID
+                    ) min_max
+                CROSS JOIN quarters q2 WHERE date(q2.QUARTER) BETWEEN min_qtr_date AND max_qtr_date
+            ) all_qtrs
+            LEFT JOIN
+                (SELECT e.SERIES_ID, e.CIK, e.COMPANY, p2.FILING_TYPE, AVG(AVG_ANN_1YR_RETURN) AS AVERAGE_ANNUAL_1YR_RETURN, AVG(AVG_ANN_5YR_RETURN) AS AVERAGE_ANNUAL_5YR_RETURN, AVG(AVG_ANN_10YR_RETURN) AS AVERAGE_ANNUAL_10YR_RETURN, AVG(AVG_ANN_RETURN_SINCE_INCEPTION) AS AVERAGE_ANNUAL_RETURN_SINCE_INCEPTION, AVG(p2.NET_EXPENSE_RATIO) as avgnetexpratio, AVG(p2.EXPENSE_RATIO) AS avgexpratio, d.QUARTER_END_DATE FROM prospectus p2
+                INNER JOIN dates d ON date(p2.EFFECTIVE_DATE) = date(d.DATE)
+                INNER JOIN entities e ON p2.CLASS_ID = e.CLASS_ID
+                GROUP BY e.SERIES_ID, d.QUARTER_END_DATE
+                ORDER BY e.SERIES_ID, d.DATE
+                ) avg_er
+            ON all_qtrs.SERIES_ID = avg_er.SERIES_ID AND date(all_qtrs.QUARTER) = date(avg_er.QUARTER_END_DATE)
+            ORDER BY all_qtrs.SERIES_ID, date(all_qtrs.QUARTER)) pros
+        ON hold.SERIES_ID = pros.SERIES_ID AND date(hold.QUARTER_END_DATE) = date(pros.QUARTER)
+        ORDER BY hold.SERIES_ID, hold.QUARTER_END_DATE
+'''
+
+
 class testDatabaseManager(unittest.TestCase):
     '''Tests the final query of the fund database'''
 
@@ -240,5 +315,233 @@ class testDatabaseManager(unittest.TestCase):
         self.assertCountEqual(output, query_list)
 
 
+    def test_transaction(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['database']['batch_size'] = 2
+
+        with tempfile.TemporaryDirectory() as database_folder:
+
+            config['network_drives']['database'] = os.path.join(database_folder, 'database')
+
+            db_manager = sec_extractor.databaseManager(config)
+            db_manager.create_tables()
+
+            #Rows from list and from dataframe, in batches smaller than the rows inserted
+            with db_manager.transaction():
+                db_manager.insert_dates_many([('2021-01-15', '2021-03-31'), ('2021-04-15', '2021-06-30'), ('2021-07-15', '2021-09-30')])
+                db_manager.insert_holdings_many(pd.DataFrame({'ADSH': ['a', 'b'], 'FILING_TYPE': ['NPORT-P', 'NPORT-P'], 'FILING_DATE': ['2021-01-15', '2021-04-15'], 'PERIOD_END_DATE': ['2021-03-31', '2021-06-30'], 'SERIES_ID': ['S1', 'S1'], 'NET_ASSETS': [1.5, 2]}))
+
+            #Nothing in a failed transaction is committed
+            with self.assertRaises(ValueError):
+                with db_manager.transaction():
+                    db_manager.insert_dates_many([('2021-10-15', '2021-12-31')])
+                    raise ValueError
+
+            conn = sqlite3.connect(db_manager.get_database_filepath())
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM dates').fetchone()[0], 3)
+            self.assertEqual(conn.execute('SELECT NET_ASSETS FROM holdings ORDER BY ADSH').fetchall(), [(1.5,), (2,)])
+            conn.close()
+
+            db_manager.close()
+
+
+    def test_read_while_writing(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        with tempfile.TemporaryDirectory() as database_folder:
+
+            config['network_drives']['database'] = os.path.join(database_folder, 'database')
+            #Local disk, so WAL can be used
+            config['database']['journal_mode'] = 'WAL'
+            config['database']['synchronous'] = 'NORMAL'
+
+            db_manager = sec_extractor.databaseManager(config)
+            db_manager.create_tables()
+            db_manager.insert_dates_many([('2021-01-15', '2021-03-31')])
+
+            self.assertEqual(db_manager.get_connection().execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(db_manager.get_connection().execute('PRAGMA synchronous').fetchone()[0], 1)
+
+            #Readers see last committed data while a write transaction is open
+            with db_manager.transaction():
+                db_manager.insert_dates_many([('2021-04-15', '2021-06-30')])
+                self.assertEqual(len(db_manager.query('SELECT * FROM dates WHERE DATE > ?', params=('2021-01-01',))), 1)
+
+            self.assertEqual(len(db_manager.query('SELECT * FROM dates WHERE DATE > ?', params=('2021-01-01',))), 2)
+
+            #Read connections cannot write
+            conn = db_manager.get_read_connection()
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute('DELETE FROM dates')
+            conn.close()
+
+            db_manager.close()
+
+
+    def test_get_database_uri(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        db_manager = sec_extractor.databaseManager(config)
+
+        #Windows paths: UNC path of network drive keeps its server in the path, not the authority
+        with mock.patch.object(sec_extractor, 'Path', pathlib.PureWindowsPath):
+            for database_folder, database_uri in [('\\\\server\\share\\db', 'file:////server/share/db/sec_extractor.db?mode=ro'),
+                                                  ('Z:\\db', 'file:///Z:/db/sec_extractor.db?mode=ro'),
+                                                  ('db folder', 'file:db%20folder/sec_extractor.db?mode=ro')]:
+                config['network_drives']['database'] = database_folder
+                self.assertEqual(db_manager.get_database_uri('ro'), database_uri)
+
+        #Characters with meaning in URIs are escaped
+        with tempfile.TemporaryDirectory() as database_folder:
+
+            config['network_drives']['database'] = os.path.join(database_folder, 'data#base?%')
+
+            db_manager.create_tables()
+            db_manager.insert_dates_many([('2021-01-15', '2021-03-31')])
+            self.assertEqual(len(db_manager.query('SELECT * FROM dates')), 1)
+
+            db_manager.close()
+
+
+    def test_journal_mode(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        with tempfile.TemporaryDirectory() as database_folder:
+
+            config['network_drives']['database'] = os.path.join(database_folder, 'database')
+
+            #Default is safe on network drives, and durable
+            db_manager = sec_extractor.databaseManager(config)
+            self.assertEqual(db_manager.get_connection().execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+            self.assertEqual(db_manager.get_connection().execute('PRAGMA synchronous').fetchone()[0], 2)
+            db_manager.close()
+
+            #synchronous=NORMAL is raised to FULL without WAL
+            config['database']['synchronous'] = 'NORMAL'
+            db_manager = sec_extractor.databaseManager(config)
+            self.assertEqual(db_manager.get_connection().execute('PRAGMA synchronous').fetchone()[0], 2)
+            db_manager.close()
+
+        #WAL is not used on network shares
+        config['database']['journal_mode'] = 'WAL'
+        for database_folder, journal_mode in [('\\\\server\\share\\db', 'DELETE'), ('//server/share/db', 'DELETE'), ('C:\\db', 'WAL')]:
+            config['network_drives']['database'] = database_folder
+            self.assertEqual(sec_extractor.databaseManager(config).get_journal_mode(), journal_mode)
+
+
+    def test_series_quarter_facts(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        with tempfile.TemporaryDirectory() as database_folder:
+
+            config['network_drives']['database'] = os.path.join(database_folder, 'database')
+
+            db_manager = sec_extractor.databaseManager(config)
+            db_manager.create_tables()
+
+            with db_manager.transaction():
+                db_manager.insert_dates_many([('2020-12-15', '2020-12-31'), ('2021-01-15', '2021-03-31'), ('2021-02-20', '2021-03-31'), ('2021-04-15', '2021-06-30'), ('2021-07-15', '2021-09-30'), ('2021-10-15', '2021-12-31'), ('2022-01-15', '2022-03-31')])
+                db_manager.insert_entities_many([('C1', 'S1', 1, 'FUND ONE'), ('C2', 'S1', 1, 'FUND ONE'), ('C3', 'S2', 2, 'FUND TWO')])
+                #S1 has no net expense ratio in first quarter, and no ratios at all in third quarter, so fourth quarter imputes empty ratios
+                db_manager.insert_prospectuses_many([('a1', '497', '2021-01-15', '2021-01-15', 'C1', .01, None, .1, .5, None, None),
+                                                     ('a2', '497', '2021-02-20', '2021-02-20', 'C2', .03, .02, None, None, None, .2),
+                                                     ('a3', '485BPOS', '2021-07-15', '2021-07-15', 'C1', None, None, None, None, None, None),
+                                                     ('a4', '485BPOS', '2022-01-15', '2022-01-15', 'C1', .02, .015, None, None, None, None),
+                                                     ('a5', '497', '2021-04-15', '2021-04-15', 'C3', .05, .04, None, None, None, None)])
+                db_manager.insert_holdings_many([(f'h{i}', 'NPORT-P', period_end_date, period_end_date, series_id, net_assets) for i, (series_id, period_end_date, net_assets) in enumerate([
+                                                    ('S1', '2020-12-15', 90), ('S1', '2021-01-15', 100), ('S1', '2021-02-20', 110), ('S1', '2021-04-15', 120), ('S1', '2021-07-15', 130), ('S1', '2021-10-15', 140), ('S1', '2022-01-15', None),
+                                                    ('S2', '2021-04-15', 200), ('S2', '2021-07-15', 210)])])
+                db_manager.insert_quarters_many([('2020-12-31',), ('2021-03-31',), ('2021-06-30',), ('2021-09-30',), ('2021-12-31',), ('2022-03-31',)])
+
+            facts_df = db_manager.get_series_quarter_facts()
+            pd.testing.assert_frame_equal(facts_df, db_manager.query(select_data_query))
+            self.assertEqual(facts_df['SERIES_ID'].to_list(), ['S1', 'S1', 'S1', 'S1', 'S1', 'S2'])
+            self.assertEqual(facts_df['AVERAGE_NET_EXPENSE_RATIO_IMPUTE'][2], .02)
+            self.assertTrue(pd.isna(facts_df['AVERAGE_NET_EXPENSE_RATIO_IMPUTE'][3]))
+
+            #Only cells touched since last refresh are recomputed: S2 third quarter (holdings and prospectus), and first quarter of S1 and S2 (class moved from S1 to S2)
+            with db_manager.transaction():
+                db_manager.insert_holdings_many([('h9', 'NPORT-P/A', '2021-07-15', '2021-07-15', 'S2', 220)])
+                db_manager.insert_entities_many([('C1', 'S1', 1, 'FUND ONE'), ('C2', 'S2', 2, 'FUND TWO')])
+                db_manager.insert_prospectuses_many([('a6', '497', '2021-07-15', '2021-07-15', 'C3', None, .03, None, None, None, None)])
+
+            self.assertEqual(db_manager.refresh_series_quarter_facts(), 3)
+            pd.testing.assert_frame_equal(db_manager.get_series_quarter_facts(), db_manager.query(select_data_query))
+
+            #Facts table created in an existing database is computed from all existing data
+            facts_df = db_manager.get_series_quarter_facts()
+            db_manager.get_connection().execute('DROP TABLE series_quarter_facts')
+            db_manager.create_tables()
+            pd.testing.assert_frame_equal(db_manager.get_series_quarter_facts(), facts_df)
+
+            db_manager.close()
+
+
+    def test_migrate(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        with tempfile.TemporaryDirectory() as database_folder:
+
+            config['network_drives']['database'] = os.path.join(database_folder, 'database')
+
+            db_manager = sec_extractor.databaseManager(config)
+            db_manager.create_tables()
+            migrations = len(db_manager.get_migrations())
+
+            #Database as it was before migrations: no secondary indexes, and dates with times
+            conn = db_manager.get_connection()
+            for index in ['HOLDINGS_FILING_DATE_IDX', 'PROSPECTUS_FILING_DATE_IDX', 'PROSPECTUS_EFFECTIVE_DATE_IDX', 'DATES_QUARTER_END_DATE_IDX', 'ENTITIES_SERIES_CLASS_IDX']:
+                conn.execute(f'DROP INDEX {index}')
+            conn.executemany('INSERT INTO dates (DATE, QUARTER_END_DATE) VALUES (?,?)', [('2021-01-15 00:00:00', '2021-03-31 00:00:00'), ('2021-04-15', '2021-06-30')])
+            conn.executemany('INSERT INTO holdings (ADSH, FILING_TYPE, FILING_DATE, PERIOD_END_DATE, SERIES_ID, NET_ASSETS) VALUES (?,?,?,?,?,?)', [('a', 'NPORT-P', '2021-02-01 00:00:00', '2021-01-15 00:00:00', 'S1', 1.0), ('b', 'NPORT-P', '2021-05-01', '2021-04-15', 'S1', 2.0)])
+            conn.execute('PRAGMA user_version = 0')
+            conn.commit()
+
+            watermark_query = 'SELECT MAX(FILING_DATE) FROM holdings'
+            join_query = 'SELECT h.SERIES_ID, d.QUARTER_END_DATE FROM holdings h INNER JOIN dates d ON d.DATE = h.PERIOD_END_DATE WHERE h.SERIES_ID = ?'
+            series_query = 'SELECT CLASS_ID, CIK, COMPANY FROM entities WHERE SERIES_ID = ?'
+
+            #Before: no index can be used, so whole tables are read
+            self.assertFalse(any('INDEX' in detail for detail in db_manager.explain_query_plan('SELECT MAX(date(FILING_DATE)) FROM holdings')))
+            self.assertTrue(any(detail.startswith('SCAN d') for detail in db_manager.explain_query_plan('SELECT h.SERIES_ID, d.QUARTER_END_DATE FROM holdings h LEFT JOIN dates d ON date(h.PERIOD_END_DATE) = date(d.DATE) WHERE h.SERIES_ID = ?', ('S1',))))
+            self.assertTrue(any(detail.startswith('SCAN') for detail in db_manager.explain_query_plan(series_query, ('S1',))))
+
+            db_manager.create_tables()
+
+            self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], migrations)
+            self.assertEqual(conn.execute('SELECT DATE, QUARTER_END_DATE FROM dates WHERE DATE < ? ORDER BY 1', ('2021-04-01',)).fetchall()[-1], ('2021-01-15', '2021-03-31'))
+            self.assertEqual(db_manager.get_most_recent_holdings_date(), sec_extractor.dt.datetime(2021, 5, 1))
+
+            #After: indexes are searched, without reading tables
+            self.assertIn('SEARCH holdings USING COVERING INDEX HOLDINGS_FILING_DATE_IDX', db_manager.explain_query_plan(watermark_query))
+            self.assertIn('SEARCH d USING INDEX DATE_IDX (DATE=?)', db_manager.explain_query_plan(join_query, ('S1',)))
+            self.assertTrue(any('USING COVERING INDEX ENTITIES_SERIES_CLASS_IDX' in detail for detail in db_manager.explain_query_plan(series_query, ('S1',))))
+
+            #Facts are recomputed from normalized dates
+            db_manager.insert_quarters_many([('2021-03-31',), ('2021-06-30',)])
+            db_manager.insert_entities_many([('C1', 'S1', 1, 'FUND ONE')])
+            db_manager.insert_prospectuses_many([('p', '497', '2021-01-15', '2021-01-15', 'C1', .01, None, None, None, None, None), ('q', '497', '2021-04-15', '2021-04-15', 'C1', .02, None, None, None, None, None)])
+            self.assertEqual(db_manager.get_series_quarter_facts()[['QUARTER_END_DATE', 'AVERAGE_NET_ASSETS']].values.tolist(), [['2021-03-31', 1.0], ['2021-06-30', 2.0]])
+
+            #Migrated database is not migrated again
+            with mock.patch.object(db_manager, 'migrate_normalize_dates') as migrate_normalize_dates:
+                db_manager.create_tables()
+                self.assertEqual(migrate_normalize_dates.call_count, 0)
+
+            db_manager.close()
+
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
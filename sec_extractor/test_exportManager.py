@@ -0,0 +1,111 @@
+import unittest
+from unittest import mock
+import sec_extractor
+import tempfile
+import os
+import io
+import pandas as pd
+
+
+def create_test_database(config):
+    '''Database with holdings and prospectuses of two series over four quarters'''
+
+    db_manager = sec_extractor.databaseManager(config)
+    db_manager.create_tables()
+
+    with db_manager.transaction():
+        db_manager.insert_dates_many([('2021-01-15', '2021-03-31'), ('2021-04-15', '2021-06-30'), ('2021-07-15', '2021-09-30'), ('2021-10-15', '2021-12-31')])
+        db_manager.insert_entities_many([('C1', 'S1', 1, 'FUND ONE'), ('C2', 'S2', 2, 'FUND TWO')])
+        db_manager.insert_prospectuses_many([('a1', '497', '2021-01-15', '2021-01-15', 'C1', .01, .005, .1, .5, None, None),
+                                             ('a2', '485BPOS', '2021-04-15', '2021-04-15', 'C2', .03, .02, None, None, None, .2),
+                                             ('a3', '497', '2021-10-15', '2021-10-15', 'C1', .01, .004, None, None, None, None),
+                                             ('a4', '497', '2021-10-15', '2021-10-15', 'C2', .03, .025, None, None, None, None)])
+        db_manager.insert_holdings_many([(f'h{i}', 'NPORT-P', period_end_date, period_end_date, series_id, net_assets) for i, (series_id, period_end_date, net_assets) in enumerate([
+                                            ('S1', '2021-01-15', 100), ('S1', '2021-04-15', 110), ('S1', '2021-07-15', 120), ('S1', '2021-10-15', 130),
+                                            ('S2', '2021-04-15', 200), ('S2', '2021-07-15', 210), ('S2', '2021-10-15', 220)])])
+        db_manager.insert_quarters_many([('2021-03-31',), ('2021-06-30',), ('2021-09-30',), ('2021-12-31',)])
+
+    return db_manager
+
+
+class testExportManager(unittest.TestCase):
+
+
+    def test_export_series_quarter_facts(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            config['network_drives']['database'] = os.path.join(folder, 'database')
+            db_manager = create_test_database(config)
+            export_manager = sec_extractor.exportManager(config, db_manager)
+
+            facts_df = db_manager.get_series_quarter_facts()
+            self.assertEqual(len(facts_df), 7)
+
+            #Every format gives the same rows as the in-memory dataset, whatever the chunk size
+            for output_file in ['output.csv', 'output.csv.gz']:
+
+                output_path = os.path.join(folder, output_file)
+                self.assertEqual(export_manager.export_series_quarter_facts(output_path, chunk_size=2), 7)
+                pd.testing.assert_frame_equal(pd.read_csv(output_path), facts_df, check_dtype=False)
+                self.assertFalse(os.path.exists(output_path + '.part'))
+
+            if sec_extractor.pa is not None:
+                output_path = os.path.join(folder, 'output.parquet')
+                self.assertEqual(export_manager.export_series_quarter_facts(output_path, chunk_size=3), 7)
+                pd.testing.assert_frame_equal(pd.read_parquet(output_path), facts_df, check_dtype=False)
+
+            #Filters
+            output_path = os.path.join(folder, 'filtered.csv')
+            filters = {'series_ids': ['S1'], 'start_date': '2021-06-30', 'end_date': '2021-09-30'}
+            self.assertEqual(export_manager.export_series_quarter_facts(output_path, **filters), 2)
+            pd.testing.assert_frame_equal(pd.read_csv(output_path), db_manager.get_series_quarter_facts(**filters), check_dtype=False)
+
+            self.assertEqual(export_manager.export_series_quarter_facts(output_path, ciks=['0000000002']), 3)
+            self.assertEqual(pd.read_csv(output_path)['SERIES_ID'].unique().tolist(), ['S2'])
+
+            #Failed export leaves previous output in place, and no .part file
+            with mock.patch.object(export_manager, 'write_csv', side_effect=IOError):
+                with self.assertRaises(IOError):
+                    export_manager.export_series_quarter_facts(output_path)
+
+            self.assertEqual(len(pd.read_csv(output_path)), 3)
+            self.assertFalse(os.path.exists(output_path + '.part'))
+
+            with self.assertRaises(ValueError):
+                export_manager.export_series_quarter_facts(os.path.join(folder, 'output.xlsx'))
+
+            db_manager.close()
+
+
+    def test_run_export(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            config['network_drives']['database'] = os.path.join(folder, 'database')
+            create_test_database(config).close()
+
+            output_path = os.path.join(folder, 'output.csv.gz')
+            args = sec_extractor.get_argument_parser().parse_args(['export', '--output', output_path, '--series', 'S1', 'S2', '--cik', '1', '--start', '2021-04-01', '--chunk-size', '1'])
+            self.assertEqual((args.command, args.series, args.cik, args.start, args.end, args.chunk_size), ('export', ['S1', 'S2'], [1], '2021-04-01', None, 1))
+
+            with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+                sec_extractor.run_export(config, args)
+
+            self.assertEqual(stdout.getvalue().strip(), f'Exported 3 rows to {output_path}')
+            self.assertEqual(pd.read_csv(output_path)['QUARTER_END_DATE'].tolist(), ['2021-06-30', '2021-09-30', '2021-12-31'])
+
+            #No command runs ingestion
+            self.assertIsNone(sec_extractor.get_argument_parser().parse_args([]).command)
+
+
+
+if __name__ == "__main__":
+
+    unittest.main()
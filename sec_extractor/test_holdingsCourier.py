@@ -4,9 +4,83 @@ from unittest import mock
 import functools
 import sec_extractor
 import datetime as dt
+import time
+import asyncio
+import threading
+import _thread
+import queue
+import concurrent.futures
+import tempfile
+import os
+import gzip
+import pandas as pd
+import requests
 from bs4 import BeautifulSoup
 
 
+def build_nport_submission(holdings_count):
+    '''Complete submission text file (.txt) of an NPORT-P report, as served by the SEC website'''
+
+    header = '''<SEC-DOCUMENT>0001752724-21-188123.txt : 20210830
+<SEC-HEADER>0001752724-21-188123.hdr.sgml : 20210830
+<ACCEPTANCE-DATETIME>20210830132505
+ACCESSION NUMBER:		0001752724-21-188123
+CONFORMED SUBMISSION TYPE:	NPORT-P
+PUBLIC DOCUMENT COUNT:		2
+CONFORMED PERIOD OF REPORT:	20210630
+FILED AS OF DATE:		20210830
+DATE AS OF CHANGE:		20210830
+EFFECTIVENESS DATE:		20210830
+
+FILER:
+
+	COMPANY DATA:
+		COMPANY CONFORMED NAME:			VANGUARD INDEX FUNDS
+		CENTRAL INDEX KEY:			0000036405
+<SERIES-AND-CLASSES-CONTRACTS-DATA>
+<EXISTING-SERIES-AND-CLASSES-CONTRACTS>
+<SERIES>
+<OWNER-CIK>0000036405
+<SERIES-ID>S000002845
+<SERIES-NAME>Vanguard Extended Market Index Fund
+<CLASS-CONTRACT>
+<CLASS-CONTRACT-ID>C000007798
+<CLASS-CONTRACT-NAME>Investor Shares
+</CLASS-CONTRACT>
+</SERIES>
+</EXISTING-SERIES-AND-CLASSES-CONTRACTS>
+</SERIES-AND-CLASSES-CONTRACTS-DATA>
+</SEC-HEADER>
+<DOCUMENT>
+<TYPE>NPORT-P
+<SEQUENCE>1
+<FILENAME>primary_doc.xml
+<TEXT>
+<XML>
+<?xml version="1.0" encoding="UTF-8"?>
+<edgarSubmission xmlns="http://www.sec.gov/edgar/nport" xmlns:com="http://www.sec.gov/edgar/common" xmlns:ncom="http://www.sec.gov/edgar/nportcommon" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+<headerData><submissionType>NPORT-P</submissionType></headerData>
+<formData>
+<genInfo><regName>VANGUARD INDEX FUNDS</regName><seriesId>S000002845</seriesId><repPdEnd>2021-12-31</repPdEnd><repPdDate>2021-06-30</repPdDate></genInfo>
+<fundInfo><totAssets>118000000000.00</totAssets><netAssets>117291871023.16</netAssets></fundInfo>
+<invstOrSecs>
+'''
+
+    holding = '''<invstOrSec><name>Holding</name><balance>100</balance><valUSD>1000.00</valUSD><netAssets>1.00</netAssets></invstOrSec>
+'''
+
+    footer = '''</invstOrSecs>
+</formData>
+</edgarSubmission>
+</XML>
+</TEXT>
+</DOCUMENT>
+</SEC-DOCUMENT>
+'''
+
+    return (header + (holding * holdings_count) + footer).encode()
+
+
 class testHoldingsCourier(unittest.TestCase):
 
 
@@ -46,6 +120,59 @@ class testHoldingsCourier(unittest.TestCase):
         self.assertCountEqual(holdingsCourier.filtered_report_urls, [[{'filing_type': 'N-Q', 'url': 'a'}, {'filing_type': 'N-Q', 'url': 'b'}, {'filing_type': 'N-Q/A', 'url': 'c'}], [{'filing_type': 'NPORT-P', 'url': 'd'}, {'filing_type': 'NPORT-P', 'url': 'e'}, {'filing_type': 'NPORT-P/A', 'url': 'f'}]])
 
 
+    def test_scan_index_file(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['ciks'] = ['0000036405', '102909']
+        config['filings'] = ['N-Q', 'N-Q/A', 'NPORT-P', 'NPORT-P/A']
+
+        lines = ['36405|VANGUARD INDEX FUNDS|NPORT-P|2021-08-30|edgar/data/36405/0001752724-21-188123.txt|edgar/data/36405/0001752724-21-188123-index.html',
+                 '36405|VANGUARD INDEX FUNDS|NPORT-EX|2021-08-30|edgar/data/36405/0001752724-21-188124.txt|edgar/data/36405/0001752724-21-188124-index.html',
+                 '364050|OTHER FUNDS|NPORT-P|2021-08-01|edgar/data/364050/0001752724-21-188125.txt|edgar/data/364050/0001752724-21-188125-index.html',
+                 '102909|VANGUARD WORLD FUND|N-Q/A|2021-07-15|edgar/data/102909/0000932471-21-000001.txt|edgar/data/102909/0000932471-21-000001-index.html',
+                 '102909|VANGUARD WORLD FUND|N-Q|2021-07-14|edgar/data/102909/0000932471-21-000002.txt|edgar/data/102909/0000932471-21-000002-index.html',
+                 '102909|VANGUARD WORLD FUND|10-K|2021-07-14|edgar/data/102909/0000932471-21-000003.txt|edgar/data/102909/0000932471-21-000003-index.html']
+
+        with tempfile.TemporaryDirectory() as index_folder:
+
+            index_file = os.path.join(index_folder, '2021-QTR3.tsv')
+            with open(index_file, 'w', encoding='utf-8', newline='\r\n') as file:
+                file.write('\n'.join(lines) + '\n')
+
+            empty_index_file = os.path.join(index_folder, '2021-QTR4.tsv')
+            open(empty_index_file, 'w').close()
+
+            holdings_courier = sec_extractor.holdingsCourier(config)
+
+            scanned_df = holdings_courier.scan_index_file(index_file)
+            self.assertEqual(scanned_df['txt_endpoint'].to_list(), ['edgar/data/36405/0001752724-21-188123.txt', 'edgar/data/102909/0000932471-21-000001.txt', 'edgar/data/102909/0000932471-21-000002.txt'])
+            self.assertEqual(len(holdings_courier.scan_index_file(empty_index_file)), 0)
+
+            #Compressed index file is searched a chunk at a time, with lines split across chunks
+            with open(index_file, 'rb') as file, gzip.open(index_file + '.gz', 'wb') as gzip_file:
+                gzip_file.write(file.read())
+
+            with gzip.open(index_file + '.gz', 'rb') as gzip_file:
+                with open(index_file, 'rb') as file:
+                    self.assertCountEqual(holdings_courier.find_index_rows_streamed(gzip_file, {b'36405', b'102909'}, [b'N-Q', b'NPORT-P'], chunk_size=50), holdings_courier.find_index_rows(file.read(), {b'36405', b'102909'}, [b'N-Q', b'NPORT-P']))
+
+            with mock.patch.object(holdings_courier, 'find_index_rows_streamed', wraps=functools.partial(holdings_courier.find_index_rows_streamed, chunk_size=100)):
+                pd.testing.assert_frame_equal(holdings_courier.scan_index_file(index_file + '.gz'), scanned_df)
+
+            #Both scan modes get the same report urls
+            report_urls = {}
+            for scan_mode in ['mmap', 'pandas']:
+                config['index']['scan_mode'] = scan_mode
+                holdings_courier = sec_extractor.holdingsCourier(config)
+                holdings_courier.filtered_index_files = [index_file]
+                holdings_courier.get_report_urls()
+                report_urls[scan_mode] = holdings_courier.filtered_report_urls
+
+            self.assertEqual(report_urls['mmap'], report_urls['pandas'])
+            self.assertEqual(report_urls['mmap'][0][0], {'filing_type': 'N-Q', 'url': 'https://www.sec.gov/Archives/edgar/data/102909/0000932471-21-000002.txt'})
+
+
     def test_translate_period_end_quarter_end(self):
 
         configuration_manager = sec_extractor.configurationManager()
@@ -75,7 +202,8 @@ class testHoldingsCourier(unittest.TestCase):
 
         #Transfer content to xml format
         xml = BeautifulSoup(response.content, 'lxml')
-        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', xml, 'N-Q')
+        header = holdings_courier.get_filing_header(response.content)
+        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', header, xml, 'N-Q')
 
         self.assertEqual(('2014-09-30', '2014-09-30'), dates_data)
         self.assertEqual(('a', 'N-Q', '2014-11-13', '2014-09-30', 'b', 'c'), holdings_data)
@@ -91,7 +219,8 @@ class testHoldingsCourier(unittest.TestCase):
 
         #Transfer content to xml format
         xml = BeautifulSoup(response.content, 'lxml')
-        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', xml, 'N-Q')
+        header = holdings_courier.get_filing_header(response.content)
+        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', header, xml, 'N-Q')
 
         self.assertEqual(('2010-11-30', '2010-12-31'), dates_data)
         self.assertEqual(('a', 'N-Q', '2011-01-31', '2010-11-30', 'b', 'c'), holdings_data)
@@ -107,7 +236,8 @@ class testHoldingsCourier(unittest.TestCase):
 
         #Transfer content to xml format
         xml = BeautifulSoup(response.content, 'lxml')
-        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', xml, 'N-Q')
+        header = holdings_courier.get_filing_header(response.content)
+        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', header, xml, 'N-Q')
 
         self.assertEqual(('2018-09-30', '2018-09-30'), dates_data)
         self.assertEqual(('a', 'N-Q', '2018-11-29', '2018-09-30', 'b', 'c'), holdings_data)
@@ -123,7 +253,8 @@ class testHoldingsCourier(unittest.TestCase):
 
         #Transfer content to xml format
         xml = BeautifulSoup(response.content, 'lxml')
-        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', xml, 'N-Q')
+        header = holdings_courier.get_filing_header(response.content)
+        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', header, xml, 'N-Q')
 
         self.assertEqual(('2012-03-31', '2012-03-31'), dates_data)
         self.assertEqual(('a', 'N-Q', '2012-05-25', '2012-03-31', 'b', 'c'), holdings_data)
@@ -139,7 +270,8 @@ class testHoldingsCourier(unittest.TestCase):
 
         #Transfer content to xml format
         xml = BeautifulSoup(response.content, 'lxml')
-        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', xml, 'N-Q')
+        header = holdings_courier.get_filing_header(response.content)
+        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', header, xml, 'N-Q')
 
         self.assertEqual(('2012-03-31', '2012-03-31'), dates_data)
         self.assertEqual(('a', 'N-Q', '2012-05-25', '2012-03-31', 'b', 'c'), holdings_data)
@@ -155,7 +287,8 @@ class testHoldingsCourier(unittest.TestCase):
 
         #Transfer content to xml format
         xml = BeautifulSoup(response.content, 'lxml')
-        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', xml, 'N-Q')
+        header = holdings_courier.get_filing_header(response.content)
+        dates_data, holdings_data = holdings_courier.get_nq_series_data('a', header, xml, 'N-Q')
 
         self.assertEqual(('2011-01-31', '2011-03-31'), dates_data)
         self.assertEqual(('a', 'N-Q', '2011-03-30', '2011-01-31', 'b', 'c'), holdings_data)
@@ -175,9 +308,8 @@ class testHoldingsCourier(unittest.TestCase):
         proxy_manager.set_http_session(config)
         response = proxy_manager.session.get(holdings_courier.filtered_report_urls[0][0]['url'], headers={'User-Agent': config['http_session']['user_agent']})
 
-        #Transfer content to xml format
-        xml = BeautifulSoup(response.content, 'lxml')
-        dates_data, holdings_data = holdings_courier.get_nport_data('a', xml, 'NPORT-P')
+        header = holdings_courier.get_filing_header(response.content)
+        dates_data, holdings_data = holdings_courier.get_nport_data('a', header, 'NPORT-P', response.content)
 
         self.assertEqual(('2021-06-30', '2021-06-30'), dates_data)
         self.assertEqual(('a', 'NPORT-P', '2021-08-30', '2021-06-30', 'b', 'c'), holdings_data)
@@ -190,14 +322,300 @@ class testHoldingsCourier(unittest.TestCase):
 
         response = proxy_manager.session.get(holdings_courier.filtered_report_urls[0][0]['url'], headers={'User-Agent': config['http_session']['user_agent']})
 
-        #Transfer content to xml format
-        xml = BeautifulSoup(response.content, 'lxml')
-        dates_data, holdings_data = holdings_courier.get_nport_data('a', xml, 'NPORT-P')
+        header = holdings_courier.get_filing_header(response.content)
+        dates_data, holdings_data = holdings_courier.get_nport_data('a', header, 'NPORT-P', response.content)
 
         self.assertEqual(('2019-10-31', '2019-12-31'), dates_data)
         self.assertEqual(('a', 'NPORT-P', '2019-12-30', '2019-10-31', 'b', 'c'), holdings_data)
 
 
+    def test_fetch_reports_async(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['holdings']['max_in_flight'] = 3
+        config['holdings']['primary_document_only'] = False
+
+        holdings_courier = sec_extractor.holdingsCourier(config)
+
+        #Earlier reports take longer to download, so downloads complete out of order
+        def get(url, **kwargs):
+            time.sleep(0.05 / (int(url) + 1))
+            return MagicMock(content=url.encode())
+
+        proxy_manager = sec_extractor.proxyManager()
+        proxy_manager.session = MagicMock()
+        proxy_manager.session.get = MagicMock(side_effect=get)
+        proxy_manager.rate_limiter = sec_extractor.rateLimiter(1000)
+
+        reports = [{'filing_type': 'N-Q', 'url': '0'}, {'filing_type': 'N-Q/A', 'url': '1'}, {'filing_type': 'NPORT-P', 'url': '2'}, {'filing_type': 'NPORT-P', 'url': '3'}, {'filing_type': 'NPORT-P/A', 'url': '4'}, {'filing_type': 'NPORT-P/A', 'url': '5'}, {'filing_type': 'NPORT-P/A', 'url': '6'}]
+
+        async def collect():
+            return [(report, content) async for report, content in holdings_courier.fetch_reports_async(proxy_manager, reports)]
+
+        output = asyncio.run(collect())
+
+        self.assertEqual(output, [(report, report['url'].encode()) for report in reports])
+
+
+    def test_get_nport_fields(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['series_to_index'] = {'S000002845': ['Extended or Completion Index', 'Vanguard']}
+
+        holdings_courier = sec_extractor.holdingsCourier(config)
+
+        content = build_nport_submission(50000)
+
+        self.assertEqual(holdings_courier.get_nport_fields(content), {'seriesId': 'S000002845', 'repPdEnd': '2021-12-31', 'repPdDate': '2021-06-30', 'netAssets': '117291871023.16'})
+
+        #Reading stops at the holdings, so a truncated submission gives the same fields
+        self.assertEqual(holdings_courier.get_nport_fields(content[:len(content)//2]), holdings_courier.get_nport_fields(content))
+
+        report_data = holdings_courier.get_report_data({'filing_type': 'NPORT-P', 'url': 'a'}, content)
+
+        self.assertEqual(report_data, [(('2021-06-30', '2021-06-30'), ('0001752724-21-188123', 'NPORT-P', '2021-08-30', '2021-06-30', 'S000002845', '117291871023.16'))])
+
+
+    def test_get_primary_document_content(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['holdings']['primary_document_only'] = True
+
+        holdings_courier = sec_extractor.holdingsCourier(config)
+
+        submission = build_nport_submission(10)
+        header = submission[:submission.find(b'</SEC-HEADER>') + len(b'</SEC-HEADER>')]
+        primary_doc = submission[submission.find(b'<?xml'):submission.find(b'</XML>')]
+
+        filing_index = b'''<html><body>
+        <table class="tableFile" summary="Document Format Files">
+        <tr><th>Seq</th><th>Description</th><th>Document</th><th>Type</th><th>Size</th></tr>
+        <tr><td>1</td><td></td><td><a href="/Archives/edgar/data/36405/000175272421188123/xslFormNPORT-P_X01/primary_doc.xml">primary_doc.html</a></td><td>NPORT-P</td><td></td></tr>
+        <tr><td>1</td><td></td><td><a href="/Archives/edgar/data/36405/000175272421188123/primary_doc.xml">primary_doc.xml</a></td><td>NPORT-P</td><td>9000000</td></tr>
+        <tr><td></td><td>Complete submission text file</td><td><a href="/Archives/edgar/data/36405/000175272421188123/0001752724-21-188123.txt">0001752724-21-188123.txt</a></td><td></td><td>9500000</td></tr>
+        </table></body></html>'''
+
+        responses = {'https://www.sec.gov/Archives/edgar/data/36405/0001752724-21-188123-index.html': filing_index,
+        'https://www.sec.gov/Archives/edgar/data/36405/000175272421188123/primary_doc.xml': primary_doc,
+        'https://www.sec.gov/Archives/edgar/data/36405/0001752724-21-188123.txt': submission}
+
+        proxy_manager = MagicMock()
+        proxy_manager.get = MagicMock(side_effect=lambda url, **kwargs: MagicMock(content=responses[url]))
+        proxy_manager.get_prefix = MagicMock(return_value=header)
+
+        report = {'filing_type': 'NPORT-P', 'url': 'https://www.sec.gov/Archives/edgar/data/36405/0001752724-21-188123.txt'}
+
+        content = holdings_courier.get_report_content(proxy_manager, report)
+
+        self.assertNotIn(report['url'], [call[0][0] for call in proxy_manager.get.call_args_list])
+        self.assertEqual(holdings_courier.get_report_data(report, content), holdings_courier.get_report_data(report, submission))
+
+        #Complete submission is downloaded when filing index is unavailable
+        del responses['https://www.sec.gov/Archives/edgar/data/36405/0001752724-21-188123-index.html']
+
+        self.assertEqual(holdings_courier.get_report_content(proxy_manager, report), submission)
+
+
+    def test_get_filing_header(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        holdings_courier = sec_extractor.holdingsCourier(config)
+
+        header = holdings_courier.get_filing_header(build_nport_submission(1))
+
+        self.assertEqual(header, sec_extractor.filingHeader(accession_number='0001752724-21-188123', form_type='NPORT-P', filed_date='2021-08-30', period_end_date='2021-06-30', cik='0000036405', series=(('S000002845', 'Vanguard Extended Market Index Fund'),)))
+
+        content = b'''<SEC-DOCUMENT>0000932471-11-000123.txt : 20110131
+<SEC-HEADER>0000932471-11-000123.hdr.sgml : 20110131
+<ACCEPTANCE-DATETIME>20110131101010
+ACCESSION NUMBER:\t\t0000932471-11-000123
+CONFORMED SUBMISSION TYPE:\tN-Q
+CONFORMED PERIOD OF REPORT:\t20101130
+FILED AS OF DATE:\t\t20110131
+\tCOMPANY DATA:
+\t\tCENTRAL INDEX KEY:\t\t\t0000036405
+<SERIES-AND-CLASSES-CONTRACTS-DATA>
+<EXISTING-SERIES-AND-CLASSES-CONTRACTS>
+<SERIES>
+<OWNER-CIK>0000036405
+<SERIES-ID>S000002839
+<SERIES-NAME>Vanguard Growth Index Fund
+<CLASS-CONTRACT>
+<CLASS-CONTRACT-ID>C000007776
+</CLASS-CONTRACT>
+</SERIES>
+<SERIES>
+<OWNER-CIK>0000036405
+<SERIES-ID>S000002840
+<SERIES-NAME>Vanguard Large-Cap Index Fund
+</SERIES>
+</EXISTING-SERIES-AND-CLASSES-CONTRACTS>
+</SERIES-AND-CLASSES-CONTRACTS-DATA>
+</SEC-HEADER>
+<DOCUMENT>
+<SERIES-ID>S999999999
+</DOCUMENT>'''
+
+        header = holdings_courier.get_filing_header(content)
+
+        self.assertEqual(header.accession_number, '0000932471-11-000123')
+        self.assertEqual(header.period_end_date, '2010-11-30')
+        self.assertEqual(holdings_courier.get_series_in_report(header), ['S000002839', 'S000002840'])
+        self.assertEqual(holdings_courier.get_series_name_from_id('S000002840', header), 'Vanguard Large-Cap Index Fund')
+
+
+    def test_get_nq_net_assets_all(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        holdings_courier = sec_extractor.holdingsCourier(config)
+
+        header = sec_extractor.filingHeader(accession_number='a', form_type='N-Q', filed_date='2011-01-31', period_end_date='2010-11-30', cik='36405', series=(('S000002839', 'Vanguard Growth Index Fund'), ('S000002840', 'Vanguard Value Index Fund'), ('S000002841', 'Vanguard Small-Cap Index Fund')))
+
+        xml = BeautifulSoup('''<sec-header>Vanguard Growth Index Fund Vanguard Value Index Fund Vanguard Small-Cap Index Fund</sec-header>
+        <html><body>
+        <p>Vanguard Growth Index Fund</p>
+        <table><tr><td>Percentage of Net Assets</td><td>1,000</td></tr>
+        <tr><td>Net Assets</td><td>100.0%</td><td>$</td><td>12,345,678</td></tr></table>
+        <p>Vanguard Value Index Fund</p>
+        <table><tr><td>Total Net Assets</td><td>9,876</td></tr></table>
+        </body></html>''', 'lxml')
+
+        located_net_assets = holdings_courier.get_nq_net_assets_all(['S000002839', 'S000002840', 'S000002841'], header, xml)
+
+        self.assertEqual(located_net_assets, {'S000002839': '12345678', 'S000002840': '9876', 'S000002841': None})
+        self.assertEqual(holdings_courier.get_nq_net_assets('S000002840', header, xml), '9876')
+
+
+    def test_obtain_insert_holdings_data_pipeline(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['holdings']['fetch_mode'] = 'pipeline'
+        config['holdings']['primary_document_only'] = False
+        config['holdings']['parser_processes'] = 2
+        config['holdings']['fetch_queue_size'] = 2
+        config['holdings']['parse_queue_size'] = 2
+        config['series_to_index'] = {'S000002845': ['Extended or Completion Index', 'Vanguard']}
+
+        holdings_courier = sec_extractor.holdingsCourier(config)
+        holdings_courier.filtered_report_urls = [[{'filing_type': 'NPORT-P', 'url': str(i)} for i in range(5)], [{'filing_type': 'NPORT-P/A', 'url': str(i)} for i in range(5, 10)]]
+
+        #Each report has its own accession number, so insert order can be checked
+        def get(url, **kwargs):
+            return MagicMock(content=build_nport_submission(100).replace(b'0001752724-21-188123', url.zfill(20).encode()))
+
+        proxy_manager = sec_extractor.proxyManager()
+        proxy_manager.session = MagicMock()
+        proxy_manager.session.get = MagicMock(side_effect=get)
+
+        db_manager = MagicMock()
+        holdings_courier.obtain_insert_holdings_data(db_manager, proxy_manager)
+
+        inserted_adsh = [call[0][0][0][0] for call in db_manager.insert_holdings_many.call_args_list]
+
+        self.assertEqual(inserted_adsh, [str(i).zfill(20) for i in range(10)])
+
+
+    def test_obtain_insert_holdings_data_pipeline_interrupt(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['holdings']['fetch_mode'] = 'pipeline'
+        config['holdings']['parser_processes'] = 1
+
+        holdings_courier = sec_extractor.holdingsCourier(config)
+        holdings_courier.filtered_report_urls = [[{'filing_type': 'NPORT-P', 'url': str(i)} for i in range(3)]]
+
+        #Downloads hang, as if in their read timeout and retries
+        release = threading.Event()
+        proxy_manager = sec_extractor.proxyManager()
+        proxy_manager.session = MagicMock()
+        proxy_manager.session.get = MagicMock(side_effect=lambda url, **kwargs: release.wait())
+
+        timer = threading.Timer(0.5, _thread.interrupt_main)
+
+        try:
+            with mock.patch.object(queue.Queue, 'get', autospec=True, side_effect=queue.Queue.get) as get:
+                timer.start()
+                with self.assertRaises(KeyboardInterrupt):
+                    holdings_courier.obtain_insert_holdings_data(MagicMock(), proxy_manager)
+        finally:
+            timer.cancel()
+            release.set()
+
+        #Queues are only waited on in short timeouts, which Ctrl-C can interrupt (untimed waits cannot be interrupted on Windows)
+        self.assertTrue(all(('timeout' in call[1]) or (call[1].get('block', True) is False) or (False in call[0][1:]) for call in get.call_args_list))
+
+        #Futures are waited on the same way
+        future = MagicMock()
+        future.result = MagicMock(side_effect=[concurrent.futures.TimeoutError(), concurrent.futures.TimeoutError(), 'outcome'])
+        self.assertEqual(holdings_courier.get_future_result(future), 'outcome')
+        self.assertEqual(future.result.call_args_list, [mock.call(timeout=0.1)] * 3)
+
+
+    def test_ingestion_ledger(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['holdings']['fetch_mode'] = 'sequential'
+        config['holdings']['primary_document_only'] = False
+        config['holdings']['max_attempts'] = 2
+        config['series_to_index'] = {'S000002845': ['Extended or Completion Index', 'Vanguard']}
+
+        base_url = 'https://www.sec.gov/Archives/edgar/data/36405/'
+        index_reports = [[{'filing_type': 'NPORT-P', 'url': base_url + '0000000001-21-000001.txt'}, {'filing_type': 'NPORT-P', 'url': base_url + '0000000001-21-000002.txt'}],
+                         [{'filing_type': 'NPORT-P', 'url': base_url + '0000000001-21-000003.txt'}]]
+
+        #Second report cannot be downloaded
+        def get(url, **kwargs):
+            if url.endswith('000002.txt'):
+                raise requests.exceptions.ConnectionError
+            return MagicMock(content=build_nport_submission(10))
+
+        proxy_manager = sec_extractor.proxyManager()
+        proxy_manager.session = MagicMock()
+        proxy_manager.session.get = MagicMock(side_effect=get)
+
+        with tempfile.TemporaryDirectory() as database_folder:
+
+            config['network_drives']['database'] = os.path.join(database_folder, 'database')
+
+            db_manager = sec_extractor.databaseManager(config)
+            db_manager.create_tables()
+
+            def run():
+                holdings_courier = sec_extractor.holdingsCourier(config)
+                holdings_courier.filtered_index_files = ['2021-QTR3.tsv', '2021-QTR4.tsv']
+                holdings_courier.filtered_report_urls = [[dict(report) for report in index] for index in index_reports]
+                holdings_courier.filter_ingested_reports(db_manager)
+                holdings_courier.obtain_insert_holdings_data(db_manager, proxy_manager)
+                return [report['url'] for index in holdings_courier.filtered_report_urls for report in index]
+
+            self.assertEqual(len(run()), 3)
+
+            ledger = db_manager.query('SELECT ADSH, STATUS, PARSE_OUTCOME, ATTEMPTS, CONTENT_HASH FROM ingestion_ledger ORDER BY ADSH')
+            self.assertEqual(ledger['STATUS'].to_list(), ['success', 'failed', 'success'])
+            self.assertEqual(ledger['PARSE_OUTCOME'].to_list(), ['1 series inserted', 'download failed', '1 series inserted'])
+            self.assertEqual(len(ledger['CONTENT_HASH'][0]), 64)
+
+            #Ingestion resumes from quarter of failed report, and only retries failed report
+            self.assertEqual(db_manager.get_ledger_resume_date(2), dt.datetime(2021, 9, 30))
+            self.assertEqual(run(), [base_url + '0000000001-21-000002.txt'])
+
+            #Report that has failed max_attempts times is no longer retried
+            self.assertEqual(run(), [])
+            self.assertEqual(db_manager.get_ledger_resume_date(2), dt.datetime(2021, 12, 31))
+
+            db_manager.close()
+
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,227 @@
+import unittest
+from unittest.mock import MagicMock
+from unittest import mock
+import sec_extractor
+import tempfile
+import os
+import io
+import zipfile
+import gzip
+
+
+def write_index_file(index_file, lines):
+    '''Index file as written by indexCourier.download_index_file'''
+
+    with open(index_file, 'w', encoding='utf-8') as file:
+        file.write(''.join([line + '|' + line.split('|')[-1].replace('.txt', '-index.html') + '\n' for line in lines]))
+
+
+def build_master_zip(lines):
+    '''master.zip as served by the SEC website'''
+
+    master_idx = '\n'.join(['Description:           Master Index of EDGAR Dissemination Feed', 'Last Data Received:    September 30, 2021', 'Comments:              webmaster@sec.gov', 'Anonymous FTP:         ftp://ftp.sec.gov/edgar/', 'Cloud HTTP:            https://www.sec.gov/Archives/', '', '', '', '', 'CIK|Company Name|Form Type|Date Filed|Filename', '--------------------------------------------------------------------------------'] + lines) + '\n'
+
+    zip_content = io.BytesIO()
+    with zipfile.ZipFile(zip_content, 'w') as zip_file:
+        zip_file.writestr('master.idx', master_idx)
+
+    return zip_content.getvalue()
+
+
+class testIndexCourier(unittest.TestCase):
+
+
+    def test_obtain_index_files(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        lines = ['36405|VANGUARD INDEX FUNDS|NPORT-P|2021-08-30|edgar/data/36405/0001752724-21-188123.txt',
+                 '102909|VANGUARD WORLD FUND|N-Q|2021-07-14|edgar/data/102909/0000932471-21-000002.txt']
+
+        responses = {'2021/QTR3': MagicMock(status_code=200, content=build_master_zip(lines), headers={'ETag': '"q3"'}),
+                     '2021/QTR2': MagicMock(status_code=200, content=build_master_zip(lines[:1]), headers={'Last-Modified': 'Thu, 01 Jul 2021 00:00:00 GMT'})}
+
+        proxy_manager = MagicMock()
+        proxy_manager.get = MagicMock(side_effect=lambda url, **kwargs: responses[url.split('full-index/')[1].rsplit('/', 1)[0]])
+
+        with tempfile.TemporaryDirectory() as index_folder:
+
+            config['network_drives']['index_files'] = os.path.join(index_folder, 'index')
+            index_courier = sec_extractor.indexCourier(config)
+            index_courier.get_index_quarters = MagicMock(return_value=[(2021, 3), (2021, 2)])
+
+            q3_file = index_courier.get_index_filepath(2021, 3)
+            q2_file = index_courier.get_index_filepath(2021, 2)
+
+            index_courier.obtain_index_files(proxy_manager)
+
+            #Index files are kept compressed
+            with gzip.open(q3_file, 'rt', encoding='utf-8') as index_file:
+                self.assertEqual(index_file.read().splitlines()[0], lines[0] + '|edgar/data/36405/0001752724-21-188123-index.html')
+
+            manifest = index_courier.read_manifest()
+            self.assertEqual((manifest['2021-QTR3']['rows'], manifest['2021-QTR3']['etag']), (2, '"q3"'))
+            self.assertEqual(manifest['2021-QTR2']['last_modified'], 'Thu, 01 Jul 2021 00:00:00 GMT')
+
+            #Complete index files of closed quarters are not downloaded again
+            proxy_manager.get.reset_mock()
+            index_courier.obtain_index_files(proxy_manager)
+            self.assertEqual(proxy_manager.get.call_count, 0)
+
+            #Truncated index file is downloaded again
+            with open(q2_file, 'r+b') as index_file:
+                index_file.truncate(os.path.getsize(q2_file) - 10)
+
+            index_courier.obtain_index_files(proxy_manager)
+            self.assertEqual(proxy_manager.get.call_count, 1)
+            self.assertTrue(index_courier.verify_index_file(q2_file, index_courier.read_manifest()['2021-QTR2']))
+
+            #Index file downloaded before its quarter ended is checked with a conditional request
+            manifest = index_courier.read_manifest()
+            manifest['2021-QTR3']['downloaded_at'] = '2021-09-15 12:00:00'
+            index_courier.write_manifest(manifest)
+            q3_mtime = os.path.getmtime(q3_file)
+
+            proxy_manager.get.reset_mock()
+            responses['2021/QTR3'] = MagicMock(status_code=304, content=b'', headers={})
+            index_courier.obtain_index_files(proxy_manager)
+
+            self.assertEqual(proxy_manager.get.call_args[1]['headers'], {'If-None-Match': '"q3"'})
+            self.assertEqual(os.path.getmtime(q3_file), q3_mtime)
+            self.assertTrue(index_courier.is_index_final(2021, 3, index_courier.read_manifest()['2021-QTR3']))
+
+            #Truncated download is never saved
+            os.remove(q3_file)
+            responses['2021/QTR3'] = MagicMock(status_code=200, content=build_master_zip(lines[:1] + [lines[1][:30]]), headers={})
+            index_courier.obtain_index_files(proxy_manager)
+            self.assertFalse(os.path.exists(q3_file))
+
+
+    def test_verify_index_rows(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['ciks'] = ['36405']
+        config['filings'] = ['NPORT-P']
+
+        lines = ['36405|VANGUARD INDEX FUNDS|NPORT-P|2021-08-30|edgar/data/36405/0001752724-21-188123.txt',
+                 '36405|VANGUARD INDEX FUNDS|NPORT-P|2021-05-30|edgar/data/36405/0001752724-21-100000.txt']
+
+        responses = {'2021/QTR3': MagicMock(status_code=200, content=build_master_zip(lines[:1]), headers={}),
+                     '2021/QTR2': MagicMock(status_code=200, content=build_master_zip(lines[1:]), headers={})}
+
+        proxy_manager = MagicMock()
+        proxy_manager.get = MagicMock(side_effect=lambda url, **kwargs: responses[url.split('full-index/')[1].rsplit('/', 1)[0]])
+
+        with tempfile.TemporaryDirectory() as index_folder:
+
+            config['network_drives']['index_files'] = os.path.join(index_folder, 'index')
+            index_courier = sec_extractor.indexCourier(config)
+            index_courier.get_index_quarters = MagicMock(return_value=[(2021, 3), (2021, 2)])
+            index_courier.get_index_files = MagicMock(return_value=[index_courier.get_index_filepath(2021, 2), index_courier.get_index_filepath(2021, 3)])
+            index_courier.obtain_index_files(proxy_manager)
+
+            #Rows of index file differ from rows when it was downloaded
+            manifest = index_courier.read_manifest()
+            manifest['2021-QTR3']['rows'] = 2
+            index_courier.write_manifest(manifest)
+
+            index_courier.update_filing_catalog()
+
+            self.assertNotIn('2021-QTR3', index_courier.read_manifest())
+            self.assertEqual(index_courier.query_filings(['36405'], ['NPORT-P'], '2021-01-01', '2021-12-31')['txt_endpoint'].to_list(), ['edgar/data/36405/0001752724-21-100000.txt'])
+
+            #Index file is downloaded again, and then loaded
+            proxy_manager.get.reset_mock()
+            index_courier.obtain_index_files(proxy_manager)
+            self.assertEqual(proxy_manager.get.call_count, 1)
+
+            index_courier.update_filing_catalog()
+            self.assertEqual(len(index_courier.query_filings(['36405'], ['NPORT-P'], '2021-01-01', '2021-12-31')), 2)
+
+
+    def test_migrate_index_file(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        with tempfile.TemporaryDirectory() as index_folder:
+
+            config['network_drives']['index_files'] = os.path.join(index_folder, 'index')
+            index_courier = sec_extractor.indexCourier(config)
+            index_courier.get_index_quarters = MagicMock(return_value=[(2021, 2)])
+
+            legacy_file = config['network_drives']['index_files'] + '\\2021-QTR2.tsv'
+            write_index_file(legacy_file, ['36405|VANGUARD INDEX FUNDS|NPORT-P|2021-05-30|edgar/data/36405/0001752724-21-100000.txt'])
+
+            proxy_manager = MagicMock()
+            index_courier.obtain_index_files(proxy_manager)
+
+            self.assertEqual(proxy_manager.get.call_count, 0)
+            self.assertFalse(os.path.exists(legacy_file))
+            self.assertEqual(index_courier.read_manifest()['2021-QTR2']['rows'], 1)
+
+
+    def test_filing_catalog(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['ciks'] = ['0000036405', '102909']
+        config['filings'] = ['N-Q', 'NPORT-P']
+
+        q3_lines = ['36405|VANGUARD INDEX FUNDS|NPORT-P|2021-08-30|edgar/data/36405/0001752724-21-188123.txt',
+                    '36405|VANGUARD INDEX FUNDS|NPORT-EX|2021-08-30|edgar/data/36405/0001752724-21-188124.txt',
+                    '102909|VANGUARD WORLD FUND|N-Q|2021-07-14|edgar/data/102909/0000932471-21-000002.txt',
+                    '1000|OTHER FUND|N-Q|2021-07-14|edgar/data/1000/0000932471-21-000003.txt']
+        q4_lines = ['102909|VANGUARD WORLD FUND|NPORT-P|2021-11-29|edgar/data/102909/0000932471-21-000004.txt']
+
+        with tempfile.TemporaryDirectory() as index_folder:
+
+            config['network_drives']['index_files'] = os.path.join(index_folder, 'index')
+            index_files = [os.path.join(index_folder, '2021-QTR3.tsv'), os.path.join(index_folder, '2021-QTR4.tsv')]
+            write_index_file(index_files[0], q3_lines)
+            write_index_file(index_files[1], q4_lines)
+
+            index_courier = sec_extractor.indexCourier(config)
+            index_courier.get_index_files = MagicMock(return_value=index_files)
+            index_courier.update_filing_catalog()
+
+            filings_df = index_courier.query_filings(config['ciks'], config['filings'], '2021-07-01', '2021-12-31')
+            self.assertEqual(filings_df['txt_endpoint'].to_list(), ['edgar/data/36405/0001752724-21-188123.txt', 'edgar/data/102909/0000932471-21-000002.txt', 'edgar/data/102909/0000932471-21-000004.txt'])
+            self.assertEqual(filings_df['cik'].to_list(), ['36405', '102909', '102909'])
+
+            #Catalog and index files give the same report urls
+            report_urls = {}
+            for scan_mode in ['catalog', 'mmap']:
+                config['index']['scan_mode'] = scan_mode
+                holdings_courier = sec_extractor.holdingsCourier(config)
+                holdings_courier.filtered_index_files = index_files
+                holdings_courier.get_report_urls(index_courier)
+                report_urls[scan_mode] = holdings_courier.filtered_report_urls
+
+            self.assertEqual(report_urls['catalog'], report_urls['mmap'])
+
+            #Only index files that changed are loaded again
+            write_index_file(index_files[1], q4_lines + ['36405|VANGUARD INDEX FUNDS|NPORT-P|2021-11-30|edgar/data/36405/0001752724-21-300000.txt'])
+
+            with mock.patch.object(index_courier, 'load_index_file', wraps=index_courier.load_index_file) as load_index_file:
+                index_courier.update_filing_catalog()
+                self.assertEqual([call[0][1] for call in load_index_file.call_args_list], [index_files[1]])
+
+            filings_df = index_courier.query_filings(['36405'], ['NPORT-P'], '2021-10-01', '2021-12-31')
+            self.assertEqual(filings_df['txt_endpoint'].to_list(), ['edgar/data/36405/0001752724-21-300000.txt'])
+
+            #Compressed index file with no rows (never empty on disk)
+            empty_index_file = os.path.join(index_folder, '2022-QTR1.tsv.gz')
+            gzip.open(empty_index_file, 'wb').close()
+
+            index_courier.get_index_files = MagicMock(return_value=index_files + [empty_index_file])
+            index_courier.update_filing_catalog()
+            self.assertEqual(len(index_courier.query_filings(config['ciks'], config['filings'], '2022-01-01', '2022-03-31')), 0)
+
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -10,6 +10,20 @@ import shutil
 from pathlib import Path
 import pandas as pd
 import numpy as np
+import tempfile
+import zipfile
+import requests
+
+
+def write_prospectus_zip(zip_path, expense_ratio, effdate):
+    '''Quarter's prospectus dataset (zip of num.tsv and sub.tsv), as served by the SEC website'''
+
+    num = ['adsh\ttag\tseries\tclass\tvalue', f'a{expense_ratio}\tExpensesOverAssets\tS1\tC1\t{expense_ratio}']
+    sub = ['adsh\tcik\tname\teffdate\tfiled\tform', f'a{expense_ratio}\t1\tFUND ONE\t{effdate}\t{effdate}\t497']
+
+    with zipfile.ZipFile(zip_path, 'w') as zip_file:
+        zip_file.writestr('num.tsv', '\n'.join(num) + '\n')
+        zip_file.writestr('sub.tsv', '\n'.join(sub) + '\n')
 
 
 class testProspectusCourier(unittest.TestCase):
@@ -62,6 +76,7 @@ class testProspectusCourier(unittest.TestCase):
         config['network_drives']['zip_prospectuses'] = 'test_assets\\test_zip_prospectuses'
         #db_manager.get_most_recent_prospectus_date = MagicMock(return_value=dt.datetime(today.year,1,1))
         config['network_drives']['prospectuses'] = 'test_assets\\test_prospectuses'
+        config['prospectus']['extract_to_disk'] = True
         #config['prospectus']['start_year'] = today.year
 
         prospectus_courier = sec_extractor.prospectusCourier(config, db_manager)
@@ -107,6 +122,260 @@ class testProspectusCourier(unittest.TestCase):
         pd.testing.assert_frame_equal(pivot_df, compare_df)
 
 
+    def test_read_num_sub(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['series_to_index'] = {'S1': None, 'S2': None}
+        config['prospectus']['chunk_size'] = 2
+        config['prospectus']['parquet_cache'] = False
+
+        num = ['adsh\ttag\tseries\tclass\tvalue\tddate',
+               'a1\tExpensesOverAssets\tS1\tC1\t0.0004\t20210301',
+               'a1\tAssets\tS1\tC1\t10\t20210301',
+               'a2\tExpensesOverAssets\tS3\tC3\t0.01\t20210301',
+               'a3\tAverageAnnualReturnYear01\tS2\t\t0.1\t20210301',
+               'a4\tNetExpensesOverAssets\tS2\tC2\t0.0003\t20210301']
+        sub = ['adsh\tcik\tname\teffdate\tfiled\tform\tprevrpt',
+               'a1\t1\tFUND ONE\t2021-03-16\t2021-03-16\t497\t0',
+               'a2\t2\tFUND TWO\t2021-03-01\t2021-02-26\t485BPOS\t0',
+               'a4\t4\tFUND FOUR\t\t2021-02-26\t485BPOS\t0']
+
+        with tempfile.TemporaryDirectory() as prospectus_folder:
+
+            prospectus_quarter = os.path.join(prospectus_folder, '2021-03-31')
+            for file_name, lines in [('num.tsv', num), ('sub.tsv', sub)]:
+                with open(prospectus_quarter + r'\\' + file_name, 'w') as file:
+                    file.write('\n'.join(lines) + '\n')
+
+            db_manager = sec_extractor.databaseManager(config)
+            prospectus_courier = sec_extractor.prospectusCourier(config, db_manager)
+
+            #Only desired series and tags, with a class, are kept from each chunk
+            num_df = prospectus_courier.read_num(prospectus_quarter)
+            self.assertEqual(num_df['adsh'].to_list(), ['a1', 'a4'])
+
+            #Only submissions with an effdate, of remaining num rows, are kept
+            sub_df = prospectus_courier.read_sub(prospectus_quarter, set(num_df['adsh']))
+            self.assertEqual(sub_df['adsh'].to_list(), ['a1'])
+            self.assertEqual(sub_df['effdate'][0], dt.datetime(2021, 3, 16))
+
+            df = prospectus_courier.join_quarter_prospectuses_files(prospectus_quarter)
+            self.assertEqual(df[['adsh', 'tag', 'value', 'name']].values.tolist(), [['a1', 'ExpensesOverAssets', 0.0004, 'FUND ONE']])
+
+            #Files are read from zip the same as from extracted files
+            zip_path = os.path.join(prospectus_folder, '2021-03-31.zip')
+            with zipfile.ZipFile(zip_path, 'w') as zip_file:
+                zip_file.writestr('num.tsv', '\n'.join(num) + '\n')
+                zip_file.writestr('sub.tsv', '\n'.join(sub) + '\n')
+
+            config['prospectus']['extract_to_disk'] = False
+            prospectus_courier.filtered_zip_files = [zip_path]
+            prospectus_courier.get_quarter_prospectuses()
+            self.assertEqual(prospectus_courier.prospectus_paths, [zip_path])
+
+            pd.testing.assert_frame_equal(prospectus_courier.join_quarter_prospectuses_files(zip_path), df)
+
+
+    @unittest.skipIf(sec_extractor.pa is None, 'pyarrow is not installed')
+    def test_prospectus_cache(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['series_to_index'] = {'S1': None}
+        config['prospectus']['chunk_size'] = 2
+
+        num = ['adsh\ttag\tseries\tclass\tvalue',
+               'a1\tExpensesOverAssets\tS1\tC1\t0.0004',
+               'a1\tAssets\tS1\tC1\t10',
+               'a2\tExpensesOverAssets\tS3\tC3\t0.01',
+               'a3\tAverageAnnualReturnYear01\tS2\t\t0.1',
+               'a4\tNetExpensesOverAssets\tS2\tC2\t0.0003']
+        sub = ['adsh\tcik\tname\teffdate\tfiled\tform',
+               'a1\t1\tFUND ONE\t2021-03-16\t2021-03-16\t497',
+               'a2\t2\tFUND TWO\t2021-03-01\t2021-02-26\t485BPOS',
+               'a4\t4\tFUND FOUR\t\t2021-02-26\t485BPOS']
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            config['network_drives']['prospectus_cache'] = os.path.join(folder, 'cache')
+            zip_path = os.path.join(folder, '2021-03-31.zip')
+            with zipfile.ZipFile(zip_path, 'w') as zip_file:
+                zip_file.writestr('num.tsv', '\n'.join(num) + '\n')
+                zip_file.writestr('sub.tsv', '\n'.join(sub) + '\n')
+
+            prospectus_courier = sec_extractor.prospectusCourier(config, None)
+
+            def join_files(parquet_cache):
+                config['prospectus']['parquet_cache'] = parquet_cache
+                return prospectus_courier.join_quarter_prospectuses_files(zip_path)
+
+            #Cache gives the same data as tsv files, for any series
+            pd.testing.assert_frame_equal(join_files(True), join_files(False))
+            self.assertTrue(os.path.exists(prospectus_courier.get_cache_filepath(zip_path, 'num.tsv')))
+
+            config['series_to_index'] = {'S1': None, 'S3': None}
+            with mock.patch.object(prospectus_courier, 'write_prospectus_cache', wraps=prospectus_courier.write_prospectus_cache) as write_prospectus_cache:
+                df = join_files(True)
+                self.assertEqual(write_prospectus_cache.call_count, 0)
+
+            pd.testing.assert_frame_equal(df, join_files(False))
+            self.assertEqual(sorted(df['adsh'].to_list()), ['a1', 'a2'])
+
+            #Whole quarter is kept in cache
+            cached_df = sec_extractor.pq.read_table(prospectus_courier.get_cache_filepath(zip_path, 'num.tsv')).to_pandas()
+            self.assertEqual(len(cached_df), 5)
+
+            #Cache is written again if zip file changes, or cache version changes
+            with mock.patch.object(prospectus_courier, 'write_prospectus_cache', wraps=prospectus_courier.write_prospectus_cache) as write_prospectus_cache:
+                os.utime(zip_path, (0, 0))
+                join_files(True)
+                self.assertEqual(write_prospectus_cache.call_count, 2)
+
+                prospectus_courier.cache_version = '2'
+                join_files(True)
+                self.assertEqual(write_prospectus_cache.call_count, 4)
+
+
+    def test_obtain_insert_prospectus_data_workers(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['series_to_index'] = {'S1': None}
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            config['network_drives']['prospectus_cache'] = os.path.join(folder, 'cache')
+
+            #Second and third quarters have the same effective date, so the third must be inserted last
+            zip_paths = [os.path.join(folder, date + '.zip') for date in ['2021-03-31', '2021-06-30', '2021-09-30']]
+            for zip_path, expense_ratio, effdate in zip(zip_paths, [0.001, 0.002, 0.003], ['2021-03-01', '2021-06-01', '2021-06-01']):
+                write_prospectus_zip(zip_path, expense_ratio, effdate)
+
+            tables = {}
+            for workers in [1, 2]:
+
+                config['prospectus']['workers'] = workers
+                config['network_drives']['database'] = os.path.join(folder, f'database{workers}')
+
+                db_manager = sec_extractor.databaseManager(config)
+                db_manager.create_tables()
+
+                prospectus_courier = sec_extractor.prospectusCourier(config, db_manager)
+                prospectus_courier.prospectus_paths = zip_paths
+                prospectus_courier.obtain_insert_prospectus_data()
+
+                tables[workers] = [db_manager.query(f'SELECT * FROM {table} ORDER BY 1') for table in ['prospectus', 'dates', 'quarters']]
+                db_manager.close()
+
+            self.assertEqual(tables[2][0]['EXPENSE_RATIO'].to_list(), [0.001, 0.003])
+            for single_df, pool_df in zip(tables[1], tables[2]):
+                pd.testing.assert_frame_equal(single_df, pool_df)
+
+
+    def test_download_zip_files(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['prospectus']['refresh_quarters'] = 0
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            config['network_drives']['zip_prospectuses'] = os.path.join(folder, 'zip')
+            zip_folder = config['network_drives']['zip_prospectuses']
+
+            prospectus_courier = sec_extractor.prospectusCourier(config, None)
+            prospectus_courier.quarter_end_dates = ['2021-03-31', '2021-06-30', '2021-09-30']
+            prospectus_courier.url_file_list = ['2021q1', '2021q2', '2021q3']
+
+            #Complete zip file, and a partial file left by a previous version
+            write_prospectus_zip(zip_folder + '\\2021-03-31.zip', 0.001, '2021-03-01')
+            with open(zip_folder + '\\2021-06-30.zip', 'wb') as partial_file:
+                partial_file.write(b'PK')
+
+            def download_file(url, file_path, verify=None):
+                if url == '2021q3':
+                    raise requests.exceptions.HTTPError('404 Client Error')
+                write_prospectus_zip(file_path, 0.002, '2021-06-01')
+                self.assertTrue(verify(file_path))
+                return 100
+
+            proxy_manager = MagicMock()
+            proxy_manager.download_file = MagicMock(side_effect=download_file)
+
+            prospectus_courier.download_zip_files(proxy_manager)
+
+            self.assertCountEqual([call[0][0] for call in proxy_manager.download_file.call_args_list], ['2021q2', '2021q3'])
+            self.assertTrue(prospectus_courier.verify_zip_file(zip_folder + '\\2021-06-30.zip'))
+
+            #Recent quarters that have not been republished (304) are not downloaded again
+            config['prospectus']['refresh_quarters'] = 3
+            proxy_manager.download_file.reset_mock()
+            proxy_manager.get.return_value.__enter__.return_value.status_code = 304
+
+            prospectus_courier.download_zip_files(proxy_manager)
+
+            self.assertEqual([call[0][0] for call in proxy_manager.download_file.call_args_list], ['2021q3'])
+            self.assertIn('If-Modified-Since', proxy_manager.get.call_args[1]['headers'])
+
+            #Republished zip file is kept if its new download fails
+            proxy_manager.get.return_value.__enter__.return_value.status_code = 200
+            proxy_manager.download_file = MagicMock(side_effect=IOError('Download failed verification'))
+
+            prospectus_courier.download_zip_files(proxy_manager)
+
+            self.assertEqual(proxy_manager.download_file.call_count, 3)
+            self.assertTrue(prospectus_courier.verify_zip_file(zip_folder + '\\2021-03-31.zip'))
+            self.assertTrue(prospectus_courier.verify_zip_file(zip_folder + '\\2021-06-30.zip'))
+
+
+    def test_filter_zip_files(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['series_to_index'] = {'S1': None}
+        config['prospectus']['workers'] = 1
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            config['network_drives']['zip_prospectuses'] = os.path.join(folder, 'zip')
+            config['network_drives']['database'] = os.path.join(folder, 'database')
+            config['network_drives']['prospectus_cache'] = os.path.join(folder, 'cache')
+            zip_folder = config['network_drives']['zip_prospectuses']
+
+            zip_paths = [zip_folder + '\\2021-03-31.zip', zip_folder + '\\2021-06-30.zip']
+            write_prospectus_zip(zip_paths[0], 0.001, '2021-03-01')
+            write_prospectus_zip(zip_paths[1], 0.002, '2021-06-01')
+
+            db_manager = sec_extractor.databaseManager(config)
+            db_manager.create_tables()
+
+            def ingest():
+                prospectus_courier = sec_extractor.prospectusCourier(config, db_manager)
+                prospectus_courier.filter_zip_files()
+                prospectus_courier.get_quarter_prospectuses()
+                prospectus_courier.obtain_insert_prospectus_data()
+                return prospectus_courier.filtered_zip_files
+
+            self.assertEqual(ingest(), zip_paths)
+
+            manifest = db_manager.query('SELECT QUARTER_END_DATE, PROSPECTUS_ROWS, CLASS_ROWS, DATE_ROWS FROM prospectus_manifest ORDER BY 1')
+            self.assertEqual(manifest.values.tolist(), [[Path(zip_paths[0]).stem, 1, 1, 1], [Path(zip_paths[1]).stem, 1, 1, 1]])
+
+            #Unchanged datasets are not ingested again
+            self.assertEqual(ingest(), [])
+
+            #Republished dataset with corrections is ingested again; rewritten dataset with the same content is not
+            write_prospectus_zip(zip_paths[1], 0.003, '2021-06-01')
+            self.assertEqual(ingest(), [zip_paths[1]])
+            self.assertEqual(db_manager.query("SELECT EXPENSE_RATIO FROM prospectus WHERE EFFECTIVE_DATE = '2021-06-01'")['EXPENSE_RATIO'].to_list(), [0.003])
+
+            os.utime(zip_paths[0], (0, 0))
+            self.assertEqual(ingest(), [])
+
+            db_manager.close()
+
+
     def test_get_prospectus_table_data(self):
 
         configuration_manager = sec_extractor.configurationManager()
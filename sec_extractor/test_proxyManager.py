@@ -0,0 +1,226 @@
+import unittest
+from unittest.mock import MagicMock
+from unittest import mock
+import sec_extractor
+import tempfile
+import io
+import requests
+import requests.adapters
+import os
+import zipfile
+import threading
+
+
+def build_response(status_code, content, headers):
+    '''Response as it would come back from the SEC website'''
+
+    response = requests.models.Response()
+    response.status_code = status_code
+    response._content = content
+    response.raw = io.BytesIO(content)
+    response.headers = requests.structures.CaseInsensitiveDict(headers)
+
+    return response
+
+
+class testProxyManager(unittest.TestCase):
+
+
+    def test_response_cache(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        with tempfile.TemporaryDirectory() as cache_folder:
+
+            config['network_drives']['cache'] = cache_folder
+            config['http_cache']['ttl_seconds'] = 0
+
+            session = requests.Session()
+            proxy_manager = sec_extractor.proxyManager()
+            proxy_manager.session = session
+            proxy_manager.mount_transport(config)
+
+            filing_url = 'https://www.sec.gov/Archives/edgar/data/1/0000000001-21-000001.txt'
+            index_url = 'https://www.sec.gov/Archives/edgar/full-index/2021/QTR3/master.gz'
+
+            #Filing is only downloaded once, because it never changes
+            with mock.patch.object(requests.adapters.HTTPAdapter, 'send', return_value=build_response(200, b'filing', {})) as send:
+                self.assertEqual(session.get(filing_url).content, b'filing')
+                self.assertEqual(session.get(filing_url).content, b'filing')
+                self.assertEqual(send.call_count, 1)
+
+            #Index file has expired (ttl of 0), so it is revalidated with its ETag
+            with mock.patch.object(requests.adapters.HTTPAdapter, 'send', return_value=build_response(200, b'index', {'ETag': '"a"'})):
+                session.get(index_url)
+
+            with mock.patch.object(requests.adapters.HTTPAdapter, 'send', return_value=build_response(304, b'', {})) as send:
+                self.assertEqual(session.get(index_url).content, b'index')
+                self.assertEqual(send.call_args[0][0].headers['If-None-Match'], '"a"')
+
+            self.assertEqual(proxy_manager.response_cache.hits, 2)
+            self.assertEqual(proxy_manager.response_cache.revalidations, 1)
+            self.assertEqual(proxy_manager.response_cache.misses, 2)
+
+            proxy_manager.response_cache.conn.close()
+
+
+    def test_response_cache_eviction(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        with tempfile.TemporaryDirectory() as cache_folder:
+
+            config['network_drives']['cache'] = cache_folder
+
+            response_cache = sec_extractor.responseCache(config)
+            response_cache.max_size = 10
+
+            response_cache.store('a', 200, {}, b'aaaa')
+            response_cache.store('b', 200, {}, b'bbbb')
+            #a is now most recently used
+            response_cache.get('a')
+            response_cache.store('c', 200, {}, b'cccc')
+
+            self.assertIsNone(response_cache.get('b'))
+            self.assertEqual(response_cache.get('a')['content'], b'aaaa')
+            self.assertEqual(response_cache.get('c')['content'], b'cccc')
+            self.assertEqual(response_cache.size, 8)
+
+            response_cache.conn.close()
+
+    def test_response_cache_stats(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        with tempfile.TemporaryDirectory() as cache_folder:
+
+            config['network_drives']['cache'] = cache_folder
+            response_cache = sec_extractor.responseCache(config)
+
+            #Lookups are counted from many fetch threads at once
+            def record():
+                for i in range(2000):
+                    response_cache.record('hit')
+                    response_cache.record('miss')
+                    response_cache.record('revalidation')
+
+            threads = [threading.Thread(target=record) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual((response_cache.hits, response_cache.misses, response_cache.revalidations), (32000, 16000, 16000))
+
+            response_cache.conn.close()
+
+
+    def test_mount_transport(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['http_cache']['enabled'] = False
+        config['http_session']['max_retries'] = 3
+        config['http_session']['backoff_factor'] = 2
+
+        proxy_manager = sec_extractor.proxyManager()
+        proxy_manager.session = requests.Session()
+        proxy_manager.mount_transport(config)
+
+        adapter = proxy_manager.session.get_adapter('https://www.sec.gov/')
+        self.assertIsInstance(adapter, sec_extractor.transportAdapter)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertIn(429, adapter.max_retries.status_forcelist)
+        self.assertEqual(proxy_manager.session.headers['Accept-Encoding'], 'gzip, deflate')
+
+        #Timeout from config.json is used when none is given
+        with mock.patch.object(requests.adapters.HTTPAdapter, 'send', return_value=build_response(200, b'', {})) as send:
+            proxy_manager.session.get('https://www.sec.gov/')
+            self.assertEqual(send.call_args[1]['timeout'], (float(config['http_session']['connect_timeout']), float(config['http_session']['read_timeout'])))
+
+        #Backoff after the third consecutive error is between half and all of 2 * 2^2 seconds
+        retry = adapter.max_retries.increment(method='GET', url='/').increment(method='GET', url='/').increment(method='GET', url='/')
+        for i in range(20):
+            self.assertTrue(4 <= retry.get_backoff_time() <= 8)
+
+
+    def test_get_prefix(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['http_cache']['enabled'] = False
+
+        proxy_manager = sec_extractor.proxyManager()
+        proxy_manager.session = requests.Session()
+        proxy_manager.mount_transport(config)
+
+        content = b'<SEC-HEADER>' + (b'a' * 50000) + b'</SEC-HEADER>' + (b'b' * 50000)
+
+        with mock.patch.object(requests.adapters.HTTPAdapter, 'send', return_value=build_response(200, content, {})):
+            prefix = proxy_manager.get_prefix('https://www.sec.gov/Archives/edgar/data/1/a.txt', b'</SEC-HEADER>', chunk_size=1000)
+
+        self.assertEqual(prefix, content[:content.find(b'</SEC-HEADER>') + len(b'</SEC-HEADER>')])
+
+
+    def test_download_file(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+        config['http_cache']['enabled'] = False
+
+        proxy_manager = sec_extractor.proxyManager()
+        proxy_manager.session = requests.Session()
+        proxy_manager.mount_transport(config)
+
+        zip_content = io.BytesIO()
+        with zipfile.ZipFile(zip_content, 'w') as zip_file:
+            zip_file.writestr('num.tsv', 'adsh\ttag\n' * 1000)
+        zip_content = zip_content.getvalue()
+
+        def verify(path):
+            with zipfile.ZipFile(path) as zip_file:
+                return zip_file.testzip() is None
+
+        url = 'https://www.sec.gov/files/dera/data/2021q1_rr1.zip'
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            file_path = os.path.join(folder, '2021-03-31.zip')
+
+            #Interrupted download is resumed from the end of the .part file
+            with open(file_path + '.part', 'wb') as part_file:
+                part_file.write(zip_content[:100])
+
+            response = build_response(206, zip_content[100:], {'Content-Range': f'bytes 100-{len(zip_content) - 1}/{len(zip_content)}'})
+            with mock.patch.object(requests.adapters.HTTPAdapter, 'send', return_value=response) as send:
+                transferred = proxy_manager.download_file(url, file_path, verify=verify)
+                self.assertEqual(send.call_args[0][0].headers['Range'], 'bytes=100-')
+
+            self.assertEqual(transferred, len(zip_content) - 100)
+            with open(file_path, 'rb') as file:
+                self.assertEqual(file.read(), zip_content)
+            self.assertFalse(os.path.exists(file_path + '.part'))
+
+            #Incomplete download is kept as .part file, to be resumed
+            response = build_response(200, zip_content[:50], {'Content-Length': str(len(zip_content))})
+            with mock.patch.object(requests.adapters.HTTPAdapter, 'send', return_value=response):
+                with self.assertRaises(IOError):
+                    proxy_manager.download_file(url, file_path + '2', verify=verify)
+            self.assertEqual(os.path.getsize(file_path + '2.part'), 50)
+
+            #Complete download that is not a valid zip file is deleted
+            response = build_response(200, b'not a zip file', {'Content-Length': '14'})
+            with mock.patch.object(requests.adapters.HTTPAdapter, 'send', return_value=response):
+                with self.assertRaises(IOError):
+                    proxy_manager.download_file(url, file_path + '3', verify=verify)
+            self.assertFalse(os.path.exists(file_path + '3.part'))
+            self.assertFalse(os.path.exists(file_path + '3'))
+
+
+
+if __name__ == "__main__":
+
+    unittest.main()
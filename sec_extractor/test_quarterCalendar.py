@@ -0,0 +1,43 @@
+import unittest
+import sec_extractor
+import numpy as np
+import pandas as pd
+import datetime as dt
+
+
+class testQuarterCalendar(unittest.TestCase):
+
+
+    def test_quarter_ends(self):
+
+        calendar = sec_extractor.quarterCalendar()
+
+        #Every day from 1993 through 2030
+        dates = pd.date_range('1993-01-01', '2030-12-31', freq='D')
+        date_strings = dates.strftime('%Y-%m-%d').tolist()
+
+        self.assertEqual(calendar.format_dates(dates).tolist(), date_strings)
+        self.assertEqual(calendar.format_dates(calendar.quarter_ends(dates)).tolist(), (dates + pd.offsets.QuarterEnd(0)).strftime('%Y-%m-%d').tolist())
+        self.assertEqual(calendar.quarter_labels(dates).tolist(), [str(period).lower() for period in dates.to_period('Q')])
+        self.assertEqual([calendar.quarter_end(date) for date in date_strings], calendar.format_dates(calendar.quarter_ends(date_strings)).tolist())
+
+        #Missing dates stay missing
+        self.assertEqual(calendar.format_dates(pd.Series([pd.Timestamp('2021-05-04'), pd.NaT])).tolist(), ['2021-05-04', None])
+        self.assertTrue(np.isnat(calendar.quarter_ends([None])[0]))
+
+
+    def test_quarter_ends_between(self):
+
+        calendar = sec_extractor.quarterCalendar()
+
+        for start, end in [('2011-01-01', '2021-10-17'), ('2020-03-31', '2020-12-31'), ('2020-04-01', '2020-06-29'), ('1980-05-01', '1992-01-01'), ('2099-01-01', '2102-01-01')]:
+            self.assertEqual(calendar.quarter_ends_between(start, end), pd.date_range(start, end, freq='Q').strftime('%Y-%m-%d').tolist())
+
+        self.assertEqual(calendar.quarter_end_date(2021, 3), dt.datetime(2021, 9, 30))
+        self.assertEqual(calendar.quarter_end_date(1993, 1), dt.datetime(1993, 3, 31))
+
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from unittest import mock
+import sec_extractor
+import tempfile
+import threading
+import urllib.request
+import urllib.error
+import json
+import os
+import pandas as pd
+from test_exportManager import create_test_database
+
+
+class testQueryService(unittest.TestCase):
+
+
+    def test_query_service(self):
+
+        configuration_manager = sec_extractor.configurationManager()
+        config = configuration_manager.get_config()
+
+        with tempfile.TemporaryDirectory() as folder:
+
+            config['network_drives']['database'] = os.path.join(folder, 'database')
+            db_manager = create_test_database(config)
+            #As run_serve does before serving
+            db_manager.refresh_series_quarter_facts()
+
+            query_service = sec_extractor.queryService(config, db_manager)
+            server = query_service.get_server('127.0.0.1', 0)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+
+            def get(path):
+                #Service only reads; facts are refreshed by ingestion
+                with mock.patch.object(sec_extractor.databaseManager, 'refresh_series_quarter_facts', side_effect=AssertionError('service wrote to database')):
+                    with urllib.request.urlopen(f'http://127.0.0.1:{server.server_address[1]}{path}') as response:
+                        return response.read(), response.headers
+
+            try:
+                #Dataset is the same as get_series_quarter_facts; repeated request is served from cache
+                body, headers = get('/series_quarter_facts?series=S1,S2&start=2021-06-30')
+                self.assertEqual(headers['X-Cache'], 'MISS')
+                self.assertEqual(headers['Content-Type'], 'application/json')
+                facts_df = db_manager.get_series_quarter_facts(series_ids=['S1', 'S2'], start_date='2021-06-30')
+                pd.testing.assert_frame_equal(pd.DataFrame(json.loads(body)), facts_df, check_dtype=False)
+
+                cached_body, headers = get('/series_quarter_facts?series=S1,S2&start=2021-06-30')
+                self.assertEqual((cached_body, headers['X-Cache']), (body, 'HIT'))
+                #Repeated parameter is the same as comma separated values
+                self.assertEqual(get('/series_quarter_facts?series=S1&series=S2&start=2021-06-30')[0], body)
+
+                if sec_extractor.pa is not None:
+                    body, headers = get('/series_quarter_facts?cik=2&format=arrow')
+                    self.assertEqual(headers['Content-Type'], 'application/vnd.apache.arrow.stream')
+                    pd.testing.assert_frame_equal(sec_extractor.pa.ipc.open_stream(body).read_all().to_pandas(), db_manager.get_series_quarter_facts(ciks=['2']), check_dtype=False)
+
+                #Histories
+                body, headers = get('/series/S1/net_assets?end=2021-09-30')
+                self.assertEqual([(row['QUARTER_END_DATE'], row['AVERAGE_NET_ASSETS']) for row in json.loads(body)], [('2021-03-31', 100), ('2021-06-30', 110), ('2021-09-30', 120)])
+
+                body, headers = get('/series/S2/expense_ratios')
+                self.assertEqual([(row['QUARTER_END_DATE'], row['AVERAGE_NET_EXPENSE_RATIO']) for row in json.loads(body)], [('2021-06-30', .02), ('2021-12-31', .025)])
+
+                #Ingest commit (amended filing) invalidates cache, and its data is served
+                holdings_courier = sec_extractor.holdingsCourier(config)
+                holdings_courier.insert_report_data(db_manager, {'filing_type': 'NPORT-P/A'}, [(('2021-07-15', '2021-09-30'), ('h7', 'NPORT-P/A', '2021-07-15', '2021-07-15', 'S1', 150))])
+
+                body, headers = get('/series/S1/net_assets?end=2021-09-30')
+                self.assertEqual(headers['X-Cache'], 'MISS')
+                self.assertEqual(json.loads(body)[-1]['AVERAGE_NET_ASSETS'], 150)
+                self.assertEqual(get('/series/S1/net_assets?end=2021-09-30')[1]['X-Cache'], 'HIT')
+
+                #Errors
+                for path, status_code in [('/holdings', 404), ('/series/S1/returns', 404), ('/series_quarter_facts?format=xml', 400), ('/series_quarter_facts?cik=abc', 400)]:
+                    with self.assertRaises(urllib.error.HTTPError) as context:
+                        get(path)
+                    self.assertEqual(context.exception.code, status_code)
+
+            finally:
+                server.shutdown()
+                server.server_close()
+                thread.join()
+                query_service.close()
+                db_manager.close()
+
+
+
+if __name__ == "__main__":
+
+    unittest.main()